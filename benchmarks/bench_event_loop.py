@@ -0,0 +1,80 @@
+"""
+Measure /api/clubs/{club_id} latency while slow inbox queries run concurrently.
+
+Requires httpx (`pip install httpx`). Start the API against a seeded database
+first, e.g.
+
+    uvicorn main:app --workers 1
+    python benchmarks/bench_event_loop.py --club-id 1 --slow-concurrency 4
+
+The slow path is the club inbox (`/api/messages/club/{id}/threads`), which is
+the heaviest conversation query. The probe is the club detail endpoint: one
+short query of its own, so its latency shows how long requests wait on the
+event loop and the database executor. (GET /api/clubs is served from the
+in-memory catalog without touching the database, so it cannot show this.)
+With blocking database calls on the event loop, probe latency tracks the slow
+query; with the executor bridge it should stay close to the unloaded baseline.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(label, samples):
+    print(
+        f"{label:<12} n={len(samples):<5} "
+        f"p50={percentile(samples, 50) * 1000:8.2f}ms "
+        f"p95={percentile(samples, 95) * 1000:8.2f}ms "
+        f"p99={percentile(samples, 99) * 1000:8.2f}ms "
+        f"mean={statistics.mean(samples) * 1000:8.2f}ms"
+    )
+
+
+async def measure_club(client, club_id, count):
+    samples = []
+    for _ in range(count):
+        started = time.perf_counter()
+        response = await client.get(f"/api/clubs/{club_id}")
+        response.raise_for_status()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+async def hammer_inbox(client, club_id, stop):
+    while not stop.is_set():
+        await client.get(f"/api/messages/club/{club_id}/threads")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--club-id", type=int, required=True, help="club whose inbox is used as the slow query")
+    parser.add_argument("--probe-club-id", type=int, help="club fetched for the latency samples (defaults to --club-id)")
+    parser.add_argument("--slow-concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    probe_club_id = args.probe_club_id or args.club_id
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        summarize("baseline", await measure_club(client, probe_club_id, args.requests))
+
+        stop = asyncio.Event()
+        slow = [asyncio.create_task(hammer_inbox(client, args.club_id, stop)) for _ in range(args.slow_concurrency)]
+        try:
+            summarize("under load", await measure_club(client, probe_club_id, args.requests))
+        finally:
+            stop.set()
+            await asyncio.gather(*slow, return_exceptions=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,143 @@
+"""
+Compare the old and new ways of turning database rows into a JSON list response.
+
+No server or database is needed; rows are generated in memory. Run from the
+repository root:
+
+    python benchmarks/bench_json.py --rows 10000
+
+"before" is the path list endpoints used to take: copy each row, rewrite its
+picture path inline with two print() calls, run the result through FastAPI's
+jsonable_encoder and render it with JSONResponse (json.dumps). "after" is the
+current path: one converter call per row (picture_url) and FastJSONResponse
+(orjson), which skips jsonable_encoder. Prints go to /dev/null, so the "before"
+numbers exclude terminal and log I/O and understate the gain.
+"""
+import argparse
+import contextlib
+import datetime
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from routes.club_routes import club_item
+from services.messaging_service import message_item
+from services.serialization import FastJSONResponse
+from models.schemas import MessageResponse
+
+
+def club_rows(count):
+    variants = {
+        str(size): {"webp": f"uploads/media/ab/cd/{'f' * 64}_{size}.webp", "jpeg": f"uploads/media/ab/cd/{'f' * 64}_{size}.jpg"}
+        for size in (64, 256, 512)
+    }
+    return [
+        {
+            "id": i,
+            "name": f"Club {i}",
+            "description": "A club for people who like things. " * 4,
+            "interests": ["music", "coding", "hiking"],
+            "profile_picture": f"uploads/media/ab/cd/{'f' * 64}.jpg" if i % 3 else f"{i}_legacy.png",
+            "profile_picture_variants": variants if i % 3 else None,
+            "profile_picture_placeholder": "data:image/webp;base64," + "A" * 60,
+            "members": i % 500,
+            "email": f"club{i}@example.edu",
+        }
+        for i in range(count)
+    ]
+
+
+def message_rows(count):
+    started = datetime.datetime(2024, 1, 1, 12, 0, 0, 123456)
+    return [
+        {
+            "id": i,
+            "content": "See you at the meeting on Thursday!",
+            "sender_id": i % 50,
+            "sender_type": "student" if i % 2 else "club",
+            "sender_name": f"Sender {i % 50}",
+            "sender_profile_picture": f"uploads/media/ab/cd/{'f' * 64}.jpg",
+            "recipient_id": 1,
+            "recipient_type": "club",
+            "created_at": started + datetime.timedelta(seconds=i),
+            "read": bool(i % 4),
+        }
+        for i in range(count)
+    ]
+
+
+# The per-row formatting club endpoints did before the shared converters
+def legacy_club(row):
+    club = dict(row)
+    if club["profile_picture_variants"]:
+        club["profile_picture_variants"] = {
+            size: {fmt: f"/{path}" for fmt, path in formats.items()}
+            for size, formats in club["profile_picture_variants"].items()
+        }
+    if club["profile_picture"]:
+        profile_picture = club["profile_picture"]
+        print(f"Original profile picture path: {profile_picture}")
+        if "uploads/" in profile_picture and not profile_picture.startswith("/uploads/"):
+            club["profile_picture"] = f"/{profile_picture}"
+        elif not profile_picture.startswith(("http://", "https://", "/")):
+            club["profile_picture"] = f"/uploads/club_profile_pictures/{profile_picture}"
+        print(f"Formatted profile picture path: {club['profile_picture']}")
+    return club
+
+
+def before_clubs(rows):
+    return JSONResponse(jsonable_encoder({"items": [legacy_club(row) for row in rows], "next_cursor": None})).body
+
+
+def after_clubs(rows):
+    return FastJSONResponse({"items": [club_item(row) for row in rows], "next_cursor": None}).body
+
+
+def before_messages(rows):
+    items = [MessageResponse(**{key: row[key] for key in MessageResponse.model_fields}) for row in rows]
+    return JSONResponse(jsonable_encoder({"items": items, "next_cursor": None})).body
+
+
+def after_messages(rows):
+    return FastJSONResponse({"items": [message_item(row) for row in rows], "next_cursor": None}).body
+
+
+def measure(func, rows, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = func(rows)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=7, help="runs per case; the median is reported")
+    args = parser.parse_args()
+
+    cases = [
+        ("clubs", club_rows(args.rows), before_clubs, after_clubs),
+        ("messages", message_rows(args.rows), before_messages, after_messages),
+    ]
+    with open(os.devnull, "w") as devnull:
+        for name, rows, before, after in cases:
+            with contextlib.redirect_stdout(devnull):
+                before_time, before_size = measure(before, rows, args.repeat)
+                after_time, after_size = measure(after, rows, args.repeat)
+            print(
+                f"{name:<9} rows={args.rows} "
+                f"before={before_time * 1000:8.2f}ms ({args.rows / before_time:9.0f} rows/s, {before_size} bytes) "
+                f"after={after_time * 1000:8.2f}ms ({args.rows / after_time:9.0f} rows/s, {after_size} bytes) "
+                f"speedup={before_time / after_time:5.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,436 @@
+"""
+Drive realistic traffic at the API and record throughput and latency per endpoint.
+
+Requires httpx (`pip install httpx`). Seed a database with
+benchmarks/seed_data.py, then either point --base-url at a running API or let
+--start-server launch one (uvicorn, one worker) with the same DB_* settings:
+
+    python benchmarks/load_test.py run --start-server --duration 30 --concurrency 16 --output before.json
+    # change the code, reseed with the same arguments, run again
+    python benchmarks/load_test.py run --start-server --duration 30 --concurrency 16 --output after.json
+    python benchmarks/load_test.py compare before.json after.json
+
+Scenarios:
+    login_burst          students and clubs logging in at once
+    dashboard_load       a student dashboard: profile, saved and recommended clubs, threads, unread count, catalog
+    inbox_open           a club opening its inbox and the latest conversation
+    conversation_scroll  a student scrolling back through a conversation page by page
+    catalog_browse       paging through the club catalog, searching, opening a club and its members
+    save_unsave          a student saving a club and removing it again
+
+Each scenario runs for --duration seconds after a --warmup, with --concurrency
+virtual users issuing requests back to back. Opening conversations marks messages
+read and saving clubs changes counters, so reseed between runs you compare.
+`compare` exits with status 1 when any endpoint regressed past --threshold.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db import get_db_connection
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must match benchmarks/seed_data.py
+BENCH_PASSWORD = "benchmark-password"
+
+SEARCH_TERMS = ["music", "coding", "robotics", "chess", "photography", "dance", "film", "soccer", "astronomy", "writing"]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Recorder:
+    """Latency samples and error counts per endpoint label, e.g. "GET /api/clubs/{club_id}"."""
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.samples = defaultdict(list)
+        self.errors = Counter()
+        self.recording = False
+
+    # Issue one request and return its JSON body, or None when it failed
+    async def call(self, label: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            failed = response.status_code >= 400
+        except httpx.HTTPError:
+            response, failed = None, True
+        if self.recording:
+            self.samples[label].append(time.perf_counter() - started)
+            if failed:
+                self.errors[label] += 1
+        return None if failed else response.json()
+
+    async def get(self, label: str, url: str, **params):
+        return await self.call(label, "GET", url, params=params or None)
+
+
+# Ids and credentials the scenarios draw from, sampled from the seeded database
+def load_dataset(sample_size: int, seed: int):
+    rng = random.Random(seed)
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT s.id, a.email FROM students s JOIN auth_credentials a ON a.id = s.auth_id ORDER BY s.id")
+            students = [(row["id"], row["email"]) for row in cur.fetchall()]
+            cur.execute("SELECT c.id, a.email FROM clubs c JOIN auth_credentials a ON a.id = c.auth_id ORDER BY c.id")
+            clubs = [(row["id"], row["email"]) for row in cur.fetchall()]
+            if not students or not clubs:
+                raise SystemExit("No students or clubs found; seed the database with benchmarks/seed_data.py first")
+            students = rng.sample(students, min(sample_size, len(students)))
+            clubs = rng.sample(clubs, min(sample_size, len(clubs)))
+
+            cur.execute(
+                "SELECT student_id, club_id FROM saved_clubs WHERE student_id = ANY(%s)",
+                ([student_id for student_id, _ in students],)
+            )
+            saved = defaultdict(set)
+            for row in cur.fetchall():
+                saved[row["student_id"]].add(row["club_id"])
+
+            # The longest student-club conversations, for scrolling
+            cur.execute(
+                """
+                SELECT conversation_key, MIN(sender_id) FILTER (WHERE sender_type = 'student') AS student_id,
+                       MIN(sender_id) FILTER (WHERE sender_type = 'club') AS club_id
+                FROM messages
+                GROUP BY conversation_key
+                HAVING COUNT(DISTINCT sender_type) = 2
+                ORDER BY COUNT(*) DESC, conversation_key
+                LIMIT %s
+                """,
+                (sample_size,)
+            )
+            conversations = [(row["student_id"], row["club_id"]) for row in cur.fetchall()]
+
+            cur.execute(
+                """
+                SELECT (SELECT COUNT(*) FROM students) AS students, (SELECT COUNT(*) FROM clubs) AS clubs,
+                       (SELECT COUNT(*) FROM saved_clubs) AS saved_clubs, (SELECT COUNT(*) FROM messages) AS messages,
+                       (SELECT COUNT(*) FROM conversations) AS conversations
+                """
+            )
+            counts = dict(cur.fetchone())
+        conn.commit()
+    finally:
+        conn.close()
+    all_club_ids = sorted(club_id for club_id, _ in clubs)
+    return {
+        "students": students,
+        "clubs": clubs,
+        "club_ids": all_club_ids,
+        "saved": saved,
+        "conversations": conversations,
+        "counts": counts,
+    }
+
+
+async def login_burst(rec: Recorder, data, rng: random.Random, worker: int, workers: int):
+    if rng.random() < 0.8:
+        _, email = rng.choice(data["students"])
+        await rec.call("POST /api/login/student", "POST", "/api/login/student", json={"email": email, "password": BENCH_PASSWORD})
+    else:
+        _, email = rng.choice(data["clubs"])
+        await rec.call("POST /api/login/club", "POST", "/api/login/club", json={"email": email, "password": BENCH_PASSWORD})
+
+
+async def dashboard_load(rec: Recorder, data, rng: random.Random, worker: int, workers: int):
+    student_id, _ = rng.choice(data["students"])
+    # The dashboard requests these in parallel on load
+    await asyncio.gather(
+        rec.get("GET /api/profile/student/{student_id}", f"/api/profile/student/{student_id}"),
+        rec.get("GET /api/student/{student_id}/saved-clubs", f"/api/student/{student_id}/saved-clubs"),
+        rec.get("GET /api/student/{student_id}/recommended-clubs", f"/api/student/{student_id}/recommended-clubs"),
+        rec.get("GET /api/messages/student/{student_id}/threads", f"/api/messages/student/{student_id}/threads"),
+        rec.get("GET /api/messages/student/{student_id}/unread-count", f"/api/messages/student/{student_id}/unread-count"),
+        rec.get("GET /api/clubs", "/api/clubs", limit=50),
+    )
+
+
+async def inbox_open(rec: Recorder, data, rng: random.Random, worker: int, workers: int):
+    club_id, _ = rng.choice(data["clubs"])
+    threads, _ = await asyncio.gather(
+        rec.get("GET /api/messages/club/{club_id}/threads", f"/api/messages/club/{club_id}/threads"),
+        rec.get("GET /api/messages/club/{club_id}/unread-count", f"/api/messages/club/{club_id}/unread-count"),
+    )
+    if threads and threads.get("items"):
+        latest = threads["items"][0]
+        await rec.get(
+            "GET /api/messages/club/{club_id}/conversation/{other_type}/{other_id}",
+            f"/api/messages/club/{club_id}/conversation/{latest['contact_type']}/{latest['contact_id']}",
+        )
+
+
+async def conversation_scroll(rec: Recorder, data, rng: random.Random, worker: int, workers: int, pages: int = 5):
+    if not data["conversations"]:
+        return
+    student_id, club_id = rng.choice(data["conversations"])
+    url = f"/api/messages/student/{student_id}/conversation/club/{club_id}"
+    label = "GET /api/messages/student/{student_id}/conversation/{other_type}/{other_id}"
+    page = await rec.get(label, url, limit=20)
+    for _ in range(pages - 1):
+        if not page or not page.get("next_cursor"):
+            break
+        page = await rec.get(label + "?before", url, limit=20, before=page["next_cursor"])
+
+
+async def catalog_browse(rec: Recorder, data, rng: random.Random, worker: int, workers: int, pages: int = 3):
+    page = await rec.get("GET /api/clubs", "/api/clubs", limit=50)
+    for _ in range(pages - 1):
+        if not page or not page.get("next_cursor"):
+            break
+        page = await rec.get("GET /api/clubs?cursor", "/api/clubs", limit=50, cursor=page["next_cursor"])
+    await rec.get("GET /api/clubs/search", "/api/clubs/search", q=rng.choice(SEARCH_TERMS))
+    club_id = rng.choice(data["club_ids"])
+    await asyncio.gather(
+        rec.get("GET /api/clubs/{club_id}", f"/api/clubs/{club_id}"),
+        rec.get("GET /api/club/{club_id}/members", f"/api/club/{club_id}/members"),
+    )
+
+
+async def save_unsave(rec: Recorder, data, rng: random.Random, worker: int, workers: int):
+    # Each virtual user works on its own students, so no two users race on one save
+    students = data["students"][worker::workers] or data["students"]
+    student_id, _ = rng.choice(students)
+    unsaved = [club_id for club_id in data["club_ids"] if club_id not in data["saved"][student_id]]
+    if not unsaved:
+        return
+    club_id = rng.choice(unsaved)
+    await rec.call("POST /api/student/{student_id}/save-club/{club_id}", "POST", f"/api/student/{student_id}/save-club/{club_id}")
+    await rec.call("DELETE /api/student/{student_id}/unsave-club/{club_id}", "DELETE", f"/api/student/{student_id}/unsave-club/{club_id}")
+
+
+SCENARIOS = {
+    "login_burst": login_burst,
+    "dashboard_load": dashboard_load,
+    "inbox_open": inbox_open,
+    "conversation_scroll": conversation_scroll,
+    "catalog_browse": catalog_browse,
+    "save_unsave": save_unsave,
+}
+
+
+def summarize(rec: Recorder, elapsed: float):
+    endpoints = {}
+    for label, samples in sorted(rec.samples.items()):
+        endpoints[label] = {
+            "requests": len(samples),
+            "errors": rec.errors[label],
+            "throughput_rps": round(len(samples) / elapsed, 2),
+            "p50_ms": round(percentile(samples, 50) * 1000, 3),
+            "p95_ms": round(percentile(samples, 95) * 1000, 3),
+            "p99_ms": round(percentile(samples, 99) * 1000, 3),
+            "mean_ms": round(statistics.mean(samples) * 1000, 3),
+            "max_ms": round(max(samples) * 1000, 3),
+        }
+    return endpoints
+
+
+# Run one scenario with `concurrency` closed-loop virtual users; returns its summary
+async def run_scenario(client, name: str, data, duration: float, warmup: float, concurrency: int, seed: int):
+    scenario = SCENARIOS[name]
+    rec = Recorder(client)
+    iterations = 0
+    deadline = None
+
+    async def user(worker: int):
+        nonlocal iterations
+        rng = random.Random(f"{seed}-{name}-{worker}")
+        while deadline is None or time.perf_counter() < deadline:
+            await scenario(rec, data, rng, worker, concurrency)
+            if rec.recording:
+                iterations += 1
+
+    async def clock():
+        nonlocal deadline
+        await asyncio.sleep(warmup)
+        rec.recording = True
+        started = time.perf_counter()
+        deadline = started + duration
+        return started
+
+    users = [asyncio.create_task(user(worker)) for worker in range(concurrency)]
+    started = await clock()
+    await asyncio.gather(*users)
+    elapsed = time.perf_counter() - started
+    return {
+        "iterations": iterations,
+        "iterations_per_second": round(iterations / elapsed, 2),
+        "elapsed_seconds": round(elapsed, 3),
+        "endpoints": summarize(rec, elapsed),
+    }
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Launch the API with uvicorn and wait until it answers
+def start_server(app: str, port: int, ready_path: str, timeout: float = 60):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port), "--workers", "1", "--log-level", "warning"],
+        cwd=REPO_ROOT,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"Server exited with status {process.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}{ready_path}", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise SystemExit(f"Server did not answer {ready_path} within {timeout:.0f}s")
+
+
+async def run(args):
+    started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    data = load_dataset(args.sample_size, args.seed)
+    server = None
+    base_url = args.base_url
+    if args.start_server:
+        server = start_server(args.app, args.port, args.ready_path)
+        base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency * 6, max_keepalive_connections=args.concurrency * 6)
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+            results = {}
+            for name in args.scenarios:
+                results[name] = await run_scenario(client, name, data, args.duration, args.warmup, args.concurrency, args.seed)
+                print_scenario(name, results[name])
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "meta": {
+            "started_at": started_at,
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "base_url": base_url,
+            "duration_seconds": args.duration,
+            "warmup_seconds": args.warmup,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "dataset": data["counts"],
+        },
+        "scenarios": results,
+    }
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(report, out, indent=2)
+        print(f"Results written to {args.output}")
+
+
+def print_scenario(name: str, result):
+    print(f"\n{name}: {result['iterations']} iterations, {result['iterations_per_second']}/s")
+    for label, stats in result["endpoints"].items():
+        print(
+            f"  {label:<80} n={stats['requests']:<6} err={stats['errors']:<4} {stats['throughput_rps']:>9.1f} req/s "
+            f"p50={stats['p50_ms']:8.2f}ms p95={stats['p95_ms']:8.2f}ms p99={stats['p99_ms']:8.2f}ms"
+        )
+
+
+def _change(before: float, after: float) -> float:
+    return (after - before) / before if before else 0.0
+
+
+# Print every endpoint of two runs side by side; returns the regressions found
+def compare(before_path: str, after_path: str, threshold: float, min_ms: float):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+
+    regressions = []
+    for name in sorted(set(before["scenarios"]) | set(after["scenarios"])):
+        old, new = before["scenarios"].get(name), after["scenarios"].get(name)
+        if old is None or new is None:
+            print(f"\n{name}: only in {'after' if old is None else 'before'}")
+            continue
+        print(f"\n{name}: {old['iterations_per_second']} -> {new['iterations_per_second']} iterations/s")
+        for label in sorted(set(old["endpoints"]) | set(new["endpoints"])):
+            a, b = old["endpoints"].get(label), new["endpoints"].get(label)
+            if a is None or b is None:
+                print(f"  {label:<80} only in {'after' if a is None else 'before'}")
+                continue
+            problems = []
+            # Latency must grow by the threshold and by a noticeable absolute amount
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                if _change(a[key], b[key]) > threshold and b[key] - a[key] > min_ms:
+                    problems.append(f"{key} +{_change(a[key], b[key]):.0%}")
+            if _change(a["throughput_rps"], b["throughput_rps"]) < -threshold:
+                problems.append(f"throughput {_change(a['throughput_rps'], b['throughput_rps']):.0%}")
+            if b["errors"] / max(b["requests"], 1) > a["errors"] / max(a["requests"], 1):
+                problems.append(f"errors {a['errors']} -> {b['errors']}")
+            print(
+                f"  {label:<80} {a['throughput_rps']:>8.1f} -> {b['throughput_rps']:>8.1f} req/s "
+                f"p50 {a['p50_ms']:7.2f} -> {b['p50_ms']:7.2f}ms  p95 {a['p95_ms']:7.2f} -> {b['p95_ms']:7.2f}ms  "
+                f"p99 {a['p99_ms']:7.2f} -> {b['p99_ms']:7.2f}ms"
+                + (f"  REGRESSION ({', '.join(problems)})" if problems else "")
+            )
+            if problems:
+                regressions.append((name, label, problems))
+
+    print(f"\n{before['meta']['git_revision']} -> {after['meta']['git_revision']}: {len(regressions)} regression(s) beyond {threshold:.0%}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="drive the scenarios and record results")
+    run_parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="API to test when not starting one")
+    run_parser.add_argument("--start-server", action="store_true", help="launch the API with uvicorn for the run")
+    run_parser.add_argument("--app", default="main:app", help="ASGI app launched by --start-server")
+    run_parser.add_argument("--port", type=int, default=8100, help="port for --start-server")
+    run_parser.add_argument("--ready-path", default="/health/db", help="path polled until the launched server answers 200")
+    run_parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    run_parser.add_argument("--duration", type=float, default=30, help="measured seconds per scenario")
+    run_parser.add_argument("--warmup", type=float, default=3, help="unmeasured seconds before each scenario")
+    run_parser.add_argument("--concurrency", type=int, default=16, help="virtual users per scenario")
+    run_parser.add_argument("--sample-size", type=int, default=1000, help="students, clubs and conversations drawn from the database")
+    run_parser.add_argument("--seed", type=int, default=42, help="seed for sampling and request choices")
+    run_parser.add_argument("--timeout", type=float, default=30, help="per-request timeout in seconds")
+    run_parser.add_argument("--output", help="write results to this JSON file")
+
+    compare_parser = commands.add_parser("compare", help="compare two result files and flag regressions")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    compare_parser.add_argument("--min-ms", type=float, default=1.0, help="ignore latency increases smaller than this")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        asyncio.run(run(args))
+    else:
+        sys.exit(1 if compare(args.before, args.after, args.threshold, args.min_ms) else 0)
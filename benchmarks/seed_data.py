@@ -0,0 +1,215 @@
+"""
+Fill a local database with a reproducible benchmark dataset.
+
+Load database/combined_schema.sql into an empty database, point the usual DB_*
+settings at it, then run from the repository root:
+
+    python benchmarks/seed_data.py --reset --students 5000 --clubs 500 --messages 200000
+
+The same arguments and --seed always produce the same rows, dated relative to
+the time of seeding. Every account's password is BENCH_PASSWORD, hashed once at
+the current BCRYPT_ROUNDS; run the API with the same BCRYPT_ROUNDS, or logins
+rehash and rewrite every password.
+--reset empties the tables first; without it the command refuses to seed a
+database that already has students or clubs.
+"""
+import argparse
+import csv
+import io
+import itertools
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db import get_db_connection
+from services.auth_service import hash_password_sync
+from services.recommendation_service import rebuild_recommendations
+
+# Password of every seeded student and club
+BENCH_PASSWORD = "benchmark-password"
+
+INTERESTS = [
+    "music", "coding", "robotics", "hiking", "chess", "debate", "photography", "dance",
+    "theatre", "film", "cooking", "gaming", "volunteering", "entrepreneurship", "art",
+    "writing", "soccer", "basketball", "climbing", "astronomy", "languages", "finance",
+]
+
+WORDS = [
+    "weekly", "meetings", "beginners", "welcome", "projects", "events", "workshops", "social",
+    "competitions", "trips", "community", "campus", "learn", "together", "friendly", "practice",
+]
+
+MESSAGES = [
+    "Hi! When is the next meeting?",
+    "Thanks for saving our club, see you Thursday.",
+    "Is there a membership fee?",
+    "We meet in the student center, room 204.",
+    "Can beginners join the workshop?",
+    "Reminder: sign-ups close on Friday.",
+]
+
+
+# Stream rows into a table with COPY
+def copy_rows(cur, table: str, columns, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def pg_array(values) -> str:
+    return "{" + ",".join(values) + "}"
+
+
+def seed(students: int, clubs: int, saves_per_student: int, messages: int, months: int, seed_value: int, reset: bool):
+    rng = random.Random(seed_value)
+    now = datetime.now().replace(microsecond=0)
+    password_hash = hash_password_sync(BENCH_PASSWORD)
+    timings = {}
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            started = time.monotonic()
+            if reset:
+                cur.execute(
+                    """
+                    TRUNCATE auth_credentials, students, clubs, club_members, saved_clubs,
+                             club_recommendations, messages, conversations RESTART IDENTITY CASCADE
+                    """
+                )
+            else:
+                cur.execute("SELECT EXISTS (SELECT 1 FROM students) OR EXISTS (SELECT 1 FROM clubs) AS seeded")
+                if cur.fetchone()["seeded"]:
+                    raise SystemExit("Database already has students or clubs; pass --reset to replace them")
+
+            # Ids are assigned in insertion order: students 1..S use auth ids 1..S, clubs use S+1..S+C
+            copy_rows(cur, "auth_credentials", ("email", "password_hash", "user_type"), [
+                *((f"student{i}@bench.edu", password_hash, "student") for i in range(1, students + 1)),
+                *((f"club{i}@bench.edu", password_hash, "club") for i in range(1, clubs + 1)),
+            ])
+            copy_rows(cur, "students", ("auth_id", "name", "interests"), [
+                (i, f"Student {i}", pg_array(rng.sample(INTERESTS, 3))) for i in range(1, students + 1)
+            ])
+            club_rows = []
+            for i in range(1, clubs + 1):
+                interests = rng.sample(INTERESTS, 3)
+                description = f"{interests[0].title()} club. " + " ".join(rng.choices(WORDS, k=20))
+                club_rows.append((students + i, f"{interests[0].title()} Club {i}", description, pg_array(interests)))
+            copy_rows(cur, "clubs", ("auth_id", "name", "description", "interests"), club_rows)
+            timings["accounts_seconds"] = time.monotonic() - started
+
+            # Popular clubs are saved far more often than the rest
+            started = time.monotonic()
+            club_ids = range(1, clubs + 1)
+            cum_weights = list(itertools.accumulate(1 / rank for rank in club_ids))
+            saves = []
+            for student_id in range(1, students + 1):
+                saved = set()
+                target = min(clubs, max(1, int(rng.gauss(saves_per_student, saves_per_student / 3))))
+                while len(saved) < target:
+                    saved.add(rng.choices(club_ids, cum_weights=cum_weights)[0])
+                saves.extend((student_id, club_id, now - timedelta(minutes=rng.randint(0, months * 30 * 24 * 60))) for club_id in saved)
+            # Counting members per row would update popular clubs thousands of times; count them once afterwards
+            cur.execute("ALTER TABLE saved_clubs DISABLE TRIGGER update_saved_clubs_member_count")
+            copy_rows(cur, "saved_clubs", ("student_id", "club_id", "saved_at"), saves)
+            cur.execute("ALTER TABLE saved_clubs ENABLE TRIGGER update_saved_clubs_member_count")
+            cur.execute(
+                """
+                UPDATE clubs c SET member_count = counts.n
+                FROM (SELECT club_id, COUNT(*) AS n FROM saved_clubs GROUP BY club_id) counts
+                WHERE c.id = counts.club_id
+                """
+            )
+            timings["saves_seconds"] = time.monotonic() - started
+
+            # Students talk to clubs they saved; recent messages are more often still unread
+            started = time.monotonic()
+            first_month = (now - timedelta(days=months * 31)).date().replace(day=1)
+            cur.execute("SELECT ensure_message_partitions(3, %s)", (first_month,))
+            pairs = rng.sample(saves, min(len(saves), max(1, messages // 20)))
+            message_rows = []
+            for _ in range(messages):
+                student_id, club_id, saved_at = rng.choice(pairs)
+                created_at = saved_at + timedelta(seconds=rng.randint(0, max(1, int((now - saved_at).total_seconds()))))
+                from_student = rng.random() < 0.5
+                read = created_at < now - timedelta(days=7) or rng.random() < 0.5
+                sender = (student_id, "student") if from_student else (club_id, "club")
+                recipient = (club_id, "club") if from_student else (student_id, "student")
+                message_rows.append((rng.choice(MESSAGES), *sender, *recipient, created_at, read))
+            message_rows.sort(key=lambda row: row[5])
+            copy_rows(cur, "messages", ("content", "sender_id", "sender_type", "recipient_id", "recipient_type", "created_at", "read"), message_rows)
+
+            # Thread summaries, computed the same way as migration 005's backfill
+            cur.execute(
+                """
+                WITH sides AS (
+                    SELECT id, content, created_at, read,
+                           sender_id AS owner_id, sender_type AS owner_type,
+                           recipient_id AS contact_id, recipient_type AS contact_type,
+                           TRUE AS sent_by_owner
+                    FROM messages
+                    UNION ALL
+                    SELECT id, content, created_at, read,
+                           recipient_id, recipient_type, sender_id, sender_type,
+                           FALSE
+                    FROM messages
+                ),
+                latest AS (
+                    SELECT DISTINCT ON (owner_id, owner_type, contact_id, contact_type) *
+                    FROM sides
+                    ORDER BY owner_id, owner_type, contact_id, contact_type, created_at DESC, id DESC
+                ),
+                unread AS (
+                    SELECT owner_id, owner_type, contact_id, contact_type,
+                           COUNT(*) FILTER (WHERE NOT sent_by_owner AND read = FALSE) AS n
+                    FROM sides
+                    GROUP BY owner_id, owner_type, contact_id, contact_type
+                )
+                INSERT INTO conversations (owner_id, owner_type, contact_id, contact_type, last_message_id,
+                                           last_message_snippet, last_message_at, last_sent_by_owner, last_message_read, unread_count)
+                SELECT l.owner_id, l.owner_type, l.contact_id, l.contact_type, l.id,
+                       left(l.content, 200), l.created_at, l.sent_by_owner, COALESCE(l.read, FALSE), u.n
+                FROM latest l
+                JOIN unread u USING (owner_id, owner_type, contact_id, contact_type)
+                """
+            )
+            conversations = cur.rowcount
+            timings["messages_seconds"] = time.monotonic() - started
+        conn.commit()
+
+        # VACUUM cannot run inside a transaction
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("VACUUM ANALYZE")
+    finally:
+        conn.close()
+
+    started = time.monotonic()
+    rebuild_recommendations()
+    timings["recommendations_seconds"] = time.monotonic() - started
+    return {
+        "students": students,
+        "clubs": clubs,
+        "saved_clubs": len(saves),
+        "messages": messages,
+        "conversations": conversations,
+        **{key: round(value, 2) for key, value in timings.items()},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--clubs", type=int, default=500)
+    parser.add_argument("--saves-per-student", type=int, default=8, help="average clubs saved by each student")
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--months", type=int, default=6, help="months of history messages and saves are spread over")
+    parser.add_argument("--seed", type=int, default=42, help="random seed; the same seed reproduces the same dataset")
+    parser.add_argument("--reset", action="store_true", help="empty the tables before seeding")
+    args = parser.parse_args()
+    print(seed(args.students, args.clubs, args.saves_per_student, args.messages, args.months, args.seed, args.reset))
@@ -1,7 +1,10 @@
 'use client';
 
-import { useState, useRef, useEffect } from 'react';
+import { useState, useRef, useEffect, useLayoutEffect } from 'react';
 import styles from './clubdashboard.module.css';
+import { usePagedList, useLoadMoreOnScroll } from '@/lib/pagination';
+import { useInboxEvents, mergeThread, addConversationMessage, markConversationRead, prependOlderMessages } from '@/lib/inboxEvents';
+import { uploadProfilePicture, avatarBackground } from '@/lib/profilePicture';
 
 
 interface Member {
@@ -10,6 +13,8 @@ interface Member {
   email: string;
   joinDate: string;
   profile_picture: string | null;
+  profile_picture_variants?: Record<string, Record<string, string>> | null;
+  profile_picture_placeholder?: string | null;
   interests: string[];
   saved_at: string;
 }
@@ -33,6 +38,7 @@ const ProfileSection = () => {
   const [passwordError, setPasswordError] = useState('');
   const fileInputRef = useRef<HTMLInputElement>(null);
   const [profileImage, setProfileImage] = useState<string | null>(null);
+  const [profileFile, setProfileFile] = useState<File | null>(null);
   const [successMessage, setSuccessMessage] = useState('');
   const [isLoading, setIsLoading] = useState(false);
   const [isDataLoading, setIsDataLoading] = useState(true);
@@ -111,11 +117,9 @@ const ProfileSection = () => {
   const handleImageChange = (e: React.ChangeEvent<HTMLInputElement>) => {
     const file = e.target.files?.[0];
     if (file) {
-      const reader = new FileReader();
-      reader.onload = (event) => {
-        setProfileImage(event.target?.result as string);
-      };
-      reader.readAsDataURL(file);
+      // Preview the local file; it is uploaded on save
+      setProfileFile(file);
+      setProfileImage(URL.createObjectURL(file));
     }
   };
   
@@ -138,10 +142,16 @@ const ProfileSection = () => {
       const profileData = {
         name: clubData.name,
         description: clubData.description,
-        interests: selectedInterests,
-        profile_picture: profileImage
+        interests: selectedInterests
       };
 
+      // A new picture goes up as a multipart upload; the JSON update carries text fields only
+      let pictureUrl = profileImage;
+      if (profileFile) {
+        pictureUrl = await uploadProfilePicture('club', clubId, profileFile);
+        setProfileFile(null);
+      }
+
       const response = await fetch(`/api/profile/club/${clubId}`, {
         method: 'POST',
         headers: {
@@ -160,7 +170,7 @@ const ProfileSection = () => {
       setClubData({
         ...clubData,
         interests: selectedInterests,
-        profile_picture: profileImage as null
+        profile_picture: pictureUrl as null
       });
       
       
@@ -403,46 +413,97 @@ const ProfileSection = () => {
 
 
 const MessagesSection = () => {
-  const [threads, setThreads] = useState<any[]>([]);
   const [activeConversation, setActiveConversation] = useState<any>(null);
   const [newMessage, setNewMessage] = useState('');
-  const [isLoading, setIsLoading] = useState(true);
+  const [isLoading, setIsLoading] = useState(false);
   const [loadError, setLoadError] = useState('');
   const messageContainerRef = useRef<HTMLDivElement>(null);
   const [successMessage, setSuccessMessage] = useState('');
 
- 
+  const [clubId, setClubId] = useState<number | null>(null);
+  const activeConversationRef = useRef<any>(null);
+  activeConversationRef.current = activeConversation;
+
   useEffect(() => {
-    const fetchMessageThreads = async () => {
-      try {
-        setIsLoading(true);
-        setLoadError('');
-        
-        
-        const storedId = sessionStorage.getItem('clubId');
-        const clubId = storedId ? parseInt(storedId) : 1; 
-        
-        const response = await fetch(`/api/messages/club/${clubId}/threads`);
-        
-        if (response.ok) {
-          const data = await response.json();
-          console.log("Loaded threads:", data);
-          setThreads(data);
-        } else {
-          const errorData = await response.json();
-          setLoadError(`Failed to load messages: ${errorData.detail || 'Unknown error'}`);
-          console.error('Error loading messages:', errorData);
-        }
-      } catch (error) {
-        setLoadError('Failed to connect to server. Please try again later.');
-        console.error('Error fetching message threads:', error);
-      } finally {
-        setIsLoading(false);
+    const storedId = sessionStorage.getItem('clubId');
+    setClubId(storedId ? parseInt(storedId) : 1);
+  }, []);
+
+  // Newest conversations first, one page at a time; older ones load when the list is scrolled to its end
+  const threadPages = usePagedList(clubId ? `/api/messages/club/${clubId}/threads` : null);
+  const threads = threadPages.items;
+  const setThreads = threadPages.setItems;
+  const loadMoreThreadsRef = useLoadMoreOnScroll<HTMLButtonElement>(threadPages.loadMore, threadPages.hasMore && !threadPages.isLoading && !threadPages.isLoadingMore);
+  const threadsError = threadPages.error
+    ? (threadPages.error instanceof Error
+      ? 'Failed to connect to server. Please try again later.'
+      : `Failed to load messages: ${threadPages.error.detail || 'Unknown error'}`)
+    : '';
+
+  // Conversations open on their latest page; older pages are fetched with `before` and put in front
+  const [isLoadingOlder, setIsLoadingOlder] = useState(false);
+  const scrollFromBottomRef = useRef<number | null>(null);
+
+  // Keep the message that was at the top in place once older messages render above it
+  useLayoutEffect(() => {
+    const container = messageContainerRef.current;
+    if (container && scrollFromBottomRef.current !== null) {
+      container.scrollTop = container.scrollHeight - scrollFromBottomRef.current;
+      scrollFromBottomRef.current = null;
+    }
+  }, [activeConversation]);
+
+  const loadOlderMessages = async () => {
+    const open = activeConversationRef.current;
+    if (!open?.next_cursor || isLoadingOlder) return;
+
+    try {
+      setIsLoadingOlder(true);
+      const response = await fetch(
+        `/api/messages/club/${clubId}/conversation/${open.other_user.type}/${open.other_user.id}?before=${encodeURIComponent(open.next_cursor)}`
+      );
+
+      if (response.ok) {
+        const older = await response.json();
+        const container = messageContainerRef.current;
+        scrollFromBottomRef.current = container ? container.scrollHeight - container.scrollTop : null;
+        setActiveConversation((current: any) => prependOlderMessages(current, older));
+      } else {
+        const errorData = await response.json();
+        setLoadError(`Failed to load older messages: ${errorData.detail || 'Unknown error'}`);
       }
-    };
+    } catch (error) {
+      setLoadError('Failed to load older messages. Please try again.');
+      console.error('Error loading older messages:', error);
+    } finally {
+      setIsLoadingOlder(false);
+    }
+  };
 
-    fetchMessageThreads();
-  }, []);
+  // Live updates replace re-fetching threads and conversations after every change
+  useInboxEvents('club', clubId, {
+    onThread: (thread) => setThreads(current => mergeThread(current, thread)),
+    onMessage: ({ contact_id, contact_type, message }) => {
+      const open = activeConversationRef.current;
+      if (!open || open.other_user.id !== contact_id || open.other_user.type !== contact_type) return;
+      setActiveConversation((current: any) => addConversationMessage(current, contact_id, contact_type, message));
+      if (!message.sent_by_me) {
+        fetch(`/api/messages/club/${clubId}/read/${message.id}`, { method: 'POST' });
+      }
+      setTimeout(() => {
+        if (messageContainerRef.current) {
+          messageContainerRef.current.scrollTop = messageContainerRef.current.scrollHeight;
+        }
+      }, 100);
+    },
+    onRead: ({ contact_id, contact_type, message_ids }) =>
+      setActiveConversation((current: any) => markConversationRead(current, contact_id, contact_type, message_ids)),
+    onResync: () => {
+      threadPages.reload();
+      const open = activeConversationRef.current;
+      if (open) loadConversation(open.other_user.id, open.other_user.type);
+    }
+  });
 
  
   const loadConversation = async (contactId: number, contactType: string) => {
@@ -516,18 +577,32 @@ const MessagesSection = () => {
       });
       
       if (response.ok) {
-        
+        const sent = await response.json();
         setNewMessage('');
         
-       
-        loadConversation(activeConversation.other_user.id, activeConversation.other_user.type);
-        
-        
-        const threadsResponse = await fetch(`/api/messages/club/${clubId}/threads`);
-        if (threadsResponse.ok) {
-          const threadsData = await threadsResponse.json();
-          setThreads(threadsData);
-        }
+        // Show the sent message right away; the event stream brings the same update to other tabs
+        const contactId = activeConversation.other_user.id;
+        const contactType = activeConversation.other_user.type;
+        setActiveConversation((current: any) => addConversationMessage(current, contactId, contactType, {
+          id: sent.id,
+          content: sent.content,
+          sent_by_me: true,
+          sender_name: sent.sender_name,
+          created_at: sent.created_at,
+          read: sent.read
+        }));
+        setThreads(current => mergeThread(current, {
+          contact_id: contactId,
+          contact_type: contactType,
+          contact_name: activeConversation.other_user.name,
+          contact_profile_picture: activeConversation.other_user.profile_picture,
+          latest_message: { id: sent.id, content: sent.content, sent_by_me: true, created_at: sent.created_at, read: sent.read }
+        }));
+        setTimeout(() => {
+          if (messageContainerRef.current) {
+            messageContainerRef.current.scrollTop = messageContainerRef.current.scrollHeight;
+          }
+        }, 100);
       } else {
         const errorData = await response.json();
         setLoadError(`Failed to send message: ${errorData.detail || 'Unknown error'}`);
@@ -566,9 +641,9 @@ const MessagesSection = () => {
     <div className={styles.section}>
       <h2 suppressHydrationWarning={true}>Messages</h2>
       
-      {loadError && (
+      {(loadError || threadsError) && (
         <div className={styles.error}>
-          {loadError}
+          {loadError || threadsError}
           <button 
             onClick={() => window.location.reload()} 
             className={styles.retryButton}
@@ -585,7 +660,7 @@ const MessagesSection = () => {
             <h3>Conversations</h3>
           </div>
           
-          {isLoading && !activeConversation ? (
+          {(threadPages.isLoading || isLoading) && !activeConversation ? (
             <div className={styles.loadingContainer}>
               <div className={styles.loading}>Loading conversations...</div>
             </div>
@@ -635,6 +710,16 @@ const MessagesSection = () => {
                   </div>
                 </div>
               ))}
+              {threadPages.hasMore && (
+                <button
+                  ref={loadMoreThreadsRef}
+                  className={styles.loadMoreButton}
+                  onClick={threadPages.loadMore}
+                  disabled={threadPages.isLoadingMore}
+                >
+                  {threadPages.isLoadingMore ? 'Loading...' : 'Load older conversations'}
+                </button>
+              )}
             </div>
           ) : (
             <div className={styles.noMessages}>
@@ -679,6 +764,15 @@ const MessagesSection = () => {
               </div>
               
               <div className={styles.messagesView} ref={messageContainerRef}>
+                {activeConversation.next_cursor && (
+                  <button
+                    className={styles.loadMoreButton}
+                    onClick={loadOlderMessages}
+                    disabled={isLoadingOlder}
+                  >
+                    {isLoadingOlder ? 'Loading...' : 'Load older messages'}
+                  </button>
+                )}
                 {activeConversation.messages.map((message: any) => (
                   <div 
                     key={message.id}
@@ -747,49 +841,28 @@ const MessagesSection = () => {
 
 
 const MembersSection = () => {
-  const [members, setMembers] = useState<Member[]>([]);
   const [selectedMember, setSelectedMember] = useState<number | null>(null);
   const [messageText, setMessageText] = useState('');
+  const [broadcastText, setBroadcastText] = useState('');
+  const [isBroadcasting, setIsBroadcasting] = useState(false);
   const [successMessage, setSuccessMessage] = useState('');
-  const [isLoading, setIsLoading] = useState(true);
-  const [loadError, setLoadError] = useState('');
-  
-  
-  useEffect(() => {
-    const fetchMembers = async () => {
-      try {
-        setIsLoading(true);
-        setLoadError('');
-        
-        
-        const storedId = sessionStorage.getItem('clubId');
-        const clubId = storedId ? parseInt(storedId) : 1; // Fallback to 1 if not found
-        
-        const response = await fetch(`/api/club/${clubId}/members`);
-        
-        if (response.ok) {
-          const data = await response.json();
-          console.log("Loaded club members:", data);
-          setMembers(data);
-        } else {
-          const errorData = await response.json();
-          setLoadError(`Failed to load members: ${errorData.detail || 'Unknown error'}`);
-          console.error('Error loading members:', errorData);
-       
-          setMembers([]);
-        }
-      } catch (error) {
-        setLoadError('Failed to connect to server. Please try again later.');
-        console.error('Error fetching members:', error);
-        
-        setMembers([]);
-      } finally {
-        setIsLoading(false);
-      }
-    };
+  const [clubId, setClubId] = useState<number | null>(null);
 
-    fetchMembers();
+  useEffect(() => {
+    const storedId = sessionStorage.getItem('clubId');
+    setClubId(storedId ? parseInt(storedId) : 1); // Fallback to 1 if not found
   }, []);
+
+  // Members are paged, newest saves first; scrolling to the end of the table loads the next page
+  const memberPages = usePagedList<Member>(clubId ? `/api/club/${clubId}/members` : null);
+  const loadMoreRef = useLoadMoreOnScroll<HTMLButtonElement>(memberPages.loadMore, memberPages.hasMore && !memberPages.isLoading && !memberPages.isLoadingMore);
+  const members = memberPages.items;
+  const isLoading = clubId === null || memberPages.isLoading;
+  const loadError = memberPages.error
+    ? (memberPages.error instanceof Error
+      ? 'Failed to connect to server. Please try again later.'
+      : `Failed to load members: ${memberPages.error.detail || 'Unknown error'}`)
+    : '';
   
  
   const getInitials = (name: string) => {
@@ -854,6 +927,40 @@ const MembersSection = () => {
     }
   };
 
+  // One request for every student who saved the club instead of one send per member
+  const broadcastToMembers = async () => {
+    if (!broadcastText.trim()) return;
+    
+    try {
+      setIsBroadcasting(true);
+      const storedId = sessionStorage.getItem('clubId');
+      const clubId = storedId ? parseInt(storedId) : 1;
+      
+      const response = await fetch(`/api/messages/club/${clubId}/broadcast`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ content: broadcastText }),
+      });
+      
+      if (response.ok) {
+        const data = await response.json();
+        setSuccessMessage(`Message sent to ${data.recipients} students!`);
+        setBroadcastText('');
+        setTimeout(() => setSuccessMessage(''), 3000);
+      } else {
+        const errorData = await response.json();
+        setLoadError(`Failed to send message: ${errorData.detail || 'Unknown error'}`);
+      }
+    } catch (error) {
+      setLoadError('Failed to send message. Please try again.');
+      console.error('Error broadcasting message:', error);
+    } finally {
+      setIsBroadcasting(false);
+    }
+  };
+
   
   const currentMember = selectedMember 
     ? members.find(member => member.id === selectedMember) 
@@ -898,6 +1005,27 @@ const MembersSection = () => {
         </div>
       ) : !selectedMember ? (
         <div className={styles.tableContainer}>
+          {members.length > 0 && (
+            <div className={styles.messageContainer}>
+              <h4>Message All Students</h4>
+              <textarea
+                value={broadcastText}
+                onChange={(e) => setBroadcastText(e.target.value)}
+                placeholder="Type an announcement for everyone who saved your club..."
+                className={styles.messageTextarea}
+                rows={3}
+              />
+              <div className={styles.messageActions}>
+                <button 
+                  className={styles.sendButton}
+                  onClick={broadcastToMembers}
+                  disabled={!broadcastText.trim() || isBroadcasting}
+                >
+                  {isBroadcasting ? 'Sending...' : memberPages.hasMore ? 'Send to All Students' : `Send to ${members.length} Students`}
+                </button>
+              </div>
+            </div>
+          )}
           {members.length > 0 ? (
             <table className={styles.membersTable}>
               <thead>
@@ -917,7 +1045,7 @@ const MembersSection = () => {
                           {member.profile_picture ? (
                             <div 
                               className={styles.avatarImage} 
-                              style={{ backgroundImage: `url(${member.profile_picture})` }}
+                              style={{ backgroundImage: avatarBackground(member.profile_picture, member.profile_picture_variants, member.profile_picture_placeholder) }}
                             />
                           ) : (
                             <div className={styles.avatarInitials}>
@@ -962,6 +1090,16 @@ const MembersSection = () => {
               <p className={styles.emptyStateSubtext}>When students save your club, they'll appear here</p>
             </div>
           )}
+          {memberPages.hasMore && (
+            <button
+              ref={loadMoreRef}
+              className={styles.loadMoreButton}
+              onClick={memberPages.loadMore}
+              disabled={memberPages.isLoadingMore}
+            >
+              {memberPages.isLoadingMore ? 'Loading...' : 'Load more students'}
+            </button>
+          )}
         </div>
       ) : (
         <div className={styles.memberDetail}>
@@ -979,7 +1117,7 @@ const MembersSection = () => {
               {currentMember?.profile_picture ? (
                 <div 
                   className={styles.largeAvatarImage} 
-                  style={{ backgroundImage: `url(${currentMember.profile_picture})` }}
+                  style={{ backgroundImage: avatarBackground(currentMember.profile_picture, currentMember.profile_picture_variants, currentMember.profile_picture_placeholder, 256) }}
                 />
               ) : (
                 <div className={styles.largeAvatarInitials}>
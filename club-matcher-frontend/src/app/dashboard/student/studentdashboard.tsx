@@ -1,7 +1,10 @@
 'use client';
 
-import { useState, useRef, useEffect } from 'react';
+import { useState, useRef, useEffect, useLayoutEffect } from 'react';
 import styles from './studentdashboard.module.css';
+import { usePagedList, useLoadMoreOnScroll } from '@/lib/pagination';
+import { useInboxEvents, mergeThread, addConversationMessage, markConversationRead, prependOlderMessages } from '@/lib/inboxEvents';
+import { uploadProfilePicture, avatarBackground } from '@/lib/profilePicture';
 
 
 interface Club {
@@ -11,6 +14,8 @@ interface Club {
   interests: string[];
   members: number;
   profilePicture: string | null;
+  profilePictureVariants?: Record<string, Record<string, string>> | null;
+  profilePicturePlaceholder?: string | null;
   email: string;
 }
 
@@ -108,6 +113,7 @@ const ProfileSection = () => {
   const [passwordError, setPasswordError] = useState('');
   const fileInputRef = useRef<HTMLInputElement>(null);
   const [profileImage, setProfileImage] = useState<string | null>(null);
+  const [profileFile, setProfileFile] = useState<File | null>(null);
   const [successMessage, setSuccessMessage] = useState('');
   const [isLoading, setIsLoading] = useState(false);
   const [isDataLoading, setIsDataLoading] = useState(true);
@@ -190,11 +196,9 @@ const ProfileSection = () => {
   const handleImageChange = (e: React.ChangeEvent<HTMLInputElement>) => {
     const file = e.target.files?.[0];
     if (file) {
-      const reader = new FileReader();
-      reader.onload = (event) => {
-        setProfileImage(event.target?.result as string);
-      };
-      reader.readAsDataURL(file);
+      // Preview the local file; it is uploaded on save
+      setProfileFile(file);
+      setProfileImage(URL.createObjectURL(file));
     }
   };
 
@@ -209,10 +213,16 @@ const ProfileSection = () => {
       
       const profileData = {
         name: userData.name,
-        interests: selectedInterests,
-        profile_picture: profileImage
+        interests: selectedInterests
       };
 
+      // A new picture goes up as a multipart upload; the JSON update carries text fields only
+      let pictureUrl = profileImage;
+      if (profileFile) {
+        pictureUrl = await uploadProfilePicture('student', studentId, profileFile);
+        setProfileFile(null);
+      }
+
       const response = await fetch(`/api/profile/student/${studentId}`, {
         method: 'POST',
         headers: {
@@ -231,7 +241,7 @@ const ProfileSection = () => {
       setUserData({
         ...userData,
         interests: selectedInterests,
-        profilePicture: profileImage
+        profilePicture: pictureUrl
       });
       
      
@@ -442,9 +452,26 @@ const SearchSection = () => {
   const [contactMessage, setContactMessage] = useState('');
   const [activeClubId, setActiveClubId] = useState<number | null>(null);
   const [successMessage, setSuccessMessage] = useState('');
-  const [clubs, setClubs] = useState<Club[]>([]);
-  const [isLoading, setIsLoading] = useState(true);
-  const [error, setError] = useState('');
+  // The catalog is paged: the first page renders right away and scrolling to the end loads the next
+  const catalog = usePagedList('/api/clubs');
+  const loadMoreRef = useLoadMoreOnScroll<HTMLButtonElement>(catalog.loadMore, catalog.hasMore && !catalog.isLoading && !catalog.isLoadingMore);
+  const isLoading = catalog.isLoading;
+  const error = catalog.error
+    ? (catalog.error instanceof Error
+      ? 'Failed to connect to server. Using sample data instead.'
+      : `Failed to load clubs: ${catalog.error.detail || 'Unknown error'}`)
+    : '';
+  const clubs: Club[] = catalog.error && catalog.items.length === 0 ? mockClubs : catalog.items.map((club: any) => ({
+    id: club.id,
+    name: club.name,
+    description: club.description,
+    interests: club.interests,
+    members: club.members,
+    profilePicture: club.profile_picture,
+    profilePictureVariants: club.profile_picture_variants,
+    profilePicturePlaceholder: club.profile_picture_placeholder,
+    email: club.email
+  }));
 
   
   const fetchSavedClubsStatus = async () => {
@@ -470,46 +497,7 @@ const SearchSection = () => {
 
   
   useEffect(() => {
-    const fetchClubs = async () => {
-      try {
-        setIsLoading(true);
-        setError('');
-        
-        const response = await fetch('/api/clubs');
-        
-        if (response.ok) {
-          const data = await response.json();
-          
-          const mappedClubs = data.map((club: any) => ({
-            id: club.id,
-            name: club.name,
-            description: club.description,
-            interests: club.interests,
-            members: club.members,
-            profilePicture: club.profile_picture,
-            email: club.email
-          }));
-          setClubs(mappedClubs);
-          
-          
-          await fetchSavedClubsStatus();
-        } else {
-          const errorData = await response.json();
-          setError(`Failed to load clubs: ${errorData.detail || 'Unknown error'}`);
-          console.error('Error loading clubs:', errorData);
-          
-          setClubs(mockClubs);
-        }
-      } catch (error) {
-        setError('Failed to connect to server. Using sample data instead.');
-        console.error('Error fetching clubs:', error);
-        setClubs(mockClubs);
-      } finally {
-        setIsLoading(false);
-      }
-    };
-
-    fetchClubs();
+    fetchSavedClubsStatus();
   }, []);
 
   
@@ -722,7 +710,7 @@ const SearchSection = () => {
 
       {/* Club results */}
       <div className={styles.clubResults}>
-        <h3>Results ({filteredClubs.length} clubs found)</h3>
+        <h3>Results ({filteredClubs.length} clubs found{catalog.hasMore ? ' so far' : ''})</h3>
         
         {isLoading ? (
           <div className={styles.loadingContainer}>
@@ -737,7 +725,7 @@ const SearchSection = () => {
                     {club.profilePicture ? (
                       <div 
                         className={styles.clubAvatarImage} 
-                        style={{ backgroundImage: `url(${club.profilePicture.startsWith('data:') || club.profilePicture.startsWith('http') ? club.profilePicture : club.profilePicture})` }}
+                        style={{ backgroundImage: avatarBackground(club.profilePicture, club.profilePictureVariants, club.profilePicturePlaceholder) }}
                       />
                     ) : (
                       <div className={styles.clubAvatarInitials}>
@@ -783,7 +771,7 @@ const SearchSection = () => {
         ) : (
           <div className={styles.noResults}>
             <div className={styles.emptyStateIcon}>🔍</div>
-            <p>No clubs match your search criteria</p>
+            <p>No {catalog.hasMore ? 'loaded ' : ''}clubs match your search criteria</p>
             <button 
               className={styles.clearFiltersButton}
               onClick={() => {
@@ -796,6 +784,17 @@ const SearchSection = () => {
             </button>
           </div>
         )}
+
+        {catalog.hasMore && !isLoading && (
+          <button
+            ref={loadMoreRef}
+            className={styles.loadMoreButton}
+            onClick={catalog.loadMore}
+            disabled={catalog.isLoadingMore}
+          >
+            {catalog.isLoadingMore ? 'Loading...' : 'Load more clubs'}
+          </button>
+        )}
       </div>
       
       {/* Contact Modal */}
@@ -871,7 +870,7 @@ const ClubProfileModal = ({ club, onClose }: { club: Club | null, onClose: () =>
               {club.profilePicture ? (
                 <div 
                   className={styles.largeAvatarImage} 
-                  style={{ backgroundImage: `url(${club.profilePicture})` }}
+                  style={{ backgroundImage: avatarBackground(club.profilePicture, club.profilePictureVariants, club.profilePicturePlaceholder, 256) }}
                 />
               ) : (
                 <div className={styles.largeAvatarInitials}>
@@ -1158,7 +1157,7 @@ const SavedClubsSection = () => {
                   {club.profilePicture ? (
                     <div 
                       className={styles.clubAvatarImage} 
-                      style={{ backgroundImage: `url(${club.profilePicture.startsWith('data:') || club.profilePicture.startsWith('http') ? club.profilePicture : club.profilePicture})` }}
+                      style={{ backgroundImage: avatarBackground(club.profilePicture, club.profilePictureVariants, club.profilePicturePlaceholder) }}
                     />
                   ) : (
                     <div className={styles.clubAvatarInitials}>
@@ -1284,44 +1283,96 @@ const SavedClubsSection = () => {
 
 
 const MessagesSection = () => {
-  const [threads, setThreads] = useState<any[]>([]);
   const [activeConversation, setActiveConversation] = useState<any>(null);
   const [newMessage, setNewMessage] = useState('');
-  const [isLoading, setIsLoading] = useState(true);
+  const [isLoading, setIsLoading] = useState(false);
   const [loadError, setLoadError] = useState('');
   const messageContainerRef = useRef<HTMLDivElement>(null);
 
- 
+  const [studentId, setStudentId] = useState<number | null>(null);
+  const activeConversationRef = useRef<any>(null);
+  activeConversationRef.current = activeConversation;
+
   useEffect(() => {
-    const fetchMessageThreads = async () => {
-      try {
-        setIsLoading(true);
-        setLoadError('');
-        
-       
-        const storedId = sessionStorage.getItem('studentId');
-        const studentId = storedId ? parseInt(storedId) : 1; // Fallback to 1 if not found
-        
-        const response = await fetch(`/api/messages/student/${studentId}/threads`);
-        
-        if (response.ok) {
-          const data = await response.json();
-          setThreads(data);
-        } else {
-          const errorData = await response.json();
-          setLoadError(`Failed to load messages: ${errorData.detail || 'Unknown error'}`);
-          console.error('Error loading messages:', errorData);
-        }
-      } catch (error) {
-        setLoadError('Failed to connect to server. Please try again later.');
-        console.error('Error fetching message threads:', error);
-      } finally {
-        setIsLoading(false);
+    const storedId = sessionStorage.getItem('studentId');
+    setStudentId(storedId ? parseInt(storedId) : 1); // Fallback to 1 if not found
+  }, []);
+
+  // Newest conversations first, one page at a time; older ones load when the list is scrolled to its end
+  const threadPages = usePagedList(studentId ? `/api/messages/student/${studentId}/threads` : null);
+  const threads = threadPages.items;
+  const setThreads = threadPages.setItems;
+  const loadMoreThreadsRef = useLoadMoreOnScroll<HTMLButtonElement>(threadPages.loadMore, threadPages.hasMore && !threadPages.isLoading && !threadPages.isLoadingMore);
+  const threadsError = threadPages.error
+    ? (threadPages.error instanceof Error
+      ? 'Failed to connect to server. Please try again later.'
+      : `Failed to load messages: ${threadPages.error.detail || 'Unknown error'}`)
+    : '';
+
+  // Conversations open on their latest page; older pages are fetched with `before` and put in front
+  const [isLoadingOlder, setIsLoadingOlder] = useState(false);
+  const scrollFromBottomRef = useRef<number | null>(null);
+
+  // Keep the message that was at the top in place once older messages render above it
+  useLayoutEffect(() => {
+    const container = messageContainerRef.current;
+    if (container && scrollFromBottomRef.current !== null) {
+      container.scrollTop = container.scrollHeight - scrollFromBottomRef.current;
+      scrollFromBottomRef.current = null;
+    }
+  }, [activeConversation]);
+
+  const loadOlderMessages = async () => {
+    const open = activeConversationRef.current;
+    if (!open?.next_cursor || isLoadingOlder) return;
+
+    try {
+      setIsLoadingOlder(true);
+      const response = await fetch(
+        `/api/messages/student/${studentId}/conversation/${open.other_user.type}/${open.other_user.id}?before=${encodeURIComponent(open.next_cursor)}`
+      );
+
+      if (response.ok) {
+        const older = await response.json();
+        const container = messageContainerRef.current;
+        scrollFromBottomRef.current = container ? container.scrollHeight - container.scrollTop : null;
+        setActiveConversation((current: any) => prependOlderMessages(current, older));
+      } else {
+        const errorData = await response.json();
+        setLoadError(`Failed to load older messages: ${errorData.detail || 'Unknown error'}`);
       }
-    };
+    } catch (error) {
+      setLoadError('Failed to load older messages. Please try again.');
+      console.error('Error loading older messages:', error);
+    } finally {
+      setIsLoadingOlder(false);
+    }
+  };
 
-    fetchMessageThreads();
-  }, []);
+  // Live updates replace re-fetching threads and conversations after every change
+  useInboxEvents('student', studentId, {
+    onThread: (thread) => setThreads(current => mergeThread(current, thread)),
+    onMessage: ({ contact_id, contact_type, message }) => {
+      const open = activeConversationRef.current;
+      if (!open || open.other_user.id !== contact_id || open.other_user.type !== contact_type) return;
+      setActiveConversation((current: any) => addConversationMessage(current, contact_id, contact_type, message));
+      if (!message.sent_by_me) {
+        fetch(`/api/messages/student/${studentId}/read/${message.id}`, { method: 'POST' });
+      }
+      setTimeout(() => {
+        if (messageContainerRef.current) {
+          messageContainerRef.current.scrollTop = messageContainerRef.current.scrollHeight;
+        }
+      }, 100);
+    },
+    onRead: ({ contact_id, contact_type, message_ids }) =>
+      setActiveConversation((current: any) => markConversationRead(current, contact_id, contact_type, message_ids)),
+    onResync: () => {
+      threadPages.reload();
+      const open = activeConversationRef.current;
+      if (open) loadConversation(open.other_user.id, open.other_user.type);
+    }
+  });
 
   
   const loadConversation = async (contactId: number, contactType: string) => {
@@ -1395,18 +1446,32 @@ const MessagesSection = () => {
       });
       
       if (response.ok) {
-        
+        const sent = await response.json();
         setNewMessage('');
         
-      
-        loadConversation(activeConversation.other_user.id, activeConversation.other_user.type);
-        
-        
-        const threadsResponse = await fetch(`/api/messages/student/${studentId}/threads`);
-        if (threadsResponse.ok) {
-          const threadsData = await threadsResponse.json();
-          setThreads(threadsData);
-        }
+        // Show the sent message right away; the event stream brings the same update to other tabs
+        const contactId = activeConversation.other_user.id;
+        const contactType = activeConversation.other_user.type;
+        setActiveConversation((current: any) => addConversationMessage(current, contactId, contactType, {
+          id: sent.id,
+          content: sent.content,
+          sent_by_me: true,
+          sender_name: sent.sender_name,
+          created_at: sent.created_at,
+          read: sent.read
+        }));
+        setThreads(current => mergeThread(current, {
+          contact_id: contactId,
+          contact_type: contactType,
+          contact_name: activeConversation.other_user.name,
+          contact_profile_picture: activeConversation.other_user.profile_picture,
+          latest_message: { id: sent.id, content: sent.content, sent_by_me: true, created_at: sent.created_at, read: sent.read }
+        }));
+        setTimeout(() => {
+          if (messageContainerRef.current) {
+            messageContainerRef.current.scrollTop = messageContainerRef.current.scrollHeight;
+          }
+        }, 100);
       } else {
         const errorData = await response.json();
         setLoadError(`Failed to send message: ${errorData.detail || 'Unknown error'}`);
@@ -1445,9 +1510,9 @@ const MessagesSection = () => {
     <div className={styles.section}>
       <h2 suppressHydrationWarning={true}>Messages</h2>
       
-      {loadError && (
+      {(loadError || threadsError) && (
         <div className={styles.error}>
-          {loadError}
+          {loadError || threadsError}
           <button 
             onClick={() => window.location.reload()} 
             className={styles.retryButton}
@@ -1464,7 +1529,7 @@ const MessagesSection = () => {
             <h3>Conversations</h3>
           </div>
           
-          {isLoading && !activeConversation ? (
+          {(threadPages.isLoading || isLoading) && !activeConversation ? (
             <div className={styles.loadingContainer}>
               <div className={styles.loading}>Loading conversations...</div>
             </div>
@@ -1514,6 +1579,16 @@ const MessagesSection = () => {
                   </div>
                 </div>
               ))}
+              {threadPages.hasMore && (
+                <button
+                  ref={loadMoreThreadsRef}
+                  className={styles.loadMoreButton}
+                  onClick={threadPages.loadMore}
+                  disabled={threadPages.isLoadingMore}
+                >
+                  {threadPages.isLoadingMore ? 'Loading...' : 'Load older conversations'}
+                </button>
+              )}
             </div>
           ) : (
             <div className={styles.noMessages}>
@@ -1558,6 +1633,15 @@ const MessagesSection = () => {
               </div>
               
               <div className={styles.messagesView} ref={messageContainerRef}>
+                {activeConversation.next_cursor && (
+                  <button
+                    className={styles.loadMoreButton}
+                    onClick={loadOlderMessages}
+                    disabled={isLoadingOlder}
+                  >
+                    {isLoadingOlder ? 'Loading...' : 'Load older messages'}
+                  </button>
+                )}
                 {activeConversation.messages.map((message: any) => (
                   <div 
                     key={message.id}
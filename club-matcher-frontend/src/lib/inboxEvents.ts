@@ -0,0 +1,81 @@
+import { useEffect, useRef } from 'react';
+
+export type InboxEventHandlers = {
+  onThread?: (thread: any) => void;
+  onMessage?: (event: { contact_id: number; contact_type: string; message: any }) => void;
+  onRead?: (event: { contact_id: number; contact_type: string; message_ids: number[] }) => void;
+  onResync?: () => void;
+};
+
+// Subscribe to a user's inbox event stream (new messages, thread updates, read receipts)
+export function useInboxEvents(userType: 'student' | 'club', userId: number | null, handlers: InboxEventHandlers) {
+  const handlersRef = useRef(handlers);
+  handlersRef.current = handlers;
+
+  useEffect(() => {
+    if (!userId) return;
+
+    // EventSource reconnects by itself after network errors
+    const source = new EventSource(`/api/messages/${userType}/${userId}/events`);
+    const listen = (name: string, handler: (data: any) => void) => {
+      source.addEventListener(name, (event) => handler(JSON.parse((event as MessageEvent).data)));
+    };
+
+    let connectedBefore = false;
+    listen('ready', () => {
+      // Events published while reconnecting were missed
+      if (connectedBefore) handlersRef.current.onResync?.();
+      connectedBefore = true;
+    });
+    listen('thread', (data) => handlersRef.current.onThread?.(data));
+    listen('message', (data) => handlersRef.current.onMessage?.(data));
+    listen('read', (data) => handlersRef.current.onRead?.(data));
+    listen('resync', () => handlersRef.current.onResync?.());
+
+    return () => source.close();
+  }, [userType, userId]);
+}
+
+// Merge a thread update into a thread list, keeping the newest conversation first
+export function mergeThread(threads: any[], update: any) {
+  const existing = threads.find(t => t.contact_id === update.contact_id && t.contact_type === update.contact_type);
+  const merged = { ...existing, ...update };
+  return [merged, ...threads.filter(t => t !== existing)].sort(
+    (a, b) => new Date(b.latest_message.created_at).getTime() - new Date(a.latest_message.created_at).getTime()
+  );
+}
+
+// Add a message to an open conversation once, and apply read receipts to it
+export function addConversationMessage(conversation: any, contactId: number, contactType: string, message: any) {
+  if (!conversation || conversation.other_user.id !== contactId || conversation.other_user.type !== contactType) {
+    return conversation;
+  }
+  if (conversation.messages.some((m: any) => m.id === message.id)) {
+    return conversation;
+  }
+  return { ...conversation, messages: [...conversation.messages, message] };
+}
+
+// Put an older page of a conversation in front of the loaded messages and continue from its next_cursor
+export function prependOlderMessages(conversation: any, older: any) {
+  if (!conversation || conversation.other_user.id !== older.other_user.id || conversation.other_user.type !== older.other_user.type) {
+    return conversation;
+  }
+  const loaded = new Set(conversation.messages.map((m: any) => m.id));
+  return {
+    ...conversation,
+    messages: [...older.messages.filter((m: any) => !loaded.has(m.id)), ...conversation.messages],
+    next_cursor: older.next_cursor
+  };
+}
+
+export function markConversationRead(conversation: any, contactId: number, contactType: string, messageIds: number[]) {
+  if (!conversation || conversation.other_user.id !== contactId || conversation.other_user.type !== contactType) {
+    return conversation;
+  }
+  const ids = new Set(messageIds);
+  return {
+    ...conversation,
+    messages: conversation.messages.map((m: any) => (ids.has(m.id) ? { ...m, read: true } : m))
+  };
+}
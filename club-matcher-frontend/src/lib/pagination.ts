@@ -0,0 +1,101 @@
+import { useCallback, useEffect, useRef, useState } from 'react';
+
+export type Page<T> = { ok: boolean; items: T[]; nextCursor: string | null; error?: any };
+
+// Fetch one page of a cursor-paginated endpoint; `cursor` is the previous page's next_cursor
+export async function fetchPage<T = any>(url: string, cursor: string | null = null): Promise<Page<T>> {
+  const separator = url.includes('?') ? '&' : '?';
+  const response = await fetch(cursor ? `${url}${separator}cursor=${encodeURIComponent(cursor)}` : url);
+
+  if (!response.ok) {
+    return { ok: false, items: [], nextCursor: null, error: await response.json() };
+  }
+
+  const page = await response.json();
+  return { ok: true, items: page.items, nextCursor: page.next_cursor };
+}
+
+// A paginated list loaded one page at a time: the first page when `url` is set (and on reload),
+// each further page on loadMore. Responses to a superseded reload are dropped.
+export function usePagedList<T = any>(url: string | null) {
+  const [items, setItems] = useState<T[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [isLoading, setIsLoading] = useState(url !== null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
+  const [error, setError] = useState<any>(null);
+  const generation = useRef(0);
+  const loadingMore = useRef(false);
+
+  const reload = useCallback(async () => {
+    if (!url) return;
+    const current = ++generation.current;
+    loadingMore.current = false;
+    setIsLoading(true);
+    setIsLoadingMore(false);
+    setError(null);
+    try {
+      const page = await fetchPage<T>(url);
+      if (current !== generation.current) return;
+      if (page.ok) {
+        setItems(page.items);
+        setNextCursor(page.nextCursor);
+      } else {
+        setError(page.error);
+      }
+    } catch (err) {
+      if (current === generation.current) setError(err);
+    } finally {
+      if (current === generation.current) setIsLoading(false);
+    }
+  }, [url]);
+
+  const loadMore = useCallback(async () => {
+    if (!url || !nextCursor || loadingMore.current) return;
+    const current = generation.current;
+    loadingMore.current = true;
+    setIsLoadingMore(true);
+    try {
+      const page = await fetchPage<T>(url, nextCursor);
+      if (current !== generation.current) return;
+      if (page.ok) {
+        setItems(existing => [...existing, ...page.items]);
+        setNextCursor(page.nextCursor);
+      } else {
+        setError(page.error);
+      }
+    } catch (err) {
+      if (current === generation.current) setError(err);
+    } finally {
+      if (current === generation.current) {
+        loadingMore.current = false;
+        setIsLoadingMore(false);
+      }
+    }
+  }, [url, nextCursor]);
+
+  useEffect(() => {
+    reload();
+  }, [reload]);
+
+  return { items, setItems, hasMore: nextCursor !== null, isLoading, isLoadingMore, error, reload, loadMore };
+}
+
+// Call `onVisible` whenever the returned ref's element scrolls into view, e.g. a "Load more" button
+// at the end of a list, so scrolling to the end loads the next page
+export function useLoadMoreOnScroll<E extends Element>(onVisible: () => void, enabled: boolean) {
+  const ref = useRef<E>(null);
+  const onVisibleRef = useRef(onVisible);
+  onVisibleRef.current = onVisible;
+
+  useEffect(() => {
+    const element = ref.current;
+    if (!enabled || !element) return;
+    const observer = new IntersectionObserver(entries => {
+      if (entries.some(entry => entry.isIntersecting)) onVisibleRef.current();
+    });
+    observer.observe(element);
+    return () => observer.disconnect();
+  }, [enabled]);
+
+  return ref;
+}
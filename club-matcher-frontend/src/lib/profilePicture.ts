@@ -0,0 +1,27 @@
+// Upload a profile picture file as multipart form data; resolves to the stored picture URL
+export async function uploadProfilePicture(userType: 'student' | 'club', userId: number, file: File): Promise<string> {
+  const form = new FormData();
+  form.append('file', file);
+
+  // The browser sets the multipart boundary header itself
+  const response = await fetch(`/api/profile/${userType}/${userId}/picture`, { method: 'POST', body: form });
+  const data = await response.json();
+
+  if (!response.ok) {
+    throw new Error(data.detail || 'Failed to upload profile picture');
+  }
+  return data.profile_picture;
+}
+
+// CSS background for an avatar: the WebP variant closest to its display size over the blur placeholder,
+// or the original picture until variants have been rendered
+export function avatarBackground(
+  picture: string | null | undefined,
+  variants: Record<string, Record<string, string>> | null | undefined,
+  placeholder: string | null | undefined,
+  size: 64 | 256 | 512 = 64
+): string | undefined {
+  const url = variants?.[size]?.webp || picture;
+  if (!url) return undefined;
+  return placeholder ? `url(${url}), url(${placeholder})` : `url(${url})`;
+}
@@ -1,5 +1,8 @@
 -- This file contains all necessary tables and indices required for the application
 
+-- Trigram matching for typo-tolerant club search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 CREATE TABLE IF NOT EXISTS auth_credentials (
     id SERIAL PRIMARY KEY,
     email VARCHAR(255) UNIQUE NOT NULL,
@@ -15,6 +18,9 @@ CREATE TABLE IF NOT EXISTS students (
     name VARCHAR(255) NOT NULL,
     interests TEXT[] NOT NULL DEFAULT '{}',
     profile_picture TEXT,
+    -- Resized copies of profile_picture by size and format, and a tiny blurred preview; see services/image_service.py
+    profile_picture_variants JSONB,
+    profile_picture_placeholder TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -27,8 +33,17 @@ CREATE TABLE IF NOT EXISTS clubs (
     description TEXT,
     interests TEXT[] DEFAULT '{}',
     profile_picture TEXT,
+    profile_picture_variants JSONB,
+    profile_picture_placeholder TEXT,
+    -- Number of students who saved the club, maintained by trigger on saved_clubs
+    member_count INTEGER NOT NULL DEFAULT 0,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Weighted full-text document: name ranks above description
+    search_vector TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
 );
 
 
@@ -54,15 +69,49 @@ CREATE TABLE IF NOT EXISTS saved_clubs (
 );
 
 
+-- Top co-saved neighbors of each club, rebuilt by services/recommendation_service.py
+CREATE TABLE IF NOT EXISTS club_recommendations (
+    club_id INTEGER NOT NULL REFERENCES clubs(id) ON DELETE CASCADE,
+    neighbor_id INTEGER NOT NULL REFERENCES clubs(id) ON DELETE CASCADE,
+    co_count INTEGER NOT NULL,
+    score DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (club_id, neighbor_id)
+);
+
+
+-- Range partitioned by month on created_at; partitions come from ensure_message_partitions()
 CREATE TABLE IF NOT EXISTS messages (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     content TEXT NOT NULL,
     sender_id INTEGER NOT NULL,
     sender_type VARCHAR(10) NOT NULL CHECK (sender_type IN ('student', 'club')),
     recipient_id INTEGER NOT NULL,
     recipient_type VARCHAR(10) NOT NULL CHECK (recipient_type IN ('student', 'club')),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    read BOOLEAN DEFAULT FALSE
+    -- Participant pair in canonical order, set by trigger; see make_conversation_key()
+    conversation_key TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    read BOOLEAN DEFAULT FALSE,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Catches messages dated past the last monthly partition, so sends keep working if partition upkeep falls behind
+CREATE TABLE IF NOT EXISTS messages_default PARTITION OF messages DEFAULT;
+
+
+-- Inbox summary: one row per participant per conversation, updated with every send and read
+CREATE TABLE IF NOT EXISTS conversations (
+    owner_id INTEGER NOT NULL,
+    owner_type VARCHAR(10) NOT NULL CHECK (owner_type IN ('student', 'club')),
+    contact_id INTEGER NOT NULL,
+    contact_type VARCHAR(10) NOT NULL CHECK (contact_type IN ('student', 'club')),
+    last_message_id INTEGER NOT NULL,
+    last_message_snippet TEXT NOT NULL,
+    last_message_at TIMESTAMP NOT NULL,
+    last_sent_by_owner BOOLEAN NOT NULL,
+    last_message_read BOOLEAN NOT NULL DEFAULT FALSE,
+    -- Messages from the contact the owner has not read yet
+    unread_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (owner_id, owner_type, contact_id, contact_type)
 );
 
 
@@ -81,18 +130,112 @@ FOR EACH ROW
 EXECUTE FUNCTION update_updated_at_column();
 
 
+-- Only profile edits touch updated_at; member_count changes do not
 CREATE TRIGGER update_club_updated_at
-BEFORE UPDATE ON clubs
+BEFORE UPDATE OF name, description, interests, profile_picture ON clubs
 FOR EACH ROW
 EXECUTE FUNCTION update_updated_at_column();
 
 
+CREATE OR REPLACE FUNCTION update_club_member_count()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE clubs SET member_count = member_count - 1 WHERE id = OLD.club_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE clubs SET member_count = member_count + 1 WHERE id = NEW.club_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+
+CREATE TRIGGER update_saved_clubs_member_count
+AFTER INSERT OR DELETE OR UPDATE OF club_id ON saved_clubs
+FOR EACH ROW
+EXECUTE FUNCTION update_club_member_count();
+
+
+-- Same key for both directions of a conversation, e.g. 'club:3|student:14'
+CREATE OR REPLACE FUNCTION make_conversation_key(a_id INTEGER, a_type VARCHAR, b_id INTEGER, b_type VARCHAR)
+RETURNS TEXT AS $$
+    SELECT CASE WHEN (a_type, a_id) <= (b_type, b_id)
+                THEN a_type || ':' || a_id || '|' || b_type || ':' || b_id
+                ELSE b_type || ':' || b_id || '|' || a_type || ':' || a_id
+           END
+$$ LANGUAGE sql IMMUTABLE;
+
+
+CREATE OR REPLACE FUNCTION set_message_conversation_key()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.conversation_key = make_conversation_key(NEW.sender_id, NEW.sender_type, NEW.recipient_id, NEW.recipient_type);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+
+CREATE TRIGGER set_messages_conversation_key
+BEFORE INSERT OR UPDATE OF sender_id, sender_type, recipient_id, recipient_type ON messages
+FOR EACH ROW
+EXECUTE FUNCTION set_message_conversation_key();
+
+
+-- Create the monthly messages partitions from from_month through months_ahead months past the current one.
+-- Each month is built as a plain table and then attached, which locks the parent more lightly than
+-- CREATE TABLE ... PARTITION OF, so running this while the app serves traffic does not block it.
+CREATE OR REPLACE FUNCTION ensure_message_partitions(months_ahead INTEGER DEFAULT 3, from_month DATE DEFAULT CURRENT_DATE, parent TEXT DEFAULT 'messages')
+RETURNS SETOF TEXT AS $$
+DECLARE
+    part_start DATE := date_trunc('month', from_month);
+    part_name TEXT;
+    default_name TEXT;
+BEGIN
+    -- One caller at a time, so concurrent app workers do not race on the same month
+    PERFORM pg_advisory_xact_lock(hashtext('ensure_message_partitions'));
+    SELECT c.relname INTO default_name
+    FROM pg_partitioned_table p
+    JOIN pg_class c ON c.oid = p.partdefid
+    WHERE p.partrelid = parent::regclass;
+    WHILE part_start <= date_trunc('month', CURRENT_DATE) + make_interval(months => months_ahead) LOOP
+        part_name := 'messages_p' || to_char(part_start, 'YYYY_MM');
+        IF to_regclass(part_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part_name, parent);
+            -- Messages sent while the month was missing wait in the default partition; ATTACH requires
+            -- it to hold none of the month's rows, so move them over first (normally there are none)
+            IF default_name IS NOT NULL THEN
+                EXECUTE format('LOCK TABLE %I IN ACCESS EXCLUSIVE MODE', default_name);
+                EXECUTE format('WITH moved AS (DELETE FROM %I WHERE created_at >= %L AND created_at < %L RETURNING *) INSERT INTO %I SELECT * FROM moved',
+                               default_name, part_start, part_start + INTERVAL '1 month', part_name);
+            END IF;
+            EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                           parent, part_name, part_start, part_start + INTERVAL '1 month');
+            RETURN NEXT part_name;
+        END IF;
+        part_start := part_start + INTERVAL '1 month';
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+
+SELECT ensure_message_partitions();
+
+
 CREATE INDEX IF NOT EXISTS idx_club_members_club_id ON club_members(club_id);
 CREATE INDEX IF NOT EXISTS idx_club_members_student_id ON club_members(student_id);
 CREATE INDEX IF NOT EXISTS idx_saved_clubs_student_id ON saved_clubs(student_id);
 CREATE INDEX IF NOT EXISTS idx_saved_clubs_club_id ON saved_clubs(club_id);
-CREATE INDEX IF NOT EXISTS idx_messages_sender ON messages(sender_id, sender_type);
-CREATE INDEX IF NOT EXISTS idx_messages_recipient ON messages(recipient_id, recipient_type);
+CREATE INDEX IF NOT EXISTS idx_club_recommendations_neighbor_id ON club_recommendations(neighbor_id);
+CREATE INDEX IF NOT EXISTS idx_saved_clubs_club_saved_at ON saved_clubs(club_id, saved_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_sender_created_at ON messages(sender_id, sender_type, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_recipient_created_at ON messages(recipient_id, recipient_type, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_created_at ON messages(conversation_key, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_conversations_owner_recent ON conversations(owner_id, owner_type, last_message_at DESC, last_message_id DESC);
+CREATE INDEX IF NOT EXISTS idx_conversations_owner_unread ON conversations(owner_id, owner_type) INCLUDE (contact_id, contact_type, unread_count) WHERE unread_count > 0;
+CREATE INDEX IF NOT EXISTS idx_messages_recipient_unread ON messages(recipient_id, recipient_type, created_at DESC, id DESC) INCLUDE (sender_id, sender_type) WHERE read = FALSE;
 CREATE INDEX IF NOT EXISTS idx_auth_credentials_email ON auth_credentials(email);
 CREATE INDEX IF NOT EXISTS idx_students_auth_id ON students(auth_id);
-CREATE INDEX IF NOT EXISTS idx_clubs_auth_id ON clubs(auth_id); 
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_clubs_auth_id ON clubs(auth_id);
+CREATE INDEX IF NOT EXISTS idx_clubs_search_vector ON clubs USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_clubs_name_trgm ON clubs USING GIN (name gin_trgm_ops); 
\ No newline at end of file
@@ -1,15 +1,296 @@
 import os
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
 from dotenv import load_dotenv
+from database.query_stats import InstrumentedCursor
 
 load_dotenv()
-# Database connection
-def get_db_connection():
+
+
+# Raised when no pooled connection becomes available within the acquire timeout
+class PoolTimeout(Exception):
+    pass
+
+
+# Open a new database connection using the settings from .env
+def _connect():
     return psycopg2.connect(
         dbname=os.getenv('DB_NAME'),
         user=os.getenv('DB_USER'),
         password=os.getenv('DB_PASSWORD'),
         host=os.getenv('DB_HOST'),
-        cursor_factory=RealDictCursor
-    )
\ No newline at end of file
+        # Dict rows, with every statement timed for the per-request statistics and slow-query log
+        cursor_factory=InstrumentedCursor
+    )
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of psycopg2 connections.
+
+    Connections are health-checked on checkout when they have been idle longer
+    than `check_idle`, and are recycled after `max_uses` checkouts.
+    """
+
+    def __init__(self, min_size=2, max_size=10, timeout=5.0, max_uses=5000, check_idle=30.0, connect=_connect):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_uses = max_uses
+        self.check_idle = check_idle
+        self._connect = connect
+        self._cond = threading.Condition()
+        # Idle connections as (connection, last_used), most recently used last
+        self._idle = []
+        self._uses = {}
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+
+        # Counters surfaced through stats()
+        self._acquired = 0
+        self._timeouts = 0
+        self._recycled = 0
+        self._failed_checks = 0
+        self._acquire_time_total = 0.0
+        self._acquire_time_max = 0.0
+
+        for _ in range(min_size):
+            self._idle.append((self._open(), time.monotonic()))
+            self._size += 1
+
+    # Open a connection for a slot that has already been counted in _size
+    def _open(self):
+        conn = self._connect()
+        self._uses[id(conn)] = 0
+        return conn
+
+    def _close(self, conn):
+        self._uses.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _discard(self, conn):
+        self._close(conn)
+        self._size -= 1
+
+    # Return True if an idle connection is still usable
+    def _is_healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.check_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    # Check a connection out of the pool, waiting up to the acquire timeout
+    def getconn(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self._cond:
+            if self._closed:
+                raise PoolTimeout("Connection pool is closed")
+            self._waiting += 1
+            try:
+                while True:
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        # Reserve the slot, then connect outside the lock
+                        self._size += 1
+                        conn, last_used = None, None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(f"Timed out after {self.timeout}s waiting for a database connection")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            self._in_use += 1
+
+        # Connect or health-check outside the lock; the slot stays reserved
+        try:
+            if conn is None:
+                conn = self._open()
+            elif not self._is_healthy(conn, last_used):
+                with self._cond:
+                    self._failed_checks += 1
+                    self._close(conn)
+                conn = self._open()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        elapsed = time.monotonic() - started
+        with self._cond:
+            self._uses[id(conn)] = self._uses.get(id(conn), 0) + 1
+            self._acquired += 1
+            self._acquire_time_total += elapsed
+            self._acquire_time_max = max(self._acquire_time_max, elapsed)
+        return conn
+
+    # Return a connection to the pool, rolling back any open transaction
+    def putconn(self, conn, close=False):
+        if not close and not conn.closed:
+            try:
+                if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                close = True
+
+        with self._cond:
+            self._in_use -= 1
+            if close or conn.closed or self._closed or self._uses.get(id(conn), 0) >= self.max_uses:
+                if not close and not conn.closed and not self._closed:
+                    self._recycled += 1
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    # Close every idle connection and refuse further checkouts
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+            self._cond.notify_all()
+
+    # Snapshot of pool usage for monitoring
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._size,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "acquired_total": self._acquired,
+                "timeouts_total": self._timeouts,
+                "recycled_total": self._recycled,
+                "failed_health_checks_total": self._failed_checks,
+                "acquire_seconds_avg": self._acquire_time_total / self._acquired if self._acquired else 0.0,
+                "acquire_seconds_max": self._acquire_time_max,
+            }
+
+
+_pool = None
+_executor = None
+_pool_lock = threading.Lock()
+
+
+# Create the shared connection pool from environment settings
+def init_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                min_size=int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+                max_size=int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+                timeout=float(os.getenv('DB_POOL_TIMEOUT', '5')),
+                max_uses=int(os.getenv('DB_POOL_MAX_USES', '5000')),
+                check_idle=float(os.getenv('DB_POOL_CHECK_IDLE', '30')),
+            )
+        return _pool
+
+
+# Close the shared connection pool and its executor
+def close_pool():
+    global _pool, _executor
+    with _pool_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+# Return the shared pool, creating it on first use
+def get_pool():
+    return _pool or init_pool()
+
+
+# Pool statistics for monitoring endpoints
+def pool_stats():
+    if _pool is None:
+        return {}
+    return _pool.stats()
+
+
+# Thread pool that runs blocking database work off the event loop
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _pool_lock:
+            if _executor is None:
+                # Default to one thread per pooled connection so threads never queue on the pool
+                threads = int(os.getenv('DB_EXECUTOR_THREADS', os.getenv('DB_POOL_MAX_SIZE', '10')))
+                _executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="db")
+    return _executor
+
+
+# Run a blocking function on the database executor and await its result
+async def run_db(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context variables into the worker thread
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await loop.run_in_executor(get_executor(), call)
+
+
+# Decorator turning a blocking function into a coroutine that runs on the database executor
+def db_task(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_db(func, *args, **kwargs)
+    return wrapper
+
+
+# Borrow a pooled connection for the duration of a `with` block
+@contextmanager
+def db_connection():
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    except psycopg2.InterfaceError:
+        pool.putconn(conn, close=True)
+        conn = None
+        raise
+    finally:
+        if conn is not None:
+            pool.putconn(conn)
+
+
+# FastAPI dependency yielding a pooled connection
+def get_db():
+    with db_connection() as conn:
+        yield conn
+
+
+# Open a standalone, unpooled connection (for scripts and maintenance jobs)
+def get_db_connection():
+    return _connect()
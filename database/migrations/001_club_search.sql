@@ -0,0 +1,13 @@
+-- Ranked full-text and trigram search over club names and descriptions
+-- Safe to run more than once on an existing database
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE clubs
+    ADD COLUMN IF NOT EXISTS search_vector TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_clubs_search_vector ON clubs USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_clubs_name_trgm ON clubs USING GIN (name gin_trgm_ops);
@@ -0,0 +1,12 @@
+-- Item-item recommendations derived from saved_clubs
+-- Populate with: python -m services.recommendation_service
+
+CREATE TABLE IF NOT EXISTS club_recommendations (
+    club_id INTEGER NOT NULL REFERENCES clubs(id) ON DELETE CASCADE,
+    neighbor_id INTEGER NOT NULL REFERENCES clubs(id) ON DELETE CASCADE,
+    co_count INTEGER NOT NULL,
+    score DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (club_id, neighbor_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_club_recommendations_neighbor_id ON club_recommendations(neighbor_id);
@@ -0,0 +1,48 @@
+-- Denormalized clubs.member_count maintained by a trigger on saved_clubs
+-- Saves are blocked only while the backfill runs; reads continue throughout
+
+BEGIN;
+
+ALTER TABLE clubs ADD COLUMN IF NOT EXISTS member_count INTEGER NOT NULL DEFAULT 0;
+
+-- Keep saved_clubs stable between the backfill and the trigger taking over
+LOCK TABLE saved_clubs IN SHARE MODE;
+
+CREATE OR REPLACE FUNCTION update_club_member_count()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE clubs SET member_count = member_count - 1 WHERE id = OLD.club_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE clubs SET member_count = member_count + 1 WHERE id = NEW.club_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS update_saved_clubs_member_count ON saved_clubs;
+CREATE TRIGGER update_saved_clubs_member_count
+AFTER INSERT OR DELETE OR UPDATE OF club_id ON saved_clubs
+FOR EACH ROW
+EXECUTE FUNCTION update_club_member_count();
+
+-- Member count changes should not look like profile edits
+DROP TRIGGER IF EXISTS update_club_updated_at ON clubs;
+CREATE TRIGGER update_club_updated_at
+BEFORE UPDATE OF name, description, interests, profile_picture ON clubs
+FOR EACH ROW
+EXECUTE FUNCTION update_updated_at_column();
+
+-- Backfill
+UPDATE clubs c
+SET member_count = counts.n
+FROM (
+    SELECT c2.id, COUNT(sc.id) AS n
+    FROM clubs c2
+    LEFT JOIN saved_clubs sc ON sc.club_id = c2.id
+    GROUP BY c2.id
+) counts
+WHERE counts.id = c.id AND c.member_count <> counts.n;
+
+COMMIT;
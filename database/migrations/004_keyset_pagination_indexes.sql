@@ -0,0 +1,15 @@
+-- Composite indexes so each keyset page is a single index range scan
+-- CONCURRENTLY keeps tables writable while the indexes build; run outside a transaction
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_saved_clubs_club_saved_at
+    ON saved_clubs(club_id, saved_at DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_sender_created_at
+    ON messages(sender_id, sender_type, created_at DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_recipient_created_at
+    ON messages(recipient_id, recipient_type, created_at DESC, id DESC);
+
+-- The new indexes start with the same columns, so the old ones are redundant
+DROP INDEX CONCURRENTLY IF EXISTS idx_messages_sender;
+DROP INDEX CONCURRENTLY IF EXISTS idx_messages_recipient;
@@ -0,0 +1,66 @@
+-- Conversation summary rows behind the message thread inbox, backfilled from messages
+-- Sends are blocked only while the backfill runs. Safe to re-run: every row is recomputed.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS conversations (
+    owner_id INTEGER NOT NULL,
+    owner_type VARCHAR(10) NOT NULL CHECK (owner_type IN ('student', 'club')),
+    contact_id INTEGER NOT NULL,
+    contact_type VARCHAR(10) NOT NULL CHECK (contact_type IN ('student', 'club')),
+    last_message_id INTEGER NOT NULL,
+    last_message_snippet TEXT NOT NULL,
+    last_message_at TIMESTAMP NOT NULL,
+    last_sent_by_owner BOOLEAN NOT NULL,
+    last_message_read BOOLEAN NOT NULL DEFAULT FALSE,
+    unread_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (owner_id, owner_type, contact_id, contact_type)
+);
+
+CREATE INDEX IF NOT EXISTS idx_conversations_owner_recent
+    ON conversations(owner_id, owner_type, last_message_at DESC, last_message_id DESC);
+
+-- Keep messages stable until the application maintains the table itself
+LOCK TABLE messages IN SHARE MODE;
+
+-- Backfill: each message appears once from the sender's side and once from the recipient's.
+-- Unread means read = FALSE, as everywhere else (messages with read NULL are never counted)
+WITH sides AS (
+    SELECT id, content, created_at, read,
+           sender_id AS owner_id, sender_type AS owner_type,
+           recipient_id AS contact_id, recipient_type AS contact_type,
+           TRUE AS sent_by_owner
+    FROM messages
+    UNION ALL
+    SELECT id, content, created_at, read,
+           recipient_id, recipient_type, sender_id, sender_type,
+           FALSE
+    FROM messages
+    WHERE NOT (sender_id = recipient_id AND sender_type = recipient_type)
+),
+latest AS (
+    SELECT DISTINCT ON (owner_id, owner_type, contact_id, contact_type) *
+    FROM sides
+    ORDER BY owner_id, owner_type, contact_id, contact_type, created_at DESC, id DESC
+),
+unread AS (
+    SELECT owner_id, owner_type, contact_id, contact_type,
+           COUNT(*) FILTER (WHERE NOT sent_by_owner AND read = FALSE) AS n
+    FROM sides
+    GROUP BY owner_id, owner_type, contact_id, contact_type
+)
+INSERT INTO conversations (owner_id, owner_type, contact_id, contact_type, last_message_id,
+                           last_message_snippet, last_message_at, last_sent_by_owner, last_message_read, unread_count)
+SELECT l.owner_id, l.owner_type, l.contact_id, l.contact_type, l.id,
+       left(l.content, 200), l.created_at, l.sent_by_owner, COALESCE(l.read, FALSE), u.n
+FROM latest l
+JOIN unread u USING (owner_id, owner_type, contact_id, contact_type)
+ON CONFLICT (owner_id, owner_type, contact_id, contact_type) DO UPDATE SET
+    last_message_id = EXCLUDED.last_message_id,
+    last_message_snippet = EXCLUDED.last_message_snippet,
+    last_message_at = EXCLUDED.last_message_at,
+    last_sent_by_owner = EXCLUDED.last_sent_by_owner,
+    last_message_read = EXCLUDED.last_message_read,
+    unread_count = EXCLUDED.unread_count;
+
+COMMIT;
@@ -0,0 +1,59 @@
+-- Canonical conversation_key on messages with a (conversation_key, created_at DESC, id DESC) index
+-- Online: existing rows are backfilled in committed batches and the index builds CONCURRENTLY.
+-- Run with psql outside a transaction (no -1 / --single-transaction).
+
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS conversation_key TEXT;
+
+-- Same key for both directions of a conversation, e.g. 'club:3|student:14'
+CREATE OR REPLACE FUNCTION make_conversation_key(a_id INTEGER, a_type VARCHAR, b_id INTEGER, b_type VARCHAR)
+RETURNS TEXT AS $$
+    SELECT CASE WHEN (a_type, a_id) <= (b_type, b_id)
+                THEN a_type || ':' || a_id || '|' || b_type || ':' || b_id
+                ELSE b_type || ':' || b_id || '|' || a_type || ':' || a_id
+           END
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION set_message_conversation_key()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.conversation_key = make_conversation_key(NEW.sender_id, NEW.sender_type, NEW.recipient_id, NEW.recipient_type);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- New messages get their key from here on
+DROP TRIGGER IF EXISTS set_messages_conversation_key ON messages;
+CREATE TRIGGER set_messages_conversation_key
+BEFORE INSERT OR UPDATE OF sender_id, sender_type, recipient_id, recipient_type ON messages
+FOR EACH ROW
+EXECUTE FUNCTION set_message_conversation_key();
+
+-- Backfill existing rows in id ranges, committing each batch to keep locks short
+DO $$
+DECLARE
+    batch_start INTEGER;
+    max_id INTEGER;
+BEGIN
+    SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) INTO batch_start, max_id FROM messages;
+    WHILE batch_start <= max_id LOOP
+        UPDATE messages
+        SET conversation_key = make_conversation_key(sender_id, sender_type, recipient_id, recipient_type)
+        WHERE id >= batch_start AND id < batch_start + 10000 AND conversation_key IS NULL;
+        batch_start := batch_start + 10000;
+        COMMIT;
+    END LOOP;
+END $$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_conversation_created_at
+    ON messages(conversation_key, created_at DESC, id DESC);
+
+-- NOT NULL without a long exclusive lock: validate a check constraint first, which SET NOT NULL then reuses
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'messages_conversation_key_not_null') THEN
+        ALTER TABLE messages ADD CONSTRAINT messages_conversation_key_not_null CHECK (conversation_key IS NOT NULL) NOT VALID;
+    END IF;
+END $$;
+ALTER TABLE messages VALIDATE CONSTRAINT messages_conversation_key_not_null;
+ALTER TABLE messages ALTER COLUMN conversation_key SET NOT NULL;
+ALTER TABLE messages DROP CONSTRAINT IF EXISTS messages_conversation_key_not_null;
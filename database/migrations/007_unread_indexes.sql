@@ -0,0 +1,12 @@
+-- Partial indexes over unread state only, so badge counts and unread listings skip read rows
+-- CONCURRENTLY keeps tables writable while the indexes build; run outside a transaction
+
+-- Threads with unread messages, for GET /api/messages/{type}/{id}/unread-count
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_conversations_owner_unread
+    ON conversations(owner_id, owner_type) INCLUDE (contact_id, contact_type, unread_count)
+    WHERE unread_count > 0;
+
+-- Unread messages per recipient, for unread_only listings and unread count reconciliation
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_recipient_unread
+    ON messages(recipient_id, recipient_type, created_at DESC, id DESC) INCLUDE (sender_id, sender_type)
+    WHERE read = FALSE;
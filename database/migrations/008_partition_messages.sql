@@ -0,0 +1,133 @@
+-- Monthly range partitions on messages.created_at
+-- Online: rows are copied into a partitioned twin in committed batches while a trigger mirrors
+-- concurrent writes, then the two tables swap names under a short exclusive lock.
+-- Run with psql outside a transaction (no -1 / --single-transaction).
+-- The old table is kept as messages_unpartitioned; drop it once the new one is verified.
+
+-- Rows without a timestamp have no partition to live in; date them now
+UPDATE messages SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL;
+
+-- Same columns as messages; the primary key has to include the partition key
+CREATE TABLE IF NOT EXISTS messages_partitioned (
+    id INTEGER NOT NULL DEFAULT nextval('messages_id_seq'),
+    content TEXT NOT NULL,
+    sender_id INTEGER NOT NULL,
+    sender_type VARCHAR(10) NOT NULL CHECK (sender_type IN ('student', 'club')),
+    recipient_id INTEGER NOT NULL,
+    recipient_type VARCHAR(10) NOT NULL CHECK (recipient_type IN ('student', 'club')),
+    conversation_key TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    read BOOLEAN DEFAULT FALSE,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Create the monthly messages partitions from from_month through months_ahead months past the current one.
+-- Each month is built as a plain table and then attached, which locks the parent more lightly than
+-- CREATE TABLE ... PARTITION OF, so running this while the app serves traffic does not block it.
+CREATE OR REPLACE FUNCTION ensure_message_partitions(months_ahead INTEGER DEFAULT 3, from_month DATE DEFAULT CURRENT_DATE, parent TEXT DEFAULT 'messages')
+RETURNS SETOF TEXT AS $$
+DECLARE
+    part_start DATE := date_trunc('month', from_month);
+    part_name TEXT;
+BEGIN
+    -- One caller at a time, so concurrent app workers do not race on the same month
+    PERFORM pg_advisory_xact_lock(hashtext('ensure_message_partitions'));
+    WHILE part_start <= date_trunc('month', CURRENT_DATE) + make_interval(months => months_ahead) LOOP
+        part_name := 'messages_p' || to_char(part_start, 'YYYY_MM');
+        IF to_regclass(part_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part_name, parent);
+            EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                           parent, part_name, part_start, part_start + INTERVAL '1 month');
+            RETURN NEXT part_name;
+        END IF;
+        part_start := part_start + INTERVAL '1 month';
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Every month that already has messages, plus the next three
+SELECT ensure_message_partitions(3, (SELECT COALESCE(MIN(created_at), CURRENT_TIMESTAMP)::date FROM messages), 'messages_partitioned');
+
+-- Indexes are built while the twin is empty and maintained by the copy; renamed at the swap
+CREATE INDEX IF NOT EXISTS idx_messages_partitioned_sender_created_at ON messages_partitioned(sender_id, sender_type, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_partitioned_recipient_created_at ON messages_partitioned(recipient_id, recipient_type, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_partitioned_conversation_created_at ON messages_partitioned(conversation_key, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_partitioned_recipient_unread ON messages_partitioned(recipient_id, recipient_type, created_at DESC, id DESC) INCLUDE (sender_id, sender_type) WHERE read = FALSE;
+
+DROP TRIGGER IF EXISTS set_messages_conversation_key ON messages_partitioned;
+CREATE TRIGGER set_messages_conversation_key
+BEFORE INSERT OR UPDATE OF sender_id, sender_type, recipient_id, recipient_type ON messages_partitioned
+FOR EACH ROW
+EXECUTE FUNCTION set_message_conversation_key();
+
+-- Replay every write to messages onto the twin until the swap; an upsert, so it also settles
+-- rows the batch copy below inserted first
+CREATE OR REPLACE FUNCTION mirror_message_write()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        DELETE FROM messages_partitioned WHERE id = OLD.id AND created_at = OLD.created_at;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO messages_partitioned (id, content, sender_id, sender_type, recipient_id, recipient_type, conversation_key, created_at, read)
+        VALUES (NEW.id, NEW.content, NEW.sender_id, NEW.sender_type, NEW.recipient_id, NEW.recipient_type, NEW.conversation_key, NEW.created_at, NEW.read)
+        ON CONFLICT (id, created_at) DO UPDATE
+        SET content = EXCLUDED.content, sender_id = EXCLUDED.sender_id, sender_type = EXCLUDED.sender_type,
+            recipient_id = EXCLUDED.recipient_id, recipient_type = EXCLUDED.recipient_type, read = EXCLUDED.read;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS mirror_messages_to_partitioned ON messages;
+CREATE TRIGGER mirror_messages_to_partitioned
+AFTER INSERT OR UPDATE OR DELETE ON messages
+FOR EACH ROW
+EXECUTE FUNCTION mirror_message_write();
+
+-- Copy existing rows in id ranges, committing each batch; rows the trigger already mirrored are skipped
+DO $$
+DECLARE
+    batch_start INTEGER;
+    max_id INTEGER;
+BEGIN
+    SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) INTO batch_start, max_id FROM messages;
+    WHILE batch_start <= max_id LOOP
+        INSERT INTO messages_partitioned (id, content, sender_id, sender_type, recipient_id, recipient_type, conversation_key, created_at, read)
+        SELECT id, content, sender_id, sender_type, recipient_id, recipient_type, conversation_key, created_at, read
+        FROM messages
+        WHERE id >= batch_start AND id < batch_start + 10000
+        ON CONFLICT (id, created_at) DO NOTHING;
+        batch_start := batch_start + 10000;
+        COMMIT;
+    END LOOP;
+END $$;
+
+-- Swap: writers wait only for the renames
+BEGIN;
+LOCK TABLE messages IN ACCESS EXCLUSIVE MODE;
+DROP TRIGGER mirror_messages_to_partitioned ON messages;
+DROP FUNCTION mirror_message_write();
+
+ALTER TABLE messages RENAME TO messages_unpartitioned;
+ALTER TABLE messages_unpartitioned RENAME CONSTRAINT messages_pkey TO messages_unpartitioned_pkey;
+ALTER TABLE messages_unpartitioned RENAME CONSTRAINT messages_sender_type_check TO messages_unpartitioned_sender_type_check;
+ALTER TABLE messages_unpartitioned RENAME CONSTRAINT messages_recipient_type_check TO messages_unpartitioned_recipient_type_check;
+ALTER INDEX idx_messages_sender_created_at RENAME TO idx_messages_unpartitioned_sender_created_at;
+ALTER INDEX idx_messages_recipient_created_at RENAME TO idx_messages_unpartitioned_recipient_created_at;
+ALTER INDEX idx_messages_conversation_created_at RENAME TO idx_messages_unpartitioned_conversation_created_at;
+ALTER INDEX idx_messages_recipient_unread RENAME TO idx_messages_unpartitioned_recipient_unread;
+DROP TRIGGER set_messages_conversation_key ON messages_unpartitioned;
+
+ALTER TABLE messages_partitioned RENAME TO messages;
+ALTER TABLE messages RENAME CONSTRAINT messages_partitioned_pkey TO messages_pkey;
+ALTER TABLE messages RENAME CONSTRAINT messages_partitioned_sender_type_check TO messages_sender_type_check;
+ALTER TABLE messages RENAME CONSTRAINT messages_partitioned_recipient_type_check TO messages_recipient_type_check;
+ALTER INDEX idx_messages_partitioned_sender_created_at RENAME TO idx_messages_sender_created_at;
+ALTER INDEX idx_messages_partitioned_recipient_created_at RENAME TO idx_messages_recipient_created_at;
+ALTER INDEX idx_messages_partitioned_conversation_created_at RENAME TO idx_messages_conversation_created_at;
+ALTER INDEX idx_messages_partitioned_recipient_unread RENAME TO idx_messages_recipient_unread;
+
+-- The sequence follows the live table, so dropping messages_unpartitioned later leaves it in place
+ALTER SEQUENCE messages_id_seq OWNED BY messages.id;
+COMMIT;
@@ -0,0 +1,8 @@
+-- Resized profile picture variants and blur placeholders on students and clubs
+-- Adding nullable columns does not rewrite either table. Fill them for existing pictures with
+-- python -m services.image_service
+
+ALTER TABLE students ADD COLUMN IF NOT EXISTS profile_picture_variants JSONB;
+ALTER TABLE students ADD COLUMN IF NOT EXISTS profile_picture_placeholder TEXT;
+ALTER TABLE clubs ADD COLUMN IF NOT EXISTS profile_picture_variants JSONB;
+ALTER TABLE clubs ADD COLUMN IF NOT EXISTS profile_picture_placeholder TEXT;
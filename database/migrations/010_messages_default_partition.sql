@@ -0,0 +1,41 @@
+-- DEFAULT partition for messages, so a send dated past the last monthly partition is stored
+-- instead of failing. ensure_message_partitions() moves such rows into their month when it
+-- creates it. Apply after 008_partition_messages.sql; safe to re-run.
+
+-- Create the monthly messages partitions from from_month through months_ahead months past the current one.
+-- Each month is built as a plain table and then attached, which locks the parent more lightly than
+-- CREATE TABLE ... PARTITION OF, so running this while the app serves traffic does not block it.
+CREATE OR REPLACE FUNCTION ensure_message_partitions(months_ahead INTEGER DEFAULT 3, from_month DATE DEFAULT CURRENT_DATE, parent TEXT DEFAULT 'messages')
+RETURNS SETOF TEXT AS $$
+DECLARE
+    part_start DATE := date_trunc('month', from_month);
+    part_name TEXT;
+    default_name TEXT;
+BEGIN
+    -- One caller at a time, so concurrent app workers do not race on the same month
+    PERFORM pg_advisory_xact_lock(hashtext('ensure_message_partitions'));
+    SELECT c.relname INTO default_name
+    FROM pg_partitioned_table p
+    JOIN pg_class c ON c.oid = p.partdefid
+    WHERE p.partrelid = parent::regclass;
+    WHILE part_start <= date_trunc('month', CURRENT_DATE) + make_interval(months => months_ahead) LOOP
+        part_name := 'messages_p' || to_char(part_start, 'YYYY_MM');
+        IF to_regclass(part_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part_name, parent);
+            -- Messages sent while the month was missing wait in the default partition; ATTACH requires
+            -- it to hold none of the month's rows, so move them over first (normally there are none)
+            IF default_name IS NOT NULL THEN
+                EXECUTE format('LOCK TABLE %I IN ACCESS EXCLUSIVE MODE', default_name);
+                EXECUTE format('WITH moved AS (DELETE FROM %I WHERE created_at >= %L AND created_at < %L RETURNING *) INSERT INTO %I SELECT * FROM moved',
+                               default_name, part_start, part_start + INTERVAL '1 month', part_name);
+            END IF;
+            EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                           parent, part_name, part_start, part_start + INTERVAL '1 month');
+            RETURN NEXT part_name;
+        END IF;
+        part_start := part_start + INTERVAL '1 month';
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TABLE IF NOT EXISTS messages_default PARTITION OF messages DEFAULT;
@@ -0,0 +1,202 @@
+"""
+Per-request SQL statistics.
+
+Every pooled and standalone connection uses InstrumentedCursor, whose
+QueryTimingMixin times each statement (tests mix it into stub cursors). Inside a
+request (QueryStatsMiddleware) or a `max_queries` block the statements are
+tallied on a QueryStats object carried in a context variable; run_db copies the
+context into its worker threads, so queries made through db_task count towards
+the request that awaited them.
+
+Statements slower than SLOW_QUERY_MS are logged with their parameters replaced
+by type names, and requests repeating one statement DB_REPEATED_QUERY_THRESHOLD
+times or more (the usual N+1 shape) are logged with the statement. With
+DB_DEBUG_HEADERS=1 responses carry X-DB-Queries, X-DB-Time-Ms, X-DB-Slowest-Ms
+and a Server-Timing entry browsers show in their network panel.
+"""
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Optional
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor
+
+# Statements taking longer than this many milliseconds are logged
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+
+# One statement run this many times in a request is logged as a likely N+1 query
+DB_REPEATED_QUERY_THRESHOLD = int(os.getenv('DB_REPEATED_QUERY_THRESHOLD', '10'))
+
+# Expose each request's query statistics as response headers; for development only
+DB_DEBUG_HEADERS = os.getenv('DB_DEBUG_HEADERS', '').lower() in ('1', 'true', 'yes')
+
+# Longest statement text kept in logs and assertion messages
+STATEMENT_LOG_CHARS = 2000
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class QueryStats:
+    """Running totals of the statements executed within one request or block."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_statement = None
+        # Statement text (before parameters are bound) -> executions
+        self.statements = Counter()
+        # Requests may await several db_task calls at once, each on its own thread
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.total_seconds += seconds
+            self.statements[statement] += 1
+            if seconds >= self.slowest_seconds:
+                self.slowest_seconds = seconds
+                self.slowest_statement = statement
+
+    # Statements executed at least `threshold` times, most repeated first
+    def repeated(self, threshold: int = DB_REPEATED_QUERY_THRESHOLD):
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+
+_current: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar("query_stats", default=None)
+
+
+# Statistics of the request or block running in this context, if one is being tracked
+def current_query_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+# Statement text on one line, cut to a loggable length
+def _statement_text(cursor, query: Any) -> str:
+    if isinstance(query, sql.Composable):
+        query = query.as_string(cursor)
+    elif isinstance(query, bytes):
+        query = query.decode(errors="replace")
+    return _WHITESPACE.sub(" ", query).strip()[:STATEMENT_LOG_CHARS]
+
+
+# Parameters with every value replaced by its type name, so logs never contain user data
+def _redact(params: Any) -> Any:
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {name: f"<{type(value).__name__}>" for name, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [f"<{type(value).__name__}>" for value in params]
+    return f"<{type(params).__name__}>"
+
+
+def _record(cursor, query: Any, params: Any, seconds: float):
+    statement = None
+    stats = _current.get()
+    if stats is not None:
+        statement = _statement_text(cursor, query)
+        stats.record(statement, seconds)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        logger.warning(
+            "Slow query took %.1f ms", seconds * 1000,
+            extra={
+                "duration_ms": round(seconds * 1000, 3),
+                "statement": statement or _statement_text(cursor, query),
+                "params": _redact(params),
+            }
+        )
+
+
+class QueryTimingMixin:
+    """Cursor mixin timing every statement for the slow-query log and the current QueryStats."""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            _record(self, query, vars, time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            # One batch counts as one statement; its parameters are not logged
+            _record(self, query, None, time.perf_counter() - started)
+
+
+class InstrumentedCursor(QueryTimingMixin, RealDictCursor):
+    """RealDictCursor with statement timing; the cursor_factory of every database connection."""
+
+
+# Fail when the block runs more than `limit` SQL statements; yields the block's QueryStats.
+# For tests and benchmarks, e.g.
+#
+#     with max_queries(3):
+#         await get_messages(1, "student")
+@contextmanager
+def max_queries(limit: int):
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+    if stats.count > limit:
+        lines = [f"{count}x {statement}" for statement, count in stats.statements.most_common()]
+        raise AssertionError(f"{stats.count} queries ran, at most {limit} allowed:\n" + "\n".join(lines))
+
+
+class QueryStatsMiddleware:
+    """
+    ASGI middleware tracking the SQL statements of each HTTP request. Logs requests that repeat
+    a statement DB_REPEATED_QUERY_THRESHOLD times and, with DB_DEBUG_HEADERS, reports the totals
+    in response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current.set(stats)
+
+        async def send_wrapper(message):
+            if DB_DEBUG_HEADERS and message["type"] == "http.response.start":
+                total_ms = stats.total_seconds * 1000
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-db-queries", str(stats.count).encode()),
+                    (b"x-db-time-ms", f"{total_ms:.3f}".encode()),
+                    (b"x-db-slowest-ms", f"{stats.slowest_seconds * 1000:.3f}".encode()),
+                    (b"server-timing", f'db;dur={total_ms:.3f};desc="{stats.count} queries"'.encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            for statement, count in stats.repeated():
+                logger.warning(
+                    "Statement ran %d times in one request", count,
+                    extra={
+                        "route": getattr(route, "path", None) or "unmatched",
+                        "path": scope["path"],
+                        "repeats": count,
+                        "statement": statement,
+                    }
+                )
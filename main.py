@@ -1,6 +1,18 @@
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import Response
+import asyncio
+import logging
 import os
+from database.db import init_pool, close_pool, pool_stats, run_db
+from database.query_stats import QueryStatsMiddleware
+from services.auth_service import init_hash_pool, close_hash_pool, hash_pool_stats
+from services.image_service import init_image_pool, close_image_pool, image_pool_stats
+from services.matching_service import ensure_index
+from services.events_service import inbox_events
+from services.message_partition_service import ensure_partitions, keep_partitions_ahead
+from services.serialization import FastJSONResponse
+from services.logging_service import configure_logging
+from services.metrics_service import MetricsMiddleware, METRICS_CONTENT_TYPE, render_metrics
 from routes.login_routes import router as login_router
 from routes.registration_routes import router as registration_router
 from routes.profile_routes import router as profile_router
@@ -8,16 +20,57 @@ from routes.messaging_routes import router as messaging_router
 from routes.club_routes import router as club_router
 from routes.saved_clubs_routes import router as saved_clubs_router
 from routes.social_media import router as social_media_router
+from routes.matching_routes import router as matching_router
+from routes.media_routes import router as media_router
 
-app = FastAPI()
+# JSON logs to stderr at LOG_LEVEL, for the app and uvicorn alike
+configure_logging()
+logger = logging.getLogger(__name__)
+
+app = FastAPI(default_response_class=FastJSONResponse)
+
+# Per-route latency, status and response size metrics for /metrics
+app.add_middleware(MetricsMiddleware)
+# Count and time each request's SQL statements; added last so it wraps the metrics middleware, which reports them
+app.add_middleware(QueryStatsMiddleware)
+
+# Open the shared database connection pool, bcrypt workers and image workers when the app starts
+@app.on_event("startup")
+def open_db_pool():
+    init_pool()
+    init_hash_pool()
+    init_image_pool()
+
+# Load the interest matching index before serving requests
+@app.on_event("startup")
+async def warm_matching_index():
+    await ensure_index()
+
+# Make sure messages has partitions for this month and the next ones, then keep checking daily.
+# A failure here must not stop the API; new messages wait in the default partition meanwhile.
+@app.on_event("startup")
+async def start_message_partitions():
+    try:
+        await run_db(ensure_partitions)
+    except Exception:
+        logger.exception("Creating messages partitions at startup failed")
+    app.state.message_partitions_task = asyncio.create_task(keep_partitions_ahead())
+
+@app.on_event("shutdown")
+def stop_message_partitions():
+    app.state.message_partitions_task.cancel()
+
+# Close image workers, pooled connections and bcrypt workers on shutdown
+@app.on_event("shutdown")
+def close_db_pool():
+    close_image_pool()
+    close_pool()
+    close_hash_pool()
 
 # Create directories for storing uploaded profile pictures
 os.makedirs("uploads/student_profile_pictures", exist_ok=True)
 os.makedirs("uploads/club_profile_pictures", exist_ok=True)
 
-# Mount the uploads directory to serve static files
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
-
 # Include all route modules with API prefix
 app.include_router(login_router, prefix="/api")
 app.include_router(registration_router, prefix="/api")
@@ -25,9 +78,37 @@ app.include_router(profile_router, prefix="/api")
 app.include_router(messaging_router, prefix="/api")
 app.include_router(club_router, prefix="/api")
 app.include_router(saved_clubs_router, prefix="/api")
+app.include_router(matching_router, prefix="/api")
 app.include_router(social_media_router)
+# Uploaded files under /uploads
+app.include_router(media_router)
 
 # Root endpoint that returns a welcome message
 @app.get("/")
 def read_root():
-    return {"message": "Welcome to Club Companion API"}
\ No newline at end of file
+    return {"message": "Welcome to Club Companion API"}
+
+# Database connection pool statistics for monitoring
+@app.get("/health/db")
+def db_health():
+    return {"pool": pool_stats()}
+
+# Password hashing queue depth and timing statistics
+@app.get("/health/hashing")
+def hashing_health():
+    return hash_pool_stats()
+
+# Profile picture rendering queue and timing statistics
+@app.get("/health/images")
+def images_health():
+    return image_pool_stats()
+
+# Open inbox event streams and delivery counters
+@app.get("/health/events")
+def events_health():
+    return inbox_events.stats()
+
+# Request, connection pool, hashing, image and event stream metrics in the Prometheus text format
+@app.get("/metrics")
+async def metrics():
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
@@ -27,7 +27,6 @@ class ProfileUpdate(BaseModel):
     name: Optional[str] = None
     interests: Optional[List[str]] = None
     description: Optional[str] = None
-    profile_picture: Optional[str] = None  
 
 # Model for creating new messages
 class MessageCreate(BaseModel):
@@ -35,6 +34,11 @@ class MessageCreate(BaseModel):
     recipient_id: int
     recipient_type: str  
 
+# Model for a club message sent to all of its savers, or only the listed students among them
+class BroadcastCreate(BaseModel):
+    content: str
+    student_ids: Optional[List[int]] = None
+
 # Model for message responses with full details
 class MessageResponse(BaseModel):
     id: int
@@ -46,4 +50,4 @@ class MessageResponse(BaseModel):
     recipient_id: int
     recipient_type: str
     created_at: datetime
-    read: bool = False
\ No newline at end of file
+    read: bool = False
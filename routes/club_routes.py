@@ -1,21 +1,61 @@
-from fastapi import APIRouter, HTTPException
-from database.db import get_db_connection
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Query, Response
+from database.db import db_connection, db_task
+from services.media_service import picture_url, picture_variants
+from services.cache_service import club_catalog
+from services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, decode_cursor, split_page
+from services.serialization import FastJSONResponse, dumps
+import bisect
+from datetime import datetime
+from typing import List, Dict, Any, Optional
 import psycopg2
 
 router = APIRouter()
 
-@router.get("/clubs")
-async def get_all_clubs() -> List[Dict[str, Any]]:
-    """
-    Retrieves all clubs from the database with member count.
-    """
-    conn = None
-    cur = None
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
+# Catalog and detail entry for a clubs row joined with its email
+def club_item(row) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "name": row["name"],
+        "description": row["description"],
+        "interests": row["interests"],
+        "profile_picture": picture_url(row["profile_picture"]),
+        "profile_picture_variants": picture_variants(row["profile_picture_variants"]),
+        "profile_picture_placeholder": row["profile_picture_placeholder"],
+        "members": row["members"],
+        "email": row["email"]
+    }
+
+# Member list entry for a students row joined with the save
+def member_item(row) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "name": row["name"],
+        "interests": row["interests"],
+        "profile_picture": picture_url(row["profile_picture"], "student"),
+        "profile_picture_variants": picture_variants(row["profile_picture_variants"]),
+        "profile_picture_placeholder": row["profile_picture_placeholder"],
+        "saved_at": row["saved_at"]
+    }
+
+# Club list sorted by (case-folded name, id) with keys for cursor lookups
+class ClubCatalog:
+    def __init__(self, clubs: List[Dict[str, Any]]):
+        self.clubs = sorted(clubs, key=lambda club: (club["name"].casefold(), club["id"]))
+        self.keys = [(club["name"].casefold(), club["id"]) for club in self.clubs]
+
+    # Serialize the page of clubs that follows the cursor key
+    def page(self, after: Optional[List[Any]], limit: int) -> bytes:
+        start = bisect.bisect_right(self.keys, tuple(after)) if after else 0
+        items = self.clubs[start:start + limit]
+        next_cursor = None
+        if start + limit < len(self.clubs):
+            next_cursor = encode_cursor(*self.keys[start + limit - 1])
+        return dumps({"items": items, "next_cursor": next_cursor})
+
+# Query the full club catalog
+@db_task
+def load_club_catalog() -> ClubCatalog:
+    with db_connection() as conn, conn.cursor() as cur:
         cur.execute("""
             SELECT 
                 c.id, 
@@ -23,181 +63,226 @@ async def get_all_clubs() -> List[Dict[str, Any]]:
                 c.description, 
                 c.interests,
                 c.profile_picture,
-                COALESCE(sc.member_count, 0) as members,
+                c.profile_picture_variants,
+                c.profile_picture_placeholder,
+                c.member_count as members,
                 a.email
             FROM 
                 clubs c
-            LEFT JOIN (
-                SELECT club_id, COUNT(*) as member_count 
-                FROM saved_clubs 
-                GROUP BY club_id
-            ) sc ON c.id = sc.club_id
             LEFT JOIN auth_credentials a ON c.auth_id = a.id
-            ORDER BY 
-                c.name
         """)
-        
-        clubs = []
-        for row in cur.fetchall():
-            club = dict(row)
-            if club['profile_picture']:
-                
-                profile_picture = club['profile_picture']
-                print(f"Original profile picture path: {profile_picture}")
-                
-                if 'uploads/' in profile_picture and not profile_picture.startswith('/uploads/'):
-                    club['profile_picture'] = f"/{profile_picture}"
-                elif not profile_picture.startswith(('http://', 'https://', '/')):
-                    club['profile_picture'] = f"/uploads/club_profile_pictures/{profile_picture}"
-                
-                print(f"Formatted profile picture path: {club['profile_picture']}")
-            
-            clubs.append(club)
-            
-        return clubs
+        clubs = [club_item(row) for row in cur.fetchall()]
+
+    return ClubCatalog(clubs)
+
+@router.get("/clubs")
+async def get_all_clubs(
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+) -> Response:
+    """
+    Retrieves a page of clubs ordered by name, with member count.
+    Served from an in-process cache that is invalidated whenever clubs or saves change.
+    """
+    after = decode_cursor(cursor, (str, int))
+    try:
+        catalog = await club_catalog.get(load_club_catalog)
+        return Response(content=catalog.page(after, limit), media_type="application/json")
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
+
+@router.get("/clubs/search")
+@db_task
+def search_clubs_by_text(
+    q: str = Query(..., min_length=1, max_length=200),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=50)
+):
+    """
+    Ranked full-text search over club names and descriptions.
+    Falls back to trigram similarity on names when nothing matches, so typos still find clubs.
+    """
+    params = {"q": q, "limit": page_size, "offset": (page - 1) * page_size}
+    try:
+        with db_connection() as conn, conn.cursor() as cur:
+            # Rank matches from the GIN-indexed search_vector, then build snippets for the page only
+            cur.execute("""
+                WITH query AS (
+                    SELECT websearch_to_tsquery('english', %(q)s) AS tsq
+                ),
+                ranked AS (
+                    SELECT
+                        c.id,
+                        c.name,
+                        c.description,
+                        c.interests,
+                        c.profile_picture,
+                        ts_rank_cd(c.search_vector, query.tsq) AS rank,
+                        COUNT(*) OVER () AS total
+                    FROM clubs c, query
+                    WHERE c.search_vector @@ query.tsq
+                    ORDER BY rank DESC, c.id
+                    LIMIT %(limit)s OFFSET %(offset)s
+                )
+                SELECT
+                    ranked.*,
+                    ts_headline(
+                        'english',
+                        coalesce(ranked.description, ''),
+                        query.tsq,
+                        'StartSel=<mark>, StopSel=</mark>, MaxWords=25, MinWords=8, MaxFragments=2'
+                    ) AS snippet
+                FROM ranked, query
+                ORDER BY ranked.rank DESC, ranked.id
+            """, params)
+            rows = cur.fetchall()
+            fuzzy = False
+
+            # An empty later page only means we ran past the end of the text matches
+            text_matches_exist = False
+            if not rows and page > 1:
+                cur.execute(
+                    "SELECT EXISTS (SELECT 1 FROM clubs WHERE search_vector @@ websearch_to_tsquery('english', %(q)s)) AS found",
+                    params
+                )
+                text_matches_exist = cur.fetchone()["found"]
+
+            # Nothing matched the words themselves, so try similar-looking names
+            if not rows and not text_matches_exist:
+                cur.execute("""
+                    SELECT
+                        c.id,
+                        c.name,
+                        c.description,
+                        c.interests,
+                        c.profile_picture,
+                        similarity(c.name, %(q)s) AS rank,
+                        left(coalesce(c.description, ''), 160) AS snippet,
+                        COUNT(*) OVER () AS total
+                    FROM clubs c
+                    WHERE c.name %% %(q)s
+                    ORDER BY rank DESC, c.id
+                    LIMIT %(limit)s OFFSET %(offset)s
+                """, params)
+                rows = cur.fetchall()
+                fuzzy = True
+
+        results = [
+            {
+                "id": row["id"],
+                "name": row["name"],
+                "description": row["description"],
+                "interests": row["interests"],
+                "profile_picture": picture_url(row["profile_picture"]),
+                "snippet": row["snippet"],
+                "rank": float(row["rank"])
+            }
+            for row in rows
+        ]
+
+        return {
+            "query": q,
+            "page": page,
+            "page_size": page_size,
+            "total": rows[0]["total"] if rows else 0,
+            "fuzzy": fuzzy,
+            "results": results
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/clubs/{club_id}")
-async def get_club_by_id(club_id: int):
+@db_task
+def get_club_by_id(club_id: int):
     """
     Retrieves a specific club by ID.
     """
-    conn = None
-    cur = None
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute("""
-            SELECT 
-                c.id, 
-                c.name, 
-                c.description, 
-                c.interests,
-                c.profile_picture,
-                COALESCE(sc.member_count, 0) as members,
-                a.email
-            FROM 
-                clubs c
-            LEFT JOIN (
-                SELECT club_id, COUNT(*) as member_count 
-                FROM saved_clubs 
-                GROUP BY club_id
-            ) sc ON c.id = sc.club_id
-            LEFT JOIN auth_credentials a ON c.auth_id = a.id
-            WHERE
-                c.id = %s
-        """, (club_id,))
-        
-        club = cur.fetchone()
-        
-        if not club:
-            raise HTTPException(status_code=404, detail="Club not found")
-        
-        club = dict(club)
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT 
+                    c.id, 
+                    c.name, 
+                    c.description, 
+                    c.interests,
+                    c.profile_picture,
+                    c.profile_picture_variants,
+                    c.profile_picture_placeholder,
+                    c.member_count as members,
+                    a.email
+                FROM 
+                    clubs c
+                LEFT JOIN auth_credentials a ON c.auth_id = a.id
+                WHERE
+                    c.id = %s
+            """, (club_id,))
         
+            club = cur.fetchone()
         
-        if club['profile_picture']:
-           
-            profile_picture = club['profile_picture']
-            
-           
-            print(f"Original profile picture path: {profile_picture}")
-            
-            if 'uploads/' in profile_picture and not profile_picture.startswith('/uploads/'):
-                club['profile_picture'] = f"/{profile_picture}"
-            elif not profile_picture.startswith(('http://', 'https://', '/')):
-                club['profile_picture'] = f"/uploads/club_profile_pictures/{profile_picture}"
-            
-            print(f"Formatted profile picture path: {club['profile_picture']}")
+            if not club:
+                raise HTTPException(status_code=404, detail="Club not found")
         
-        return club
+            return club_item(club)
         
     except HTTPException as he:
         raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
 
 @router.get("/club/{club_id}/members")
-async def get_club_members(club_id: int):
+@db_task
+def get_club_members(
+    club_id: int,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
     """
-    Retrieves all students who have saved the club.
+    Retrieves a page of students who have saved the club, most recent first.
     """
-    conn = None
-    cur = None
+    after = decode_cursor(cursor, (datetime, int))
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT id FROM clubs WHERE id = %s", (club_id,))
+            club = cur.fetchone()
         
-        cur.execute("SELECT id FROM clubs WHERE id = %s", (club_id,))
-        club = cur.fetchone()
+            if not club:
+                raise HTTPException(status_code=404, detail="Club not found")
         
-        if not club:
-            raise HTTPException(status_code=404, detail="Club not found")
+            # Keyset page over (saved_at, id), served by idx_saved_clubs_club_saved_at
+            cur.execute("""
+                SELECT 
+                    s.id, 
+                    s.name, 
+                    s.interests,
+                    s.profile_picture,
+                    s.profile_picture_variants,
+                    s.profile_picture_placeholder,
+                    sc.saved_at,
+                    sc.id AS save_id
+                FROM 
+                    saved_clubs sc
+                JOIN 
+                    students s ON sc.student_id = s.id
+                WHERE
+                    sc.club_id = %(club_id)s
+                    AND (%(after_saved_at)s::timestamp IS NULL OR (sc.saved_at, sc.id) < (%(after_saved_at)s::timestamp, %(after_id)s))
+                ORDER BY 
+                    sc.saved_at DESC, sc.id DESC
+                LIMIT %(limit)s
+            """, {
+                "club_id": club_id,
+                "after_saved_at": after[0] if after else None,
+                "after_id": after[1] if after else None,
+                "limit": limit + 1
+            })
+            rows, has_more = split_page(cur.fetchall(), limit)
+            next_cursor = encode_cursor(rows[-1]["saved_at"], rows[-1]["save_id"]) if has_more else None
         
-        cur.execute("""
-            SELECT 
-                s.id, 
-                s.name, 
-                s.interests,
-                s.profile_picture,
-                sc.saved_at
-            FROM 
-                saved_clubs sc
-            JOIN 
-                students s ON sc.student_id = s.id
-            WHERE
-                sc.club_id = %s
-            ORDER BY 
-                sc.saved_at DESC
-        """, (club_id,))
-        
-        members = []
-        for row in cur.fetchall():
-           
-            member = dict(row)
-            
-            
-            if member['profile_picture']:
-                
-                profile_picture = member['profile_picture']
-                
-               
-                print(f"Original student profile picture path: {profile_picture}")
-                
-                if 'uploads/' in profile_picture and not profile_picture.startswith('/uploads/'):
-                    member['profile_picture'] = f"/{profile_picture}"
-                elif not profile_picture.startswith(('http://', 'https://', '/')):
-                    member['profile_picture'] = f"/uploads/student_profile_pictures/{profile_picture}"
-                
-                print(f"Formatted student profile picture path: {member['profile_picture']}")
-            
-           
-            if member['saved_at']:
-                member['saved_at'] = member['saved_at'].isoformat()
-                
-            members.append(member)
-            
-        return members
+            return FastJSONResponse({"items": [member_item(row) for row in rows], "next_cursor": next_cursor})
         
     except HTTPException as he:
         raise he
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close() 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
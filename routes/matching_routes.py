@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Query
-from services.matching_service import search_clubs
+from fastapi import APIRouter, HTTPException, Query
+from services.matching_service import search_clubs, ensure_index
 
-router = APIRouter
+router = APIRouter()
 
 # Search for clubs based on search parameters and optional category
 @router.get("/login/student/Search")
-async def match_user_with_club(search_param: str = Query(...), category: str = Query(None)):
+async def match_user_with_club(
+    search_param: str = Query(..., description="Comma-separated interests"),
+    category: str = Query(None),
+    limit: int = Query(20, ge=1, le=100)
+):
     try:
-        results = search_clubs(search_param, category)
-        return {"Matching clubs: results": results}
+        await ensure_index()
+        results = search_clubs(search_param, category, limit)
+        return {"results": results}
     except Exception as e:
-        return {"Error": str(e)}
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,14 @@
+from fastapi import APIRouter, HTTPException, Request
+from services.media_service import serve_upload
+
+router = APIRouter()
+
+# Serve an uploaded file with cache headers, conditional requests and byte ranges
+@router.api_route("/uploads/{path:path}", methods=["GET", "HEAD"])
+async def get_upload_route(path: str, request: Request):
+    try:
+        return await serve_upload(path, request)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
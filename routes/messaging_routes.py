@@ -1,16 +1,33 @@
 from fastapi import APIRouter, HTTPException, Query
-from models.schemas import MessageCreate, MessageResponse
+from fastapi.responses import StreamingResponse
+from models.schemas import MessageCreate, MessageResponse, BroadcastCreate
 from services.messaging_service import (
     send_message, 
     get_messages, 
     mark_message_as_read, 
     get_message_threads,
-    get_conversation
+    get_conversation,
+    get_unread_counts,
+    broadcast_message
 )
+from services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from services.events_service import inbox_events, EVENTS_HEARTBEAT_SECONDS
+from services.serialization import FastJSONResponse
 from typing import List, Optional
 
 router = APIRouter()
 
+# Server-Sent Events stream of a user's inbox events
+def inbox_event_stream(user_type: str, user_id: int):
+    if not inbox_events.has_capacity():
+        raise HTTPException(status_code=503, detail="Too many open event streams", headers={"Retry-After": "5"})
+    return StreamingResponse(
+        inbox_events.stream(user_type, user_id, EVENTS_HEARTBEAT_SECONDS),
+        media_type="text/event-stream",
+        # Disable proxy buffering so events are flushed as they are published
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Student messaging endpoints
 @router.post("/messages/student/{student_id}/send")
 async def send_message_from_student(
@@ -28,10 +45,12 @@ async def send_message_from_student(
 @router.get("/messages/student/{student_id}")
 async def get_student_messages(
     student_id: int,
-    unread_only: bool = Query(False, description="Get only unread messages")
+    unread_only: bool = Query(False, description="Get only unread messages"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
 ):
     try:
-        return await get_messages(student_id, "student", unread_only)
+        return FastJSONResponse(await get_messages(student_id, "student", unread_only, cursor, limit))
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -50,29 +69,52 @@ async def mark_student_message_as_read(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Total and per-thread unread message counts for a student's badges
+@router.get("/messages/student/{student_id}/unread-count")
+async def get_student_unread_count(
+    student_id: int
+):
+    try:
+        return await get_unread_counts(student_id, "student")
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # Get all message threads for a student
 @router.get("/messages/student/{student_id}/threads")
 async def get_student_message_threads(
-    student_id: int
+    student_id: int,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
 ):
     try:
-        return await get_message_threads(student_id, "student")
+        return await get_message_threads(student_id, "student", cursor, limit)
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Push new messages, thread updates and read receipts to a student's open dashboard
+@router.get("/messages/student/{student_id}/events")
+async def stream_student_events(
+    student_id: int
+):
+    return inbox_event_stream("student", student_id)
+
 # Get conversation history between a student and another user
 @router.get("/messages/student/{student_id}/conversation/{other_type}/{other_id}")
 async def get_student_conversation(
     student_id: int,
     other_type: str,
-    other_id: int
+    other_id: int,
+    before: Optional[str] = Query(None, description="next_cursor from the previous page, for older messages"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
 ):
     if other_type not in ["student", "club"]:
         raise HTTPException(status_code=400, detail="Invalid user type")
     try:
-        return await get_conversation(student_id, "student", other_id, other_type)
+        return await get_conversation(student_id, "student", other_id, other_type, before, limit)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -91,14 +133,29 @@ async def send_message_from_club(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Send one message to every student who saved the club, or to the listed students among them
+@router.post("/messages/club/{club_id}/broadcast")
+async def broadcast_from_club(
+    club_id: int,
+    broadcast: BroadcastCreate
+):
+    try:
+        return await broadcast_message(club_id, broadcast)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # Get messages for a club, optionally filtered by read status
 @router.get("/messages/club/{club_id}")
 async def get_club_messages(
     club_id: int,
-    unread_only: bool = Query(False, description="Get only unread messages")
+    unread_only: bool = Query(False, description="Get only unread messages"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
 ):
     try:
-        return await get_messages(club_id, "club", unread_only)
+        return FastJSONResponse(await get_messages(club_id, "club", unread_only, cursor, limit))
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -117,29 +174,52 @@ async def mark_club_message_as_read(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Total and per-thread unread message counts for a club's badges
+@router.get("/messages/club/{club_id}/unread-count")
+async def get_club_unread_count(
+    club_id: int
+):
+    try:
+        return await get_unread_counts(club_id, "club")
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # Get all message threads for a club
 @router.get("/messages/club/{club_id}/threads")
 async def get_club_message_threads(
-    club_id: int
+    club_id: int,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
 ):
     try:
-        return await get_message_threads(club_id, "club")
+        return await get_message_threads(club_id, "club", cursor, limit)
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Push new messages, thread updates and read receipts to a club's open dashboard
+@router.get("/messages/club/{club_id}/events")
+async def stream_club_events(
+    club_id: int
+):
+    return inbox_event_stream("club", club_id)
+
 # Get conversation history between a club and another user
 @router.get("/messages/club/{club_id}/conversation/{other_type}/{other_id}")
 async def get_club_conversation(
     club_id: int,
     other_type: str,
-    other_id: int
+    other_id: int,
+    before: Optional[str] = Query(None, description="next_cursor from the previous page, for older messages"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
 ):
     if other_type not in ["student", "club"]:
         raise HTTPException(status_code=400, detail="Invalid user type")
     try:
-        return await get_conversation(club_id, "club", other_id, other_type)
+        return await get_conversation(club_id, "club", other_id, other_type, before, limit)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -1,10 +1,10 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Request
 from typing import Optional, List
 import json
 from pydantic import BaseModel
 import base64
 from models.schemas import ProfileUpdate
-from services.profile_service import update_student_profile, update_club_profile, get_student_profile, get_club_profile
+from services.profile_service import update_student_profile, update_club_profile, get_student_profile, get_club_profile, upload_profile_picture
 
 router = APIRouter()
 
@@ -50,4 +50,24 @@ async def update_club_profile_route(club_id: int, profile_data: ProfileUpdate):
     except HTTPException as e:
         raise e
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e)) 
+
+# Upload a student profile picture as multipart/form-data with the image in the `file` field
+@router.post("/profile/student/{student_id}/picture")
+async def upload_student_picture_route(student_id: int, request: Request):
+    try:
+        return await upload_profile_picture("student", student_id, request)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Upload a club profile picture as multipart/form-data with the image in the `file` field
+@router.post("/profile/club/{club_id}/picture")
+async def upload_club_picture_route(club_id: int, request: Request):
+    try:
+        return await upload_profile_picture("club", club_id, request)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
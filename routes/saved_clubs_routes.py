@@ -1,5 +1,7 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from services.saved_clubs_service import save_club, unsave_club, get_saved_clubs, is_club_saved
+from services.recommendation_service import get_recommended_clubs
+from services.serialization import FastJSONResponse
 
 router = APIRouter()
 
@@ -16,10 +18,15 @@ async def unsave_club_route(student_id: int, club_id: int):
 # Get all clubs saved by a student
 @router.get("/student/{student_id}/saved-clubs")
 async def get_saved_clubs_route(student_id: int):
-    return await get_saved_clubs(student_id)
+    return FastJSONResponse(await get_saved_clubs(student_id))
 
 # Check if a specific club is saved by a student
 @router.get("/student/{student_id}/is-club-saved/{club_id}")
 async def is_club_saved_route(student_id: int, club_id: int):
     is_saved = await is_club_saved(student_id, club_id)
-    return {"saved": is_saved} 
\ No newline at end of file
+    return {"saved": is_saved}
+
+# Recommend clubs saved by students with similar saved clubs
+@router.get("/student/{student_id}/recommended-clubs")
+async def get_recommended_clubs_route(student_id: int, limit: int = Query(10, ge=1, le=50)):
+    return await get_recommended_clubs(student_id, limit)
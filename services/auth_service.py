@@ -1,13 +1,121 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException
 from passlib.context import CryptContext
-from database.db import get_db_connection
+
+# bcrypt cost factor; hashes with a different cost are rehashed on the next successful login
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
 
 # Initialize password hashing context with bcrypt scheme
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 
 # Hash a plain text password using bcrypt
-def hash_password(password: str) -> str:
+def hash_password_sync(password: str) -> str:
     return pwd_context.hash(password)
 
 # Verify if a plain text password matches its hashed version
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
\ No newline at end of file
+def verify_password_sync(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+# Verify a password and return a replacement hash if its cost is outdated
+def verify_and_update_sync(plain_password: str, hashed_password: str):
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = 0
+_stats = {
+    "completed_total": 0,
+    "rejected_total": 0,
+    "queue_wait_seconds_total": 0.0,
+    "compute_seconds_total": 0.0,
+    "queue_wait_seconds_max": 0.0,
+}
+
+
+# Worker-side wrapper reporting when the job started and how long bcrypt took
+def _timed_call(func, *args):
+    started = time.time()
+    result = func(*args)
+    return result, started, time.time() - started
+
+
+# Start the process pool used for bcrypt work
+def init_hash_pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = int(os.getenv('HASH_POOL_WORKERS', str(os.cpu_count() or 1)))
+            # spawn avoids forking a process that already runs threads
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+# Shut down the bcrypt process pool
+def close_hash_pool():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+def _queue_limit():
+    return int(os.getenv('HASH_QUEUE_LIMIT', str(4 * (os.cpu_count() or 1))))
+
+
+# Run a bcrypt function in the process pool, rejecting with 503 when saturated
+async def _run_hash_job(func, *args):
+    global _pending
+    if _pending >= _queue_limit():
+        _stats["rejected_total"] += 1
+        raise HTTPException(status_code=503, detail="Server is busy, please retry", headers={"Retry-After": "1"})
+
+    executor = _executor or init_hash_pool()
+    _pending += 1
+    submitted = time.time()
+    try:
+        result, started, compute = await asyncio.get_running_loop().run_in_executor(executor, _timed_call, func, *args)
+    finally:
+        _pending -= 1
+
+    wait = max(0.0, started - submitted)
+    _stats["completed_total"] += 1
+    _stats["queue_wait_seconds_total"] += wait
+    _stats["compute_seconds_total"] += compute
+    _stats["queue_wait_seconds_max"] = max(_stats["queue_wait_seconds_max"], wait)
+    return result
+
+# Hash a plain text password using bcrypt in the worker pool
+async def hash_password(password: str) -> str:
+    return await _run_hash_job(hash_password_sync, password)
+
+# Verify a password in the worker pool
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await _run_hash_job(verify_password_sync, plain_password, hashed_password)
+
+# Verify a password in the worker pool, returning (valid, new_hash or None)
+async def verify_and_update_password(plain_password: str, hashed_password: str):
+    return await _run_hash_job(verify_and_update_sync, plain_password, hashed_password)
+
+# Queue depth and timing statistics for the bcrypt pool
+def hash_pool_stats():
+    completed = _stats["completed_total"]
+    return {
+        **_stats,
+        "pending": _pending,
+        "queue_limit": _queue_limit(),
+        "queue_wait_seconds_avg": _stats["queue_wait_seconds_total"] / completed if completed else 0.0,
+        "compute_seconds_avg": _stats["compute_seconds_total"] / completed if completed else 0.0,
+    }
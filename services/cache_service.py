@@ -0,0 +1,66 @@
+import asyncio
+import os
+import threading
+import time
+
+
+class VersionedCache:
+    """
+    Single-value in-process cache invalidated by bumping a version number.
+
+    Writers call bump() after committing a change that affects the cached value.
+    Readers get the cached value while its version is current; on a miss only one
+    coroutine rebuilds it and concurrent readers wait for that result instead of
+    querying the database themselves. `max_age` bounds how stale the value can get
+    from writes handled by other worker processes, which cannot bump this copy.
+    """
+
+    def __init__(self, max_age: float = 30.0):
+        self.max_age = max_age
+        self._version = 0
+        self._version_lock = threading.Lock()
+        self._build_lock = asyncio.Lock()
+        self._value = None
+        self._value_version = -1
+        self._built_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    # Invalidate the cached value; safe to call from executor threads
+    def bump(self):
+        with self._version_lock:
+            self._version += 1
+
+    def _fresh(self) -> bool:
+        return (
+            self._value is not None
+            and self._value_version == self._version
+            and time.monotonic() - self._built_at < self.max_age
+        )
+
+    # Return the cached value, rebuilding it with `build` (a coroutine function) on a miss
+    async def get(self, build):
+        if self._fresh():
+            self.hits += 1
+            return self._value
+        async with self._build_lock:
+            if self._fresh():
+                self.hits += 1
+                return self._value
+            self.misses += 1
+            # A bump during the build leaves the stored version behind, forcing a rebuild next time
+            version = self._version
+            value = await build()
+            self._value, self._value_version, self._built_at = value, version, time.monotonic()
+            return value
+
+    def stats(self):
+        return {"version": self._version, "hits": self.hits, "misses": self.misses}
+
+
+# ClubCatalog behind GET /api/clubs (rows sorted by the pagination key), bumped by club registration, profile updates and save/unsave
+club_catalog = VersionedCache(max_age=float(os.getenv('CATALOG_CACHE_MAX_AGE', '30')))
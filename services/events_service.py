@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+import threading
+from typing import Any, Dict, Optional, Set, Tuple
+from fastapi.encoders import jsonable_encoder
+
+# Pending events buffered per connection before it is told to resync
+EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', '100'))
+
+# Open event streams allowed per worker process
+EVENTS_MAX_CONNECTIONS = int(os.getenv('EVENTS_MAX_CONNECTIONS', '5000'))
+
+# Seconds between keep-alive comments on idle streams
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv('EVENTS_HEARTBEAT_SECONDS', '20'))
+
+
+# Encode one Server-Sent Events frame
+def sse_frame(event: str, data: Any) -> bytes:
+    body = json.dumps(jsonable_encoder(data), separators=(",", ":"))
+    return f"event: {event}\ndata: {body}\n\n".encode()
+
+
+RESYNC_FRAME = sse_frame("resync", {})
+HEARTBEAT_FRAME = b": ping\n\n"
+
+
+class Subscription:
+    """One open event stream with its own bounded queue of encoded frames."""
+
+    def __init__(self, key: Tuple[str, int], maxsize: int):
+        self.key = key
+        self.queue = asyncio.Queue(maxsize)
+
+    # Queue a frame; a full queue is cleared and replaced by a resync request. Returns frames dropped.
+    def offer(self, frame: bytes) -> int:
+        try:
+            self.queue.put_nowait(frame)
+            return 0
+        except asyncio.QueueFull:
+            dropped = self.queue.qsize() + 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_FRAME)
+            return dropped
+
+
+class EventHub:
+    """
+    In-process pub/sub for inbox events, keyed by (user_type, user_id).
+
+    Subscriptions live on the event loop; publish() may be called from database
+    executor threads after a commit and hands delivery to the loop. Each frame
+    is encoded once and shared by every connection of the recipient. A connection
+    that falls more than `queue_size` events behind loses its backlog and gets a
+    single `resync` event, so a slow client never holds unbounded memory and
+    never blocks publishers. Events only reach clients connected to this process.
+    """
+
+    def __init__(self, queue_size: int = 100, max_connections: int = 5000):
+        self.queue_size = queue_size
+        self.max_connections = max_connections
+        self._subscribers: Dict[Tuple[str, int], Set[Subscription]] = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+        self.rejected = 0
+        self.dropped = 0
+
+    # Register a stream for a user; returns None when the connection limit is reached
+    def subscribe(self, user_type: str, user_id: int) -> Optional[Subscription]:
+        self._loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._count >= self.max_connections:
+                self.rejected += 1
+                return None
+            subscription = Subscription((user_type, user_id), self.queue_size)
+            self._subscribers.setdefault(subscription.key, set()).add(subscription)
+            self._count += 1
+            return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.key)
+            if subscribers and subscription in subscribers:
+                subscribers.discard(subscription)
+                self._count -= 1
+                if not subscribers:
+                    del self._subscribers[subscription.key]
+
+    # Whether a user has an open stream, to skip building events nobody will receive
+    def is_subscribed(self, user_type: str, user_id: int) -> bool:
+        return (user_type, user_id) in self._subscribers
+
+    # Send an event to every stream of a user; safe to call from any thread
+    def publish(self, user_type: str, user_id: int, event: str, data: Any):
+        key = (user_type, user_id)
+        if key not in self._subscribers or self._loop is None:
+            return
+        frame = sse_frame(event, data)
+        self.published += 1
+        try:
+            self._loop.call_soon_threadsafe(self._deliver, key, frame)
+        except RuntimeError:
+            # Loop already closed during shutdown
+            pass
+
+    def _deliver(self, key: Tuple[str, int], frame: bytes):
+        with self._lock:
+            subscribers = list(self._subscribers.get(key, ()))
+        for subscription in subscribers:
+            self.dropped += subscription.offer(frame)
+
+    # Whether another stream can be opened on this process
+    def has_capacity(self) -> bool:
+        return self._count < self.max_connections
+
+    # Yield SSE frames for a user until the client disconnects, with keep-alive comments while idle.
+    # Subscribing inside the generator ties the subscription's lifetime to the response body.
+    async def stream(self, user_type: str, user_id: int, heartbeat: float):
+        subscription = self.subscribe(user_type, user_id)
+        if subscription is None:
+            yield sse_frame("error", {"detail": "Too many open event streams"})
+            return
+        try:
+            yield sse_frame("ready", {"user_type": user_type, "user_id": user_id})
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscription.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT_FRAME
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "connections": self._count,
+                "users": len(self._subscribers),
+                "max_connections": self.max_connections,
+                "published_total": self.published,
+                "rejected_total": self.rejected,
+                "dropped_total": self.dropped,
+            }
+
+
+# Message, thread and read-receipt events for open dashboards
+inbox_events = EventHub(queue_size=EVENTS_QUEUE_SIZE, max_connections=EVENTS_MAX_CONNECTIONS)
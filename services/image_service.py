@@ -0,0 +1,257 @@
+"""
+Resized variants and blur placeholders for profile pictures.
+
+Every uploaded picture is rendered off the request path, in a process pool, as
+square 64/256/512 px thumbnails in WebP and JPEG with metadata stripped, plus a
+tiny blurred WebP preview stored inline as a data URI. Generate them for
+pictures uploaded before this existed with:
+
+    python -m services.image_service
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict
+from PIL import Image, ImageOps
+from database.db import db_connection, db_task, get_db_connection
+from services.cache_service import club_catalog
+from services.logging_service import configure_logging
+
+# Edge lengths in pixels of the square variants generated for each picture
+VARIANT_SIZES = (64, 256, 512)
+
+# Output formats as (key, file extension, Pillow format, save options)
+VARIANT_FORMATS = (
+    ("webp", "webp", "WEBP", {"quality": 80, "method": 4}),
+    ("jpeg", "jpg", "JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+)
+
+# Edge length of the blurred preview embedded in API responses
+PLACEHOLDER_SIZE = 16
+
+logger = logging.getLogger(__name__)
+
+
+# Decode a picture upright and flattened onto white, ready to resize
+def _open_rgb(source_path: str, largest: int) -> Image.Image:
+    with Image.open(source_path) as image:
+        # JPEGs decode straight at a reduced scale when the source is much larger than needed
+        image.draft("RGB", (largest, largest))
+        # Apply the EXIF orientation before metadata is dropped
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            return background
+        return image.convert("RGB")
+
+
+# Render every variant and the placeholder of one picture; runs in a worker process.
+# Variants sit next to the content-addressed source, so a picture shared by several profiles
+# is only resized once; files are written under a temporary name and renamed into place.
+def render_variants(source_path: str) -> Dict[str, Any]:
+    image = _open_rgb(source_path, max(VARIANT_SIZES))
+    base, _ = os.path.splitext(source_path)
+
+    variants: Dict[str, Dict[str, str]] = {}
+    for size in VARIANT_SIZES:
+        paths = {key: f"{base}_{size}.{ext}" for key, ext, _, _ in VARIANT_FORMATS}
+        variants[str(size)] = paths
+        if all(os.path.exists(path) for path in paths.values()):
+            for path in paths.values():
+                # Restart the garbage collection grace period until the new reference is recorded
+                os.utime(path)
+            continue
+        thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        # Nothing from the upload (EXIF, ICC, comments) is written back out
+        thumbnail.info = {}
+        for key, _, fmt, options in VARIANT_FORMATS:
+            partial = f"{paths[key]}.{os.getpid()}.part"
+            thumbnail.save(partial, fmt, **options)
+            os.replace(partial, paths[key])
+
+    preview = ImageOps.fit(image, (PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.Resampling.BOX)
+    preview.info = {}
+    buffer = io.BytesIO()
+    preview.save(buffer, "WEBP", quality=30)
+    placeholder = "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+    return {"variants": variants, "placeholder": placeholder}
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_tasks = set()
+_pending = 0
+_stats = {
+    "completed_total": 0,
+    "failed_total": 0,
+    "discarded_total": 0,
+    "skipped_total": 0,
+    "render_seconds_total": 0.0,
+}
+
+
+# Start the process pool used for image rendering
+def init_image_pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = int(os.getenv('IMAGE_POOL_WORKERS', '2'))
+            # spawn avoids forking a process that already runs threads
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def _queue_limit():
+    return int(os.getenv('IMAGE_QUEUE_LIMIT', str(4 * int(os.getenv('IMAGE_POOL_WORKERS', '2')))))
+
+
+# Shut down the image process pool, letting queued renders finish
+def close_image_pool():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+# Store rendered variants if the profile still shows the picture they were made from; returns whether it did
+@db_task
+def record_variants(user_type: str, user_id: int, source_path: str, rendered: Dict[str, Any]) -> bool:
+    table = "students" if user_type == "student" else "clubs"
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            f"""
+            UPDATE {table}
+            SET profile_picture_variants = %s, profile_picture_placeholder = %s
+            WHERE id = %s AND profile_picture = %s
+            RETURNING id
+            """,
+            (json.dumps(rendered["variants"]), rendered["placeholder"], user_id, source_path)
+        )
+        updated = cur.fetchone() is not None
+        conn.commit()
+    if updated and user_type == "club":
+        club_catalog.bump()
+    return updated
+
+
+# Render a stored picture's variants in the process pool and attach them to the profile.
+# Counted in _pending from the moment schedule_profile_picture queues it.
+async def process_profile_picture(user_type: str, user_id: int, source_path: str):
+    global _pending
+    executor = _executor or init_image_pool()
+    started = time.monotonic()
+    try:
+        rendered = await asyncio.get_running_loop().run_in_executor(executor, render_variants, source_path)
+    except Exception:
+        _stats["failed_total"] += 1
+        logger.exception("Rendering variants of %s failed", source_path)
+        return
+    finally:
+        _pending -= 1
+    _stats["render_seconds_total"] += time.monotonic() - started
+
+    try:
+        recorded = await record_variants(user_type, user_id, source_path, rendered)
+    except Exception:
+        recorded = False
+        logger.exception("Recording variants of %s failed", source_path)
+    if recorded:
+        _stats["completed_total"] += 1
+    else:
+        # The picture was replaced while rendering, or the update failed; unused files are garbage collected
+        _stats["discarded_total"] += 1
+
+
+# Queue variant rendering for a newly stored picture without waiting for it. When more than
+# IMAGE_QUEUE_LIMIT renders are pending the picture is left without variants: profiles keep
+# serving the original, and `python -m services.image_service` renders it later.
+def schedule_profile_picture(user_type: str, user_id: int, source_path: str):
+    global _pending
+    if _pending >= _queue_limit():
+        _stats["skipped_total"] += 1
+        logger.warning("Image queue full, not rendering variants of %s", source_path)
+        return
+    _pending += 1
+    task = asyncio.create_task(process_profile_picture(user_type, user_id, source_path))
+    # Hold a reference until the task finishes so it is not garbage collected
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+# Queue depth and timing statistics for the image pool
+def image_pool_stats():
+    rendered = _stats["completed_total"] + _stats["discarded_total"]
+    return {
+        **_stats,
+        "pending": _pending,
+        "queue_limit": _queue_limit(),
+        "render_seconds_avg": _stats["render_seconds_total"] / rendered if rendered else 0.0,
+    }
+
+
+# Render variants for every stored picture that has none yet
+def backfill_variants(workers: int = 2) -> Dict[str, int]:
+    conn = get_db_connection()
+    counts = {"rendered": 0, "missing": 0, "failed": 0}
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT 'student' AS user_type, id, profile_picture FROM students
+                WHERE profile_picture IS NOT NULL AND profile_picture_variants IS NULL
+                UNION ALL
+                SELECT 'club', id, profile_picture FROM clubs
+                WHERE profile_picture IS NOT NULL AND profile_picture_variants IS NULL
+                """
+            )
+            candidates = cur.fetchall()
+        conn.commit()
+        # Pictures stored as external URLs or already deleted from disk have nothing to render
+        rows = [row for row in candidates if os.path.isfile(row["profile_picture"])]
+        counts["missing"] = len(candidates) - len(rows)
+
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [(row, executor.submit(render_variants, row["profile_picture"])) for row in rows]
+            for row, future in futures:
+                try:
+                    rendered = future.result()
+                except Exception:
+                    counts["failed"] += 1
+                    logger.exception("Rendering variants of %s failed (%s %s)", row["profile_picture"], row["user_type"], row["id"])
+                    continue
+                table = "students" if row["user_type"] == "student" else "clubs"
+                with conn.cursor() as cur:
+                    cur.execute(
+                        f"""
+                        UPDATE {table}
+                        SET profile_picture_variants = %s, profile_picture_placeholder = %s
+                        WHERE id = %s AND profile_picture = %s
+                        """,
+                        (json.dumps(rendered["variants"]), rendered["placeholder"], row["id"], row["profile_picture"])
+                    )
+                    if cur.rowcount:
+                        counts["rendered"] += 1
+                conn.commit()
+        return counts
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render resized variants for profile pictures that have none")
+    parser.add_argument("--workers", type=int, default=2, help="rendering processes")
+    args = parser.parse_args()
+    configure_logging()
+    print(backfill_variants(args.workers))
@@ -0,0 +1,69 @@
+"""
+Log configuration for the API process.
+
+Logs are written to stderr as one JSON object per line (`LOG_FORMAT=text` for
+plain lines while developing). `LOG_LEVEL` sets the root level and `LOG_LEVELS`
+overrides single loggers, e.g.
+
+    LOG_LEVEL=INFO LOG_LEVELS="services.metrics_service=DEBUG,uvicorn.access=WARNING"
+"""
+import datetime
+import json
+import logging
+import os
+import sys
+
+# Root log level
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+
+# Comma-separated logger=LEVEL overrides
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+
+# json or text
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+
+# Attributes every LogRecord has (plus uvicorn's ANSI-colored duplicate message);
+# anything else on a record was passed with extra= and becomes a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName", "color_message"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as a single-line JSON object with its extra= fields at the top level."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+# Send every logger, uvicorn's included, through one stderr handler in the configured format and levels
+def configure_logging():
+    handler = logging.StreamHandler(sys.stderr)
+    if LOG_FORMAT == "text":
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        handler.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL.upper())
+
+    # uvicorn installs its own handlers before loading the app; hand its records to the root handler instead
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logger = logging.getLogger(name)
+        logger.handlers = []
+        logger.propagate = True
+
+    for override in LOG_LEVELS.split(","):
+        name, _, level = override.partition("=")
+        if name.strip() and level.strip():
+            logging.getLogger(name.strip()).setLevel(level.strip().upper())
@@ -1,84 +1,75 @@
 from fastapi import HTTPException
-from services.auth_service import verify_password
+from services.auth_service import verify_and_update_password
 from models.schemas import LoginData
-from database.db import get_db_connection
+from database.db import db_connection, db_task
 
-# Authenticate student login credentials and return student ID
-async def student_login(login_data: LoginData):
-    conn = None
-    cur = None
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # Verify email and password against auth_credentials table
+# Look up auth credentials and the linked student or club record by email
+@db_task
+def find_credentials(email: str, user_type: str):
+    profile_table = "students" if user_type == "student" else "clubs"
+    with db_connection() as conn, conn.cursor() as cur:
         cur.execute(
-            "SELECT id, password_hash FROM auth_credentials WHERE email = %s AND user_type = 'student'",
-            (login_data.email,)
+            f"""
+            SELECT a.id AS auth_id, a.password_hash, p.id
+            FROM auth_credentials a
+            LEFT JOIN {profile_table} p ON p.auth_id = a.id
+            WHERE a.email = %s AND a.user_type = %s
+            """,
+            (email, user_type)
         )
-        user = cur.fetchone()
-        
-        if not user or not verify_password(login_data.password, user["password_hash"]):
-            raise HTTPException(status_code=401, detail="Incorrect email or password")
+        return cur.fetchone()
 
-        # Get student record associated with auth credentials
+# Store a password hash recomputed with the current bcrypt cost
+@db_task
+def update_password_hash(auth_id: int, password_hash: str):
+    with db_connection() as conn, conn.cursor() as cur:
         cur.execute(
-            "SELECT id FROM students WHERE auth_id = %s",
-            (user["id"],)
+            "UPDATE auth_credentials SET password_hash = %s WHERE id = %s",
+            (password_hash, auth_id)
         )
-        student = cur.fetchone()
-        
-        if not student:
+        conn.commit()
+
+# Verify credentials, rehashing the password when the bcrypt cost has changed
+async def authenticate(login_data: LoginData, user_type: str):
+    user = await find_credentials(login_data.email, user_type)
+    if not user:
+        raise HTTPException(status_code=401, detail="Incorrect email or password")
+
+    valid, new_hash = await verify_and_update_password(login_data.password, user["password_hash"])
+    if not valid:
+        raise HTTPException(status_code=401, detail="Incorrect email or password")
+
+    if new_hash:
+        await update_password_hash(user["auth_id"], new_hash)
+
+    return user
+
+# Authenticate student login credentials and return student ID
+async def student_login(login_data: LoginData):
+    try:
+        student = await authenticate(login_data, "student")
+
+        if not student["id"]:
             raise HTTPException(status_code=404, detail="Student record not found")
-        
+
         return {"id": student["id"], "message": "Login successful"}
-        
+
     except HTTPException as he:
         raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
 
 # Authenticate club login credentials and return club ID
 async def club_login(login_data: LoginData):
-    conn = None
-    cur = None
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # Verify email and password against auth_credentials table
-        cur.execute(
-            "SELECT id, password_hash FROM auth_credentials WHERE email = %s AND user_type = 'club'",
-            (login_data.email,)
-        )
-        club = cur.fetchone()
-        
-        if not club or not verify_password(login_data.password, club["password_hash"]):
-            raise HTTPException(status_code=401, detail="Incorrect email or password")
-        
-        # Get club record associated with auth credentials
-        cur.execute(
-            "SELECT id FROM clubs WHERE auth_id = %s",
-            (club["id"],)
-        )
-        club_record = cur.fetchone()
-        
-        if not club_record:
+        club = await authenticate(login_data, "club")
+
+        if not club["id"]:
             raise HTTPException(status_code=404, detail="Club record not found")
-        
-        return {"id": club_record["id"], "message": "Login successful"}
-        
+
+        return {"id": club["id"], "message": "Login successful"}
+
     except HTTPException as he:
         raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
\ No newline at end of file
@@ -0,0 +1,202 @@
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from database.db import db_connection, db_task
+
+# Seconds before a worker reloads the whole index, picking up changes made by other workers
+INDEX_REFRESH_SECONDS = float(os.getenv('MATCH_INDEX_REFRESH_SECONDS', '300'))
+
+
+# Normalize interest tags so "Robotics " and "robotics" match
+def normalize_tags(interests: Optional[Iterable[str]]) -> List[str]:
+    if not interests:
+        return []
+    return sorted({tag.strip().lower() for tag in interests if tag and tag.strip()})
+
+
+class InterestIndex:
+    """
+    Inverted index from interest tag to clubs.
+
+    Clubs live in dense slots; each tag maps to a sorted int32 array of slots.
+    Queries score every club sharing a tag with the student by IDF-weighted
+    Jaccard similarity using NumPy, then pick the top k with argpartition.
+    Club updates touch only the affected tags and are folded into the arrays
+    lazily on the next query.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._slot_of = {}        # club id -> slot
+        self._club_ids = []       # slot -> club id
+        self._names = []          # slot -> club name
+        self._tags = []           # slot -> tuple of normalized tags
+        self._members = {}        # tag -> set of slots
+        self._postings = {}       # tag -> sorted np.int32 array of slots
+        self._dirty_tags = set()
+        self._club_weight = np.zeros(0, dtype=np.float64)
+        self._weights_stale = True
+        self.loaded_at = 0.0
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    # Build the index from (id, name, interests) rows
+    @classmethod
+    def from_rows(cls, rows):
+        index = cls()
+        for row in rows:
+            index.update_club(row["id"], row["name"], row["interests"])
+        index.loaded_at = time.monotonic()
+        return index
+
+    # Insert or replace a club's interests
+    def update_club(self, club_id: int, name: str, interests: Optional[Iterable[str]]):
+        tags = tuple(normalize_tags(interests))
+        with self._lock:
+            slot = self._slot_of.get(club_id)
+            if slot is None:
+                slot = len(self._club_ids)
+                self._club_ids.append(club_id)
+                self._names.append(name)
+                self._tags.append(())
+                self._slot_of[club_id] = slot
+            old_tags = self._tags[slot]
+            self._names[slot] = name
+            self._tags[slot] = tags
+
+            for tag in set(old_tags) - set(tags):
+                self._members[tag].discard(slot)
+                self._dirty_tags.add(tag)
+            for tag in set(tags) - set(old_tags):
+                self._members.setdefault(tag, set()).add(slot)
+                self._dirty_tags.add(tag)
+            self._weights_stale = True
+
+    def _idf(self, tag: str) -> float:
+        return math.log(1.0 + len(self._slot_of) / len(self._members[tag]))
+
+    # Fold pending updates into posting arrays and per-club IDF weight totals
+    def _refresh(self):
+        for tag in self._dirty_tags:
+            members = self._members.get(tag)
+            if members:
+                self._postings[tag] = np.fromiter(sorted(members), dtype=np.int32, count=len(members))
+            else:
+                self._postings.pop(tag, None)
+                self._members.pop(tag, None)
+        self._dirty_tags.clear()
+
+        if self._weights_stale:
+            weight = np.zeros(len(self._club_ids), dtype=np.float64)
+            if self._postings:
+                slots = np.concatenate(list(self._postings.values()))
+                idf = np.repeat([self._idf(tag) for tag in self._postings], [len(p) for p in self._postings.values()])
+                weight += np.bincount(slots, weights=idf, minlength=len(self._club_ids))
+            self._club_weight = weight
+            self._weights_stale = False
+
+    # Return the top `limit` clubs for a set of interests, optionally restricted to a category tag
+    def search(self, interests: Iterable[str], category: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        query = normalize_tags(interests)
+        with self._lock:
+            self._refresh()
+            known = [tag for tag in query if tag in self._postings]
+            if not known or limit <= 0:
+                return []
+
+            idf = np.array([self._idf(tag) for tag in known])
+            postings = [self._postings[tag] for tag in known]
+            slots = np.concatenate(postings)
+            overlap = np.bincount(slots, weights=np.repeat(idf, [len(p) for p in postings]), minlength=len(self._club_ids))
+
+            candidates = np.flatnonzero(overlap)
+            if category:
+                category_postings = self._postings.get(category.strip().lower())
+                if category_postings is None:
+                    return []
+                candidates = np.intersect1d(candidates, category_postings, assume_unique=True)
+                if candidates.size == 0:
+                    return []
+
+            # Weighted Jaccard: shared weight / (student weight + club weight - shared weight)
+            shared = overlap[candidates]
+            scores = shared / (idf.sum() + self._club_weight[candidates] - shared)
+
+            if candidates.size > limit:
+                top = np.argpartition(-scores, limit - 1)[:limit]
+            else:
+                top = np.arange(candidates.size)
+            top = top[np.lexsort((candidates[top], -scores[top]))]
+
+            query_set = set(known)
+            results = []
+            for i in top:
+                slot = int(candidates[i])
+                results.append({
+                    "id": self._club_ids[slot],
+                    "name": self._names[slot],
+                    "interests": list(self._tags[slot]),
+                    "matched_interests": [tag for tag in self._tags[slot] if tag in query_set],
+                    "score": round(float(scores[i]), 4)
+                })
+            return results
+
+
+_index: Optional[InterestIndex] = None
+_index_lock = threading.Lock()
+# Club updates made while a reload is building its index, replayed onto it before the swap
+_reload_updates: Optional[List[tuple]] = None
+_updates_lock = threading.Lock()
+
+
+# Load every club's interests from the database into a fresh index
+def build_index() -> InterestIndex:
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id, name, interests FROM clubs")
+        return InterestIndex.from_rows(cur.fetchall())
+
+
+# Make sure the index is loaded and not older than the refresh interval
+@db_task
+def ensure_index():
+    global _index, _reload_updates
+    if _index is not None and time.monotonic() - _index.loaded_at < INDEX_REFRESH_SECONDS:
+        return _index
+    with _index_lock:
+        if _index is None or time.monotonic() - _index.loaded_at >= INDEX_REFRESH_SECONDS:
+            # Updates committed after the build's snapshot would be missing from it; record them meanwhile
+            with _updates_lock:
+                _reload_updates = []
+            try:
+                # Build the replacement first so readers keep using the old index meanwhile
+                index = build_index()
+            except Exception:
+                with _updates_lock:
+                    _reload_updates = None
+                raise
+            with _updates_lock:
+                for update in _reload_updates:
+                    index.update_club(*update)
+                _index, _reload_updates = index, None
+    return _index
+
+
+# Apply a club's new interests to the loaded index, and to one being built, if any.
+# Clubs are never deleted by the app; ones removed in the database drop out at the next reload.
+def club_updated(club_id: int, name: str, interests: Optional[Iterable[str]]):
+    with _updates_lock:
+        if _index is not None:
+            _index.update_club(club_id, name, interests)
+        if _reload_updates is not None:
+            _reload_updates.append((club_id, name, interests))
+
+
+# Search clubs matching a comma-separated list of interests
+def search_clubs(search_param: str, category: Optional[str] = None, limit: int = 20) -> List[Dict]:
+    if _index is None:
+        return []
+    return _index.search(search_param.split(","), category, limit)
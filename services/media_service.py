@@ -0,0 +1,455 @@
+import argparse
+import hashlib
+import mimetypes
+import os
+import time
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import quote
+import anyio
+from fastapi import HTTPException, Request, Response
+from python_multipart.multipart import MultipartParseError, MultipartParser, parse_options_header
+from database.db import get_db_connection
+
+# Largest accepted profile picture in bytes
+PROFILE_PICTURE_MAX_BYTES = int(os.getenv('PROFILE_PICTURE_MAX_BYTES', str(5 * 1024 * 1024)))
+
+# Room for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD_BYTES = 16 * 1024
+
+# Leading bytes of each accepted image format and the extension it is stored under
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+
+# Bytes needed to recognize every format above, including WebP's RIFF....WEBP header
+SNIFF_BYTES = 12
+
+# Everything served under /uploads lives here
+UPLOADS_DIR = "uploads"
+
+# Uploaded files live under this directory, named by content hash
+MEDIA_DIR = "uploads/media"
+
+# When set (e.g. /_uploads/), /uploads responses hand the file to nginx with X-Accel-Redirect to this internal location
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv('MEDIA_ACCEL_REDIRECT_PREFIX', '')
+
+# Content-addressed files never change, so browsers and proxies may keep them for a year without asking again
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Files stored under per-user names can be overwritten and are revalidated on every use
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# Read size when a file is streamed through the worker
+SEND_CHUNK_BYTES = 64 * 1024
+
+mimetypes.add_type("image/webp", ".webp")
+
+
+# Format a stored profile picture path as a URL served under /uploads
+def picture_url(profile_picture: Optional[str], user_type: str = "club") -> Optional[str]:
+    if not profile_picture:
+        return None
+    if 'uploads/' in profile_picture and not profile_picture.startswith('/uploads/'):
+        return f"/{profile_picture}"
+    if not profile_picture.startswith(('http://', 'https://', '/')):
+        return f"/uploads/{user_type}_profile_pictures/{profile_picture}"
+    return profile_picture
+
+
+# Size-specific URLs of a picture's generated variants, e.g. {"64": {"webp": url, "jpeg": url}, ...}
+def picture_variants(variants: Optional[Dict[str, Dict[str, str]]]) -> Optional[Dict[str, Dict[str, str]]]:
+    if not variants:
+        return None
+    return {size: {fmt: picture_url(path) for fmt, path in formats.items()} for size, formats in variants.items()}
+
+
+# Content-addressed location of a file: two levels of two-hex-digit shards keep directories small
+def media_path(digest: str, ext: str) -> str:
+    return f"{MEDIA_DIR}/{digest[:2]}/{digest[2:4]}/{digest}.{ext}"
+
+
+# Identify an image from its first bytes; returns the file extension or None for anything else
+def sniff_image_type(head: bytes) -> Optional[str]:
+    for signature, ext in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+class _FieldReader:
+    """Push-parser callbacks that collect the bytes of one named multipart field as they arrive."""
+
+    def __init__(self, field: str):
+        self.field = field.encode()
+        self.found = False
+        self._chunks: List[bytes] = []
+        self._in_field = False
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self._part_begin,
+            "on_header_field": self._header_field,
+            "on_header_value": self._header_value_data,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        }
+
+    # Bytes of the field received since the last call
+    def drain(self) -> List[bytes]:
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+    def _part_begin(self):
+        self._disposition = b""
+
+    def _header_field(self, data, start, end):
+        self._header_name += data[start:end]
+
+    def _header_value_data(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name, self._header_value = b"", b""
+
+    def _headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        # Only the first part with the field's name is kept
+        self._in_field = options.get(b"name") == self.field and not self.found
+        self.found = self.found or self._in_field
+
+    def _part_data(self, data, start, end):
+        if self._in_field:
+            self._chunks.append(data[start:end])
+
+    def _part_end(self):
+        self._in_field = False
+
+
+class _StagedUpload:
+    """Blocking half of an upload: hashes and writes the image to a temporary file, then moves it into
+    content-addressed storage (or discards it). Each call runs on a worker thread, off the event loop."""
+
+    def __init__(self):
+        os.makedirs(MEDIA_DIR, exist_ok=True)
+        self.partial = f"{MEDIA_DIR}/.{uuid.uuid4()}.part"
+        self.file = open(self.partial, "wb")
+        self.digest = hashlib.sha256()
+
+    def write(self, parts: List[bytes]):
+        for data in parts:
+            self.digest.update(data)
+            self.file.write(data)
+
+    # Move the finished file to its content-addressed path and return that path
+    def store(self, image_ext: str) -> str:
+        self.file.close()
+        file_path = media_path(self.digest.hexdigest(), image_ext)
+        if os.path.exists(file_path):
+            # Same bytes already stored; refresh the timestamp so garbage collection's grace period covers it again
+            os.utime(file_path)
+        else:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            os.replace(self.partial, file_path)
+        return file_path
+
+    # Remove the temporary file unless store() already moved it
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.partial):
+            os.remove(self.partial)
+
+
+# Stream the `field` part of a multipart request into content-addressed storage and return the stored path.
+# The body is parsed chunk by chunk as it arrives; hashing and file I/O run on worker threads, so the event
+# loop only parses and memory stays at one chunk per request. Oversized uploads are refused from
+# Content-Length or as soon as the limit is crossed, and anything that is not a JPEG, PNG, GIF or WebP by
+# its leading bytes is refused after the first few bytes. An image that is already stored is not written
+# twice; both profiles point at the same file.
+async def save_uploaded_image(request: Request, field: str = "file") -> str:
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    body_limit = PROFILE_PICTURE_MAX_BYTES + MULTIPART_OVERHEAD_BYTES
+    too_large = HTTPException(status_code=413, detail=f"Image must be at most {PROFILE_PICTURE_MAX_BYTES / (1024 * 1024):.3g} MB")
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > body_limit:
+        raise too_large
+
+    reader = _FieldReader(field)
+    parser = MultipartParser(boundary, reader.callbacks())
+    received = 0
+    size = 0
+    head = b""
+    image_ext = None
+    staged = await anyio.to_thread.run_sync(_StagedUpload)
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > body_limit:
+                raise too_large
+            try:
+                parser.write(chunk)
+            except MultipartParseError:
+                raise HTTPException(status_code=400, detail="Malformed multipart body")
+
+            parts = reader.drain()
+            for data in parts:
+                size += len(data)
+                if size > PROFILE_PICTURE_MAX_BYTES:
+                    raise too_large
+                if image_ext is None:
+                    head += data[:SNIFF_BYTES - len(head)]
+                    if len(head) >= SNIFF_BYTES:
+                        image_ext = sniff_image_type(head)
+                        if image_ext is None:
+                            raise HTTPException(status_code=415, detail="Profile pictures must be JPEG, PNG, GIF or WebP images")
+            if parts:
+                await anyio.to_thread.run_sync(staged.write, parts)
+        parser.finalize()
+
+        if not reader.found or size == 0:
+            raise HTTPException(status_code=400, detail=f"No image in the '{field}' field")
+        # Files shorter than the sniff window are still checked
+        image_ext = image_ext or sniff_image_type(head)
+        if image_ext is None:
+            raise HTTPException(status_code=415, detail="Profile pictures must be JPEG, PNG, GIF or WebP images")
+
+        return await anyio.to_thread.run_sync(staged.store, image_ext)
+    finally:
+        await anyio.to_thread.run_sync(staged.discard)
+
+
+class MediaFileResponse(Response):
+    """Sends `count` bytes of a file from `offset`, handing the copy to the server when it supports the
+    ASGI zero-copy extension (sendfile) and streaming it in chunks otherwise."""
+
+    def __init__(self, path: str, offset: int, count: int, status_code: int, headers: Dict[str, str], media_type: str):
+        self.path = path
+        self.offset = offset
+        self.count = count
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
+        self.headers["content-length"] = str(count)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        extensions = scope.get("extensions") or {}
+        if scope["method"] == "HEAD" or self.count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopy" in extensions:
+            async with await anyio.open_file(self.path, "rb") as file:
+                await send({"type": "http.response.zerocopy", "file": file.wrapped, "offset": self.offset, "count": self.count, "more_body": False})
+        else:
+            async with await anyio.open_file(self.path, "rb") as file:
+                await file.seek(self.offset)
+                remaining = self.count
+                while remaining:
+                    chunk = await file.read(min(SEND_CHUNK_BYTES, remaining))
+                    if not chunk:
+                        # The file shrank since it was stat'ed; end the body rather than hang the client
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                if remaining:
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+# Whether an If-None-Match / If-Range value lists `etag`; weak comparison ignores W/ prefixes
+def _etag_matches(header: str, etag: str, weak: bool = True) -> bool:
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip()
+        if weak and tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+# Whether an If-Modified-Since / If-Range date is at or after the file's modification time
+def _not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+# First and last byte (inclusive) requested by a single-range Range header, or None to send the whole file.
+# Multi-range and malformed headers are ignored, which HTTP allows; ranges starting past the end get 416.
+def _byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0 or size == 0:
+                raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+# Serve a file under /uploads with caching validators. Content-addressed files get an ETag derived from
+# their hash and are cacheable forever; older per-user files get an ETag from mtime and size and must be
+# revalidated. Answers If-None-Match / If-Modified-Since with 304 and single byte ranges with 206, and
+# with MEDIA_ACCEL_REDIRECT_PREFIX set leaves sending the bytes to nginx.
+async def serve_upload(path: str, request: Request) -> Response:
+    root = os.path.realpath(UPLOADS_DIR)
+    full_path = os.path.realpath(os.path.join(root, path))
+    # No escaping the uploads directory, and no access to in-progress .part files
+    if not full_path.startswith(root + os.sep) or any(part.startswith(".") for part in path.split("/")):
+        raise HTTPException(status_code=404, detail="File not found")
+    try:
+        stat = await anyio.to_thread.run_sync(os.stat, full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise HTTPException(status_code=404, detail="File not found")
+    if not os.path.isfile(full_path):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    relative = os.path.relpath(full_path, root)
+    if relative.startswith("media" + os.sep):
+        # <sha256>.<ext> or <sha256>_<size>.<ext>: the name pins the bytes
+        etag = '"' + os.path.splitext(os.path.basename(relative))[0] + '"'
+        cache_control = IMMUTABLE_CACHE_CONTROL
+    else:
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        cache_control = REVALIDATE_CACHE_CONTROL
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+        "X-Content-Type-Options": "nosniff",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if (if_none_match and _etag_matches(if_none_match, etag)) or (
+        not if_none_match and if_modified_since and _not_modified_since(if_modified_since, stat.st_mtime)
+    ):
+        return Response(status_code=304, headers=headers)
+
+    media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+    if MEDIA_ACCEL_REDIRECT_PREFIX:
+        # nginx serves the body (with sendfile and its own Range handling) from the internal location
+        headers["X-Accel-Redirect"] = MEDIA_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + quote(relative.replace(os.sep, "/"))
+        return Response(headers=headers, media_type=media_type)
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if range_header:
+        # A stale If-Range means the client's partial copy is of other bytes; send the whole file instead
+        if_range = request.headers.get("if-range")
+        if not if_range or (
+            _etag_matches(if_range, etag, weak=False) if if_range.startswith(('"', "W/")) else _not_modified_since(if_range, stat.st_mtime)
+        ):
+            byte_range = _byte_range(range_header, stat.st_size)
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+        return MediaFileResponse(full_path, start, end - start + 1, 206, headers, media_type)
+    return MediaFileResponse(full_path, 0, stat.st_size, 200, headers, media_type)
+
+
+# Upload paths (relative, as stored under uploads/) of every picture and variant a profile points at
+def referenced_paths(cur) -> Set[str]:
+    cur.execute(
+        """
+        SELECT 'student' AS user_type, profile_picture AS path FROM students WHERE profile_picture IS NOT NULL
+        UNION ALL
+        SELECT 'club', profile_picture FROM clubs WHERE profile_picture IS NOT NULL
+        UNION ALL
+        SELECT 'student', f.value #>> '{}'
+        FROM students s, jsonb_each(s.profile_picture_variants) v, jsonb_each(v.value) f
+        UNION ALL
+        SELECT 'club', f.value #>> '{}'
+        FROM clubs c, jsonb_each(c.profile_picture_variants) v, jsonb_each(v.value) f
+        """
+    )
+    paths = set()
+    for row in cur.fetchall():
+        # Stored values come in the same shapes picture_url() accepts
+        url = picture_url(row["path"], row["user_type"])
+        if url.startswith("/uploads/"):
+            paths.add(os.path.normpath(url[1:]))
+    return paths
+
+
+# Delete files under `root` that no profile references, in one pass over the tree.
+# Files newer than `min_age_seconds` are kept: an upload or render may not have committed its reference yet.
+# With dry_run, only reports what would be removed and the bytes it would reclaim.
+def collect_garbage(root: str = UPLOADS_DIR, min_age_seconds: float = 3600, dry_run: bool = False) -> Dict[str, Any]:
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            referenced = referenced_paths(cur)
+        conn.commit()
+    finally:
+        conn.close()
+
+    cutoff = time.time() - min_age_seconds
+    report = {"removed": 0, "reclaimed_bytes": 0, "kept": 0, "too_new": 0, "dry_run": dry_run}
+    for dirpath, _, filenames in os.walk(root, topdown=False):
+        for name in filenames:
+            path = os.path.normpath(os.path.join(dirpath, name))
+            if path in referenced:
+                report["kept"] += 1
+                continue
+            try:
+                stat = os.stat(path)
+                if stat.st_mtime > cutoff:
+                    report["too_new"] += 1
+                    continue
+                if not dry_run:
+                    os.remove(path)
+            except FileNotFoundError:
+                continue
+            report["removed"] += 1
+            report["reclaimed_bytes"] += stat.st_size
+        # Drop shard directories emptied by the pass
+        if not dry_run and os.path.normpath(dirpath).startswith(os.path.normpath(MEDIA_DIR) + os.sep):
+            try:
+                os.rmdir(dirpath)
+            except OSError:
+                pass
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove uploaded files that no profile references")
+    parser.add_argument("--root", default=UPLOADS_DIR, help="upload directory to scan")
+    parser.add_argument("--min-age-minutes", type=float, default=60, help="keep unreferenced files younger than this")
+    parser.add_argument("--dry-run", action="store_true", help="report reclaimable files and bytes without deleting")
+    args = parser.parse_args()
+    print(collect_garbage(args.root, args.min_age_minutes * 60, args.dry_run))
@@ -0,0 +1,241 @@
+"""
+Monthly partitions of the messages table.
+
+The app creates upcoming months on startup and once a day after that. Create
+them ahead of time or archive old months with:
+
+    python -m services.message_partition_service ensure --months-ahead 3
+    python -m services.message_partition_service archive --retention-months 24 --dry-run
+    python -m services.message_partition_service archive --retention-months 24 --to-dir /var/backups/messages
+"""
+import argparse
+import asyncio
+import gzip
+import logging
+import os
+import re
+import time
+from datetime import date
+from typing import Any, Dict, List, Optional
+import psycopg2
+from psycopg2 import sql
+from database.db import get_db_connection, run_db
+
+# Months of partitions kept ready past the current one
+MESSAGE_PARTITIONS_AHEAD = int(os.getenv('MESSAGE_PARTITIONS_AHEAD', '3'))
+
+# Seconds between checks for missing future partitions while the app runs
+MESSAGE_PARTITION_CHECK_SECONDS = float(os.getenv('MESSAGE_PARTITION_CHECK_SECONDS', '86400'))
+
+# Whole months of messages kept in the live table by the archive command
+MESSAGE_RETENTION_MONTHS = int(os.getenv('MESSAGE_RETENTION_MONTHS', '24'))
+
+# Milliseconds the archive command waits for the lock on messages before retrying a detach
+MESSAGE_ARCHIVE_LOCK_TIMEOUT_MS = int(os.getenv('MESSAGE_ARCHIVE_LOCK_TIMEOUT_MS', '2000'))
+
+# Detach attempts per partition before the archive command gives up
+MESSAGE_ARCHIVE_LOCK_ATTEMPTS = int(os.getenv('MESSAGE_ARCHIVE_LOCK_ATTEMPTS', '5'))
+
+# Archived partitions are moved into this schema unless written to files
+ARCHIVE_SCHEMA = "archive"
+
+PARTITION_NAME = re.compile(r"^messages_p(\d{4})_(\d{2})$")
+
+logger = logging.getLogger(__name__)
+
+
+# Create any missing partitions from this month through `months_ahead` months ahead; returns their names
+def ensure_partitions(months_ahead: int = MESSAGE_PARTITIONS_AHEAD) -> List[str]:
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT ensure_message_partitions(%s) AS name", (months_ahead,))
+            created = [row["name"] for row in cur.fetchall()]
+        conn.commit()
+        return created
+    finally:
+        conn.close()
+
+
+# Keep future partitions in place for as long as the app runs
+async def keep_partitions_ahead(interval: float = MESSAGE_PARTITION_CHECK_SECONDS):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_db(ensure_partitions)
+        except Exception:
+            # The next check retries; months ahead leave plenty of slack
+            logger.exception("Creating messages partitions failed")
+
+
+# First day of the month `months` months before the current one
+def _months_ago(months: int) -> date:
+    today = date.today()
+    total = today.year * 12 + today.month - 1 - months
+    return date(total // 12, total % 12 + 1, 1)
+
+
+# Monthly tables as (name, first day of month, attached, detach still pending), oldest first.
+# Tables left detached by an interrupted archive run are listed too, so the next run finishes them.
+def _list_partitions(cur):
+    cur.execute(
+        """
+        SELECT c.relname AS name, i.inhrelid IS NOT NULL AS attached, COALESCE(i.inhdetachpending, FALSE) AS detach_pending
+        FROM pg_class c
+        LEFT JOIN pg_inherits i ON i.inhrelid = c.oid AND i.inhparent = 'messages'::regclass
+        WHERE c.relkind = 'r' AND pg_table_is_visible(c.oid)
+        """
+    )
+    partitions = []
+    for row in cur.fetchall():
+        match = PARTITION_NAME.match(row["name"])
+        if match:
+            month = date(int(match.group(1)), int(match.group(2)), 1)
+            partitions.append((row["name"], month, row["attached"], row["detach_pending"]))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+# Take the archived rows' unread messages out of the conversation counters, locking rows in key order like every other writer
+def _subtract_unread(cur, table: sql.Identifier):
+    cur.execute(
+        sql.SQL(
+            """
+            WITH archived AS (
+                SELECT recipient_id AS owner_id, recipient_type AS owner_type,
+                       sender_id AS contact_id, sender_type AS contact_type, COUNT(*) AS n
+                FROM {table}
+                WHERE read = FALSE
+                  AND NOT (sender_id = recipient_id AND sender_type = recipient_type)
+                GROUP BY recipient_id, recipient_type, sender_id, sender_type
+            ),
+            locked AS (
+                SELECT cv.owner_id, cv.owner_type, cv.contact_id, cv.contact_type, a.n
+                FROM conversations cv
+                JOIN archived a USING (owner_id, owner_type, contact_id, contact_type)
+                ORDER BY cv.owner_id, cv.owner_type, cv.contact_id, cv.contact_type
+                FOR UPDATE OF cv
+            )
+            UPDATE conversations cv
+            SET unread_count = GREATEST(cv.unread_count - l.n, 0)
+            FROM locked l
+            WHERE cv.owner_id = l.owner_id AND cv.owner_type = l.owner_type
+              AND cv.contact_id = l.contact_id AND cv.contact_type = l.contact_type
+            """
+        ).format(table=table)
+    )
+    return cur.rowcount
+
+
+# Write a detached partition to a gzip-compressed CSV file, replacing the file only once it is complete
+def _export_partition(cur, table: sql.Identifier, path: str):
+    partial = path + ".partial"
+    with gzip.open(partial, "wb") as out:
+        cur.copy_expert(sql.SQL("COPY {table} TO STDOUT WITH (FORMAT csv, HEADER)").format(table=table).as_string(cur), out)
+    os.replace(partial, path)
+
+
+# Detach one partition in a transaction of its own. DETACH holds an ACCESS EXCLUSIVE lock on messages
+# until it commits, so every send and read waits for it; the lock timeout keeps it from queueing behind
+# a long-running query (and everything else from queueing behind it), and a busy table is retried.
+def _detach_partition(cur, table: sql.Identifier, finalize: bool = False):
+    statement = sql.SQL("ALTER TABLE messages DETACH PARTITION {table}" + (" FINALIZE" if finalize else "")).format(table=table)
+    for attempt in range(1, MESSAGE_ARCHIVE_LOCK_ATTEMPTS + 1):
+        cur.execute("BEGIN")
+        try:
+            cur.execute("SET LOCAL lock_timeout = %s", (f"{MESSAGE_ARCHIVE_LOCK_TIMEOUT_MS}ms",))
+            cur.execute(statement)
+            cur.execute("COMMIT")
+            return
+        except psycopg2.errors.LockNotAvailable:
+            cur.execute("ROLLBACK")
+            if attempt == MESSAGE_ARCHIVE_LOCK_ATTEMPTS:
+                raise
+            logger.warning("Detaching %s timed out waiting for its lock, retrying", table.string)
+            time.sleep(attempt)
+
+
+# Detach every partition holding only messages older than the retention window and archive it.
+# Each detach briefly locks messages exclusively (see _detach_partition); DETACH ... CONCURRENTLY
+# is not an option while messages has a DEFAULT partition. Each partition then goes either to a
+# gzip CSV file in `to_dir` (and is dropped) or into the archive schema without its secondary
+# indexes. Unread counters stop counting the archived messages.
+def archive_partitions(retention_months: int = MESSAGE_RETENTION_MONTHS, to_dir: Optional[str] = None, dry_run: bool = False) -> List[Dict[str, Any]]:
+    if retention_months < 1:
+        raise ValueError("retention_months must be at least 1")
+    cutoff = _months_ago(retention_months)
+    conn = get_db_connection()
+    # Transactions are delimited explicitly, one for each detach and one for each archive step
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            archived = []
+            for name, month, attached, detach_pending in _list_partitions(cur):
+                if month >= cutoff:
+                    break
+                table = sql.Identifier(name)
+                cur.execute(sql.SQL("SELECT COUNT(*) AS n FROM {table}").format(table=table))
+                result = {"partition": name, "month": month.isoformat(), "rows": cur.fetchone()["n"]}
+                if to_dir:
+                    result["destination"] = os.path.join(to_dir, f"{name}.csv.gz")
+                else:
+                    result["destination"] = f"{ARCHIVE_SCHEMA}.{name}"
+                if dry_run:
+                    archived.append(result)
+                    continue
+
+                # A concurrent detach interrupted before the default partition existed is left pending; finish it
+                if detach_pending:
+                    _detach_partition(cur, table, finalize=True)
+                elif attached:
+                    _detach_partition(cur, table)
+
+                # Nothing writes to the detached table any more, so counters and archive see the same rows
+                cur.execute("BEGIN")
+                result["conversations_updated"] = _subtract_unread(cur, table)
+                if to_dir:
+                    _export_partition(cur, table, result["destination"])
+                    cur.execute(sql.SQL("DROP TABLE {table}").format(table=table))
+                else:
+                    cur.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {schema}").format(schema=sql.Identifier(ARCHIVE_SCHEMA)))
+                    # Archived months are rarely read; keep only the primary key
+                    cur.execute(
+                        """
+                        SELECT i.relname AS name
+                        FROM pg_index x
+                        JOIN pg_class i ON i.oid = x.indexrelid
+                        WHERE x.indrelid = %s::regclass AND NOT x.indisprimary
+                        """,
+                        (name,)
+                    )
+                    for index in cur.fetchall():
+                        cur.execute(sql.SQL("DROP INDEX {index}").format(index=sql.Identifier(index["name"])))
+                    cur.execute(
+                        sql.SQL("ALTER TABLE {table} SET SCHEMA {schema}").format(table=table, schema=sql.Identifier(ARCHIVE_SCHEMA))
+                    )
+                cur.execute("COMMIT")
+                archived.append(result)
+            return archived
+    finally:
+        # Closing mid-transaction rolls it back
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create and archive monthly messages partitions")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ensure = commands.add_parser("ensure", help="create missing partitions for upcoming months")
+    ensure.add_argument("--months-ahead", type=int, default=MESSAGE_PARTITIONS_AHEAD, help="months past the current one to create")
+    archive = commands.add_parser("archive", help="detach and archive partitions older than the retention window")
+    archive.add_argument("--retention-months", type=int, default=MESSAGE_RETENTION_MONTHS, help="whole months of messages kept live")
+    archive.add_argument("--to-dir", help="write gzip CSV files here and drop the partitions, instead of keeping archive tables")
+    archive.add_argument("--dry-run", action="store_true", help="list partitions that would be archived without changing them")
+    args = parser.parse_args()
+
+    if args.command == "ensure":
+        for name in ensure_partitions(args.months_ahead):
+            print(f"created {name}")
+    else:
+        if args.to_dir:
+            os.makedirs(args.to_dir, exist_ok=True)
+        for row in archive_partitions(args.retention_months, args.to_dir, args.dry_run):
+            print(f"{row['partition']} ({row['rows']} rows) -> {row['destination']}")
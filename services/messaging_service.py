@@ -1,361 +1,683 @@
 from fastapi import HTTPException
-from database.db import get_db_connection
-from models.schemas import MessageCreate, MessageResponse
+from database.db import db_connection, db_task, get_db_connection
+from models.schemas import MessageCreate, MessageResponse, BroadcastCreate
+from services.pagination import DEFAULT_PAGE_SIZE, encode_cursor, decode_cursor, split_page
+from services.events_service import inbox_events
+from services.media_service import picture_url
+import argparse
 import datetime
-from typing import List
+from typing import Any, Dict, List, Optional
+
+# Characters of the latest message kept on each conversation row for the inbox preview
+SNIPPET_LENGTH = 200
+
+
+_CONVERSATION_COLUMNS = """owner_id, owner_type, contact_id, contact_type, last_message_id,
+    last_message_snippet, last_message_at, last_sent_by_owner, last_message_read, unread_count"""
+
+# Fold a new message into existing conversation rows: add unread, keep whichever message is newer
+_CONVERSATION_UPSERT = """
+ON CONFLICT (owner_id, owner_type, contact_id, contact_type) DO UPDATE SET
+    unread_count = conversations.unread_count + EXCLUDED.unread_count,
+    last_message_id = CASE WHEN (EXCLUDED.last_message_at, EXCLUDED.last_message_id) > (conversations.last_message_at, conversations.last_message_id)
+                           THEN EXCLUDED.last_message_id ELSE conversations.last_message_id END,
+    last_message_snippet = CASE WHEN (EXCLUDED.last_message_at, EXCLUDED.last_message_id) > (conversations.last_message_at, conversations.last_message_id)
+                                THEN EXCLUDED.last_message_snippet ELSE conversations.last_message_snippet END,
+    last_sent_by_owner = CASE WHEN (EXCLUDED.last_message_at, EXCLUDED.last_message_id) > (conversations.last_message_at, conversations.last_message_id)
+                              THEN EXCLUDED.last_sent_by_owner ELSE conversations.last_sent_by_owner END,
+    last_message_read = CASE WHEN (EXCLUDED.last_message_at, EXCLUDED.last_message_id) > (conversations.last_message_at, conversations.last_message_id)
+                             THEN EXCLUDED.last_message_read ELSE conversations.last_message_read END,
+    last_message_at = GREATEST(EXCLUDED.last_message_at, conversations.last_message_at)
+RETURNING *
+"""
+
+# Every writer locks conversation rows in primary key order, so concurrent sends, reads and broadcasts cannot deadlock
+_CONVERSATION_ORDER = "owner_id, owner_type, contact_id, contact_type"
+
+
+# Point both participants' conversation rows at a new message inside the caller's transaction, returning both rows
+def record_conversation_message(cur, message_id: int, content: str, created_at, sender_id: int, sender_type: str, recipient_id: int, recipient_type: str):
+    cur.execute(
+        f"""
+        INSERT INTO conversations ({_CONVERSATION_COLUMNS})
+        SELECT * FROM (VALUES
+            (%(sender_id)s, %(sender_type)s, %(recipient_id)s, %(recipient_type)s, %(id)s, %(snippet)s, %(created_at)s::timestamp, TRUE, FALSE, 0),
+            (%(recipient_id)s, %(recipient_type)s, %(sender_id)s, %(sender_type)s, %(id)s, %(snippet)s, %(created_at)s::timestamp, FALSE, FALSE, 1)
+        ) AS sides ({_CONVERSATION_COLUMNS})
+        ORDER BY {_CONVERSATION_ORDER}
+        {_CONVERSATION_UPSERT}
+        """,
+        {
+            "id": message_id,
+            "snippet": content[:SNIPPET_LENGTH],
+            "created_at": created_at,
+            "sender_id": sender_id,
+            "sender_type": sender_type,
+            "recipient_id": recipient_id,
+            "recipient_type": recipient_type
+        }
+    )
+    return cur.fetchall()
+
+
+# Apply messages the user just read from a contact to both sides' conversation rows, returning the rows
+def record_conversation_read(cur, user_id: int, user_type: str, other_id: int, other_type: str, message_ids: List[int]):
+    if not message_ids:
+        return []
+    cur.execute(
+        f"""
+        WITH locked AS (
+            SELECT {_CONVERSATION_ORDER}
+            FROM conversations
+            WHERE (owner_id = %(user_id)s AND owner_type = %(user_type)s AND contact_id = %(other_id)s AND contact_type = %(other_type)s)
+               OR (owner_id = %(other_id)s AND owner_type = %(other_type)s AND contact_id = %(user_id)s AND contact_type = %(user_type)s)
+            ORDER BY {_CONVERSATION_ORDER}
+            FOR UPDATE
+        )
+        UPDATE conversations cv
+        SET unread_count = CASE WHEN cv.owner_id = %(user_id)s AND cv.owner_type = %(user_type)s
+                                THEN GREATEST(cv.unread_count - %(count)s, 0) ELSE cv.unread_count END,
+            last_message_read = cv.last_message_read OR cv.last_message_id = ANY(%(ids)s)
+        FROM locked
+        WHERE (cv.owner_id, cv.owner_type, cv.contact_id, cv.contact_type) = (locked.owner_id, locked.owner_type, locked.contact_id, locked.contact_type)
+        RETURNING cv.*
+        """,
+        {
+            "user_id": user_id,
+            "user_type": user_type,
+            "other_id": other_id,
+            "other_type": other_type,
+            "ids": list(message_ids),
+            "count": len(message_ids)
+        }
+    )
+    return cur.fetchall()
+
+
+# Thread list entry for a conversations row; contact details are included when the row has them
+def thread_item(row):
+    item = {
+        "contact_id": row["contact_id"],
+        "contact_type": row["contact_type"],
+        "latest_message": {
+            "id": row["last_message_id"],
+            "content": row["last_message_snippet"],
+            "sent_by_me": row["last_sent_by_owner"],
+            "created_at": row["last_message_at"],
+            "read": row["last_message_read"]
+        },
+        "unread_count": row["unread_count"]
+    }
+    if "contact_name" in row:
+        item["contact_name"] = row["contact_name"]
+        item["contact_profile_picture"] = row["contact_profile_picture"]
+    return item
+
+
+# Message list entry for a messages row joined with its sender's name and picture
+def message_item(row) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "content": row["content"],
+        "sender_id": row["sender_id"],
+        "sender_type": row["sender_type"],
+        "sender_name": row["sender_name"],
+        "sender_profile_picture": picture_url(row["sender_profile_picture"], row["sender_type"]),
+        "recipient_id": row["recipient_id"],
+        "recipient_type": row["recipient_type"],
+        "created_at": row["created_at"],
+        "read": bool(row["read"])
+    }
+
+
+# Push read receipts to both participants after read-marking commits
+def publish_read(conversation_rows, reader_id: int, reader_type: str, message_ids: List[int]):
+    for row in conversation_rows:
+        inbox_events.publish(row["owner_type"], row["owner_id"], "thread", thread_item(row))
+        if (row["owner_id"], row["owner_type"]) != (reader_id, reader_type):
+            inbox_events.publish(row["owner_type"], row["owner_id"], "read", {
+                "contact_id": reader_id,
+                "contact_type": reader_type,
+                "message_ids": message_ids
+            })
 
 # Send a new message between users
-async def send_message(message: MessageCreate, sender_id: int, sender_type: str):
-    conn = None
-    cur = None
-    
+@db_task
+def send_message(message: MessageCreate, sender_id: int, sender_type: str):
+    if message.recipient_id == sender_id and message.recipient_type == sender_type:
+        raise HTTPException(status_code=400, detail="Cannot send a message to yourself")
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # Verify recipient exists
-        if message.recipient_type == 'student':
-            cur.execute("SELECT id, name, profile_picture FROM students WHERE id = %s", (message.recipient_id,))
-        else:
-            cur.execute("SELECT id, name, profile_picture FROM clubs WHERE id = %s", (message.recipient_id,))
-        
-        recipient = cur.fetchone()
-        if not recipient:
-            raise HTTPException(status_code=404, detail=f"{message.recipient_type.capitalize()} not found")
-        
-        # Get sender information
-        if sender_type == 'student':
-            cur.execute("SELECT name, profile_picture FROM students WHERE id = %s", (sender_id,))
-        else:
-            cur.execute("SELECT name, profile_picture FROM clubs WHERE id = %s", (sender_id,))
-        
-        sender = cur.fetchone()
-        if not sender:
-            raise HTTPException(status_code=404, detail=f"{sender_type.capitalize()} not found")
-        
-        # Insert new message into database
-        cur.execute(
-            """
-            INSERT INTO messages (content, sender_id, sender_type, recipient_id, recipient_type, created_at)
-            VALUES (%s, %s, %s, %s, %s, NOW())
-            RETURNING id, created_at, read
-            """,
-            (message.content, sender_id, sender_type, message.recipient_id, message.recipient_type)
-        )
+        with db_connection() as conn, conn.cursor() as cur:
+            # Verify recipient exists
+            if message.recipient_type == 'student':
+                cur.execute("SELECT id, name, profile_picture FROM students WHERE id = %s", (message.recipient_id,))
+            else:
+                cur.execute("SELECT id, name, profile_picture FROM clubs WHERE id = %s", (message.recipient_id,))
         
-        new_message = cur.fetchone()
-        conn.commit()
+            recipient = cur.fetchone()
+            if not recipient:
+                raise HTTPException(status_code=404, detail=f"{message.recipient_type.capitalize()} not found")
         
-        # Return formatted message response
-        return MessageResponse(
-            id=new_message["id"],
-            content=message.content,
-            sender_id=sender_id,
-            sender_type=sender_type,
-            sender_name=sender["name"],
-            sender_profile_picture=sender["profile_picture"],
-            recipient_id=message.recipient_id,
-            recipient_type=message.recipient_type,
-            created_at=new_message["created_at"],
-            read=new_message["read"]
-        )
+            # Get sender information
+            if sender_type == 'student':
+                cur.execute("SELECT name, profile_picture FROM students WHERE id = %s", (sender_id,))
+            else:
+                cur.execute("SELECT name, profile_picture FROM clubs WHERE id = %s", (sender_id,))
+        
+            sender = cur.fetchone()
+            if not sender:
+                raise HTTPException(status_code=404, detail=f"{sender_type.capitalize()} not found")
+        
+            # Insert new message into database
+            cur.execute(
+                """
+                INSERT INTO messages (content, sender_id, sender_type, recipient_id, recipient_type, created_at)
+                VALUES (%s, %s, %s, %s, %s, NOW())
+                RETURNING id, created_at, read
+                """,
+                (message.content, sender_id, sender_type, message.recipient_id, message.recipient_type)
+            )
+        
+            new_message = cur.fetchone()
+            conversation_rows = record_conversation_message(
+                cur, new_message["id"], message.content, new_message["created_at"],
+                sender_id, sender_type, message.recipient_id, message.recipient_type
+            )
+            conn.commit()
+        
+            # Push the message and both updated threads to any open dashboards
+            for row in conversation_rows:
+                contact = sender if row["contact_id"] == sender_id and row["contact_type"] == sender_type else recipient
+                inbox_events.publish(row["owner_type"], row["owner_id"], "thread", thread_item(dict(
+                    row, contact_name=contact["name"], contact_profile_picture=contact["profile_picture"]
+                )))
+                inbox_events.publish(row["owner_type"], row["owner_id"], "message", {
+                    "contact_id": row["contact_id"],
+                    "contact_type": row["contact_type"],
+                    "message": {
+                        "id": new_message["id"],
+                        "content": message.content,
+                        "sent_by_me": row["owner_id"] == sender_id and row["owner_type"] == sender_type,
+                        "sender_name": sender["name"],
+                        "created_at": new_message["created_at"],
+                        "read": new_message["read"]
+                    }
+                })
+        
+            # Return formatted message response
+            return MessageResponse(
+                id=new_message["id"],
+                content=message.content,
+                sender_id=sender_id,
+                sender_type=sender_type,
+                sender_name=sender["name"],
+                sender_profile_picture=sender["profile_picture"],
+                recipient_id=message.recipient_id,
+                recipient_type=message.recipient_type,
+                created_at=new_message["created_at"],
+                read=new_message["read"]
+            )
         
     except HTTPException as e:
-        if conn:
-            conn.rollback()
         raise e
     except Exception as e:
-        if conn:
-            conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
 
-# Retrieve messages for a user, optionally filtered by read status
-async def get_messages(user_id: int, user_type: str, unread_only: bool = False) -> List[MessageResponse]:
-    conn = None
-    cur = None
-    
+# Send one message from a club to every student who saved it (or a subset) in a single transaction
+@db_task
+def broadcast_message(club_id: int, broadcast: BroadcastCreate):
+    if not broadcast.content.strip():
+        raise HTTPException(status_code=400, detail="Message content is required")
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # Base query to get all messages for the user
-        query = """
-        SELECT m.id, m.content, m.sender_id, m.sender_type, m.recipient_id, m.recipient_type, 
-               m.created_at, m.read
-        FROM messages m
-        WHERE (m.recipient_id = %s AND m.recipient_type = %s)
-           OR (m.sender_id = %s AND m.sender_type = %s)
-        """
-        
-        params = [user_id, user_type, user_id, user_type]
-        
-        # Add unread filter if requested
-        if unread_only:
-            query += " AND m.read = FALSE AND m.recipient_id = %s AND m.recipient_type = %s"
-            params.extend([user_id, user_type])
-        
-       
-        query += " ORDER BY m.created_at DESC"
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT id, name, profile_picture FROM clubs WHERE id = %s", (club_id,))
+            club = cur.fetchone()
+            if not club:
+                raise HTTPException(status_code=404, detail="Club not found")
+        
+            # Insert every message and fold them into both sides' conversation rows in one statement
+            cur.execute(
+                f"""
+                WITH inserted AS (
+                    INSERT INTO messages (content, sender_id, sender_type, recipient_id, recipient_type, created_at)
+                    SELECT %(content)s, %(club_id)s, 'club', sc.student_id, 'student', NOW()
+                    FROM saved_clubs sc
+                    WHERE sc.club_id = %(club_id)s
+                      AND (%(student_ids)s::int[] IS NULL OR sc.student_id = ANY(%(student_ids)s::int[]))
+                    RETURNING id, recipient_id, created_at
+                ),
+                upserted AS (
+                    INSERT INTO conversations ({_CONVERSATION_COLUMNS})
+                    SELECT owner_id, owner_type, contact_id, contact_type, id, %(snippet)s, created_at, sent_by_owner, FALSE, unread
+                    FROM (
+                        SELECT %(club_id)s AS owner_id, 'club' AS owner_type, recipient_id AS contact_id, 'student' AS contact_type,
+                               id, created_at, TRUE AS sent_by_owner, 0 AS unread
+                        FROM inserted
+                        UNION ALL
+                        SELECT recipient_id, 'student', %(club_id)s, 'club', id, created_at, FALSE, 1
+                        FROM inserted
+                    ) sides
+                    ORDER BY {_CONVERSATION_ORDER}
+                    {_CONVERSATION_UPSERT}
+                )
+                -- Both sides come back for the event streams; the club's rows name the student
+                SELECT u.*, st.name AS contact_name, st.profile_picture AS contact_profile_picture
+                FROM upserted u
+                LEFT JOIN students st ON u.owner_type = 'club' AND st.id = u.contact_id
+                """,
+                {
+                    "club_id": club_id,
+                    "content": broadcast.content,
+                    "snippet": broadcast.content[:SNIPPET_LENGTH],
+                    "student_ids": broadcast.student_ids
+                }
+            )
+            rows = cur.fetchall()
+            conn.commit()
+            student_rows = [row for row in rows if row["owner_type"] == "student"]
+            club_rows = [row for row in rows if row["owner_type"] == "club"]
+        
+            # Each recipient gets its own thread and message events
+            for row in student_rows:
+                if not inbox_events.is_subscribed("student", row["owner_id"]):
+                    continue
+                inbox_events.publish("student", row["owner_id"], "thread", thread_item(dict(
+                    row, contact_name=club["name"], contact_profile_picture=club["profile_picture"]
+                )))
+                inbox_events.publish("student", row["owner_id"], "message", {
+                    "contact_id": club_id,
+                    "contact_type": "club",
+                    "message": {
+                        "id": row["last_message_id"],
+                        "content": broadcast.content,
+                        "sent_by_me": False,
+                        "sender_name": club["name"],
+                        "created_at": row["last_message_at"],
+                        "read": False
+                    }
+                })
+        
+            # The club's dashboards get the same per-thread events while they fit in a stream's queue
+            # (two per recipient); past that the queue would overflow into a resync anyway, so send one
+            # directly and let the dashboards reload their first page of threads
+            if inbox_events.is_subscribed("club", club_id):
+                if 2 * len(club_rows) <= inbox_events.queue_size:
+                    for row in club_rows:
+                        inbox_events.publish("club", club_id, "thread", thread_item(row))
+                        inbox_events.publish("club", club_id, "message", {
+                            "contact_id": row["contact_id"],
+                            "contact_type": "student",
+                            "message": {
+                                "id": row["last_message_id"],
+                                "content": broadcast.content,
+                                "sent_by_me": True,
+                                "sender_name": club["name"],
+                                "created_at": row["last_message_at"],
+                                "read": False
+                            }
+                        })
+                else:
+                    inbox_events.publish("club", club_id, "resync", {})
+        
+            return {"message": "Broadcast sent", "recipients": len(student_rows)}
         
-        cur.execute(query, params)
-        messages_data = cur.fetchall()
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Retrieve messages for a user, optionally filtered by read status
+@db_task
+def get_messages(user_id: int, user_type: str, unread_only: bool = False, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+    after = decode_cursor(cursor, (datetime.datetime, int))
+    try:
+        with db_connection() as conn, conn.cursor() as cur:
+            params = {
+                "user_id": user_id,
+                "user_type": user_type,
+                "after_created_at": after[0] if after else None,
+                "after_id": after[1] if after else None,
+                "limit": limit + 1
+            }
+            # The plain created_at bound is implied by the row comparison but lets the planner skip newer partitions
+            keyset = """(%(after_created_at)s::timestamp IS NULL
+                   OR (m.created_at <= %(after_created_at)s::timestamp AND (m.created_at, m.id) < (%(after_created_at)s::timestamp, %(after_id)s)))"""
+            columns = """m.id, m.content, m.sender_id, m.sender_type, m.recipient_id, m.recipient_type,
+                   m.created_at, m.read"""
+        
+            # Received messages, optionally only the unread ones
+            received = f"""
+                SELECT {columns}
+                FROM messages m
+                WHERE m.recipient_id = %(user_id)s AND m.recipient_type = %(user_type)s
+                  {"AND m.read = FALSE" if unread_only else ""}
+                  AND {keyset}
+                ORDER BY m.created_at DESC, m.id DESC
+                LIMIT %(limit)s
+            """
         
-        # Format messages with sender information
-        messages = []
-        for msg in messages_data:
-            
-            if msg["sender_type"] == "student":
-                cur.execute("SELECT name, profile_picture FROM students WHERE id = %s", (msg["sender_id"],))
+            # Each branch is an ordered range scan on its own index; merge them and keep one page
+            if unread_only:
+                query = received
             else:
-                cur.execute("SELECT name, profile_picture FROM clubs WHERE id = %s", (msg["sender_id"],))
-            
-            sender = cur.fetchone()
-            
-            messages.append(MessageResponse(
-                id=msg["id"],
-                content=msg["content"],
-                sender_id=msg["sender_id"],
-                sender_type=msg["sender_type"],
-                sender_name=sender["name"] if sender else "Unknown",
-                sender_profile_picture=sender["profile_picture"] if sender else None,
-                recipient_id=msg["recipient_id"],
-                recipient_type=msg["recipient_type"],
-                created_at=msg["created_at"],
-                read=msg["read"]
-            ))
-        
-        return messages
+                query = f"""
+                SELECT * FROM (
+                    ({received})
+                    UNION
+                    (SELECT {columns}
+                     FROM messages m
+                     WHERE m.sender_id = %(user_id)s AND m.sender_type = %(user_type)s
+                       AND {keyset}
+                     ORDER BY m.created_at DESC, m.id DESC
+                     LIMIT %(limit)s)
+                ) m
+                ORDER BY m.created_at DESC, m.id DESC
+                LIMIT %(limit)s
+                """
+        
+            # Attach sender details to the page in the same statement
+            cur.execute(f"""
+                SELECT page.*,
+                       COALESCE(s.name, c.name, 'Unknown') AS sender_name,
+                       COALESCE(s.profile_picture, c.profile_picture) AS sender_profile_picture
+                FROM ({query}) page
+                LEFT JOIN students s ON page.sender_type = 'student' AND s.id = page.sender_id
+                LEFT JOIN clubs c ON page.sender_type = 'club' AND c.id = page.sender_id
+                ORDER BY page.created_at DESC, page.id DESC
+            """, params)
+            messages_data, has_more = split_page(cur.fetchall(), limit)
+            next_cursor = encode_cursor(messages_data[-1]["created_at"], messages_data[-1]["id"]) if has_more else None
+        
+            return {"items": [message_item(msg) for msg in messages_data], "next_cursor": next_cursor}
         
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
 
 # Mark a message as read for a specific user
-async def mark_message_as_read(message_id: int, user_id: int, user_type: str):
-    conn = None
-    cur = None
-    
+@db_task
+def mark_message_as_read(message_id: int, user_id: int, user_type: str):
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
+        with db_connection() as conn, conn.cursor() as cur:
        
-        cur.execute(
-            """
-            UPDATE messages
-            SET read = TRUE
-            WHERE id = %s AND recipient_id = %s AND recipient_type = %s
-            RETURNING id
-            """,
-            (message_id, user_id, user_type)
-        )
-        
-        result = cur.fetchone()
-        conn.commit()
+            # Lock the message and remember whether it was already read
+            cur.execute(
+                """
+                SELECT id, sender_id, sender_type, read
+                FROM messages
+                WHERE id = %s AND recipient_id = %s AND recipient_type = %s
+                FOR UPDATE
+                """,
+                (message_id, user_id, user_type)
+            )
+        
+            result = cur.fetchone()
+            if result and not result["read"]:
+                cur.execute("UPDATE messages SET read = TRUE WHERE id = %s", (message_id,))
+                conversation_rows = record_conversation_read(cur, user_id, user_type, result["sender_id"], result["sender_type"], [message_id])
+                conn.commit()
+                publish_read(conversation_rows, user_id, user_type, [message_id])
+            else:
+                conn.commit()
         
-        if not result:
-            raise HTTPException(status_code=404, detail="Message not found or you're not authorized to mark it as read")
+            if not result:
+                raise HTTPException(status_code=404, detail="Message not found or you're not authorized to mark it as read")
         
-        return {"message": "Message marked as read"}
+            return {"message": "Message marked as read"}
         
     except HTTPException as e:
-        if conn:
-            conn.rollback()
         raise e
     except Exception as e:
-        if conn:
-            conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
 
-# Get all message threads for a user
-async def get_message_threads(user_id: int, user_type: str):
-    conn = None
-    cur = None
-    
+# Total and per-thread unread counts for a user, read from the maintained conversation counters
+@db_task
+def get_unread_counts(user_id: int, user_type: str):
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # Query to get all unique contacts from messages
-        query = """
-        WITH message_users AS (
-            -- Get all other users from received messages
-            SELECT DISTINCT sender_id as other_id, sender_type as other_type
-            FROM messages
-            WHERE recipient_id = %s AND recipient_type = %s
-            
-            UNION
-            
-            -- Get all other users from sent messages
-            SELECT DISTINCT recipient_id as other_id, recipient_type as other_type
-            FROM messages
-            WHERE sender_id = %s AND sender_type = %s
-        )
-        SELECT m.other_id, m.other_type, 
-               CASE 
-                   WHEN m.other_type = 'student' THEN s.name
-                   WHEN m.other_type = 'club' THEN c.name
-               END as other_name,
-               CASE 
-                   WHEN m.other_type = 'student' THEN s.profile_picture
-                   WHEN m.other_type = 'club' THEN c.profile_picture
-               END as other_profile_picture
-        FROM message_users m
-        LEFT JOIN students s ON m.other_id = s.id AND m.other_type = 'student'
-        LEFT JOIN clubs c ON m.other_id = c.id AND m.other_type = 'club'
-        """
-        
-        cur.execute(query, (user_id, user_type, user_id, user_type))
-        contacts = cur.fetchall()
-        
-        threads = []
-        # Get latest message and unread count for each contact
-        for contact in contacts:
-            cur.execute("""
-            SELECT m.id, m.content, m.sender_id, m.sender_type, m.recipient_id, m.recipient_type, 
-                   m.created_at, m.read
-            FROM messages m
-            WHERE (m.sender_id = %s AND m.sender_type = %s AND m.recipient_id = %s AND m.recipient_type = %s)
-               OR (m.sender_id = %s AND m.sender_type = %s AND m.recipient_id = %s AND m.recipient_type = %s)
-            ORDER BY m.created_at DESC
-            LIMIT 1
-            """, (user_id, user_type, contact["other_id"], contact["other_type"], 
-                contact["other_id"], contact["other_type"], user_id, user_type))
-            
-            latest_message = cur.fetchone()
-            
-            # Get unread message count
-            cur.execute("""
-            SELECT COUNT(*) as unread_count
-            FROM messages
-            WHERE sender_id = %s AND sender_type = %s AND recipient_id = %s AND recipient_type = %s AND read = FALSE
-            """, (contact["other_id"], contact["other_type"], user_id, user_type))
-            
-            unread_count = cur.fetchone()["unread_count"]
-            
-            # Format thread information
-            threads.append({
-                "contact_id": contact["other_id"],
-                "contact_type": contact["other_type"],
-                "contact_name": contact["other_name"],
-                "contact_profile_picture": contact["other_profile_picture"],
-                "latest_message": {
-                    "id": latest_message["id"],
-                    "content": latest_message["content"],
-                    "sent_by_me": latest_message["sender_id"] == user_id and latest_message["sender_type"] == user_type,
-                    "created_at": latest_message["created_at"],
-                    "read": latest_message["read"]
-                },
-                "unread_count": unread_count
-            })
+        with db_connection() as conn, conn.cursor() as cur:
+            # Only threads with unread messages are in the partial index
+            cur.execute(
+                """
+                SELECT contact_id, contact_type, unread_count
+                FROM conversations
+                WHERE owner_id = %s AND owner_type = %s AND unread_count > 0
+                """,
+                (user_id, user_type)
+            )
+            threads = [dict(row) for row in cur.fetchall()]
+        
+            return {"total": sum(thread["unread_count"] for thread in threads), "threads": threads}
         
-      
-        threads.sort(key=lambda x: x["latest_message"]["created_at"], reverse=True)
-        
-        return threads
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Get message threads for a user, most recent first, from the conversations summary table
+@db_task
+def get_message_threads(user_id: int, user_type: str, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
+    after = decode_cursor(cursor, (datetime.datetime, int))
+    try:
+        with db_connection() as conn, conn.cursor() as cur:
+            # One range scan on (owner, last_message_at DESC, last_message_id DESC)
+            cur.execute(
+                """
+                SELECT cv.contact_id, cv.contact_type,
+                       COALESCE(s.name, c.name) AS contact_name,
+                       COALESCE(s.profile_picture, c.profile_picture) AS contact_profile_picture,
+                       cv.last_message_id, cv.last_message_snippet, cv.last_message_at,
+                       cv.last_sent_by_owner, cv.last_message_read, cv.unread_count
+                FROM conversations cv
+                LEFT JOIN students s ON cv.contact_type = 'student' AND s.id = cv.contact_id
+                LEFT JOIN clubs c ON cv.contact_type = 'club' AND c.id = cv.contact_id
+                WHERE cv.owner_id = %(user_id)s AND cv.owner_type = %(user_type)s
+                  AND (%(after_at)s::timestamp IS NULL OR (cv.last_message_at, cv.last_message_id) < (%(after_at)s::timestamp, %(after_id)s))
+                ORDER BY cv.last_message_at DESC, cv.last_message_id DESC
+                LIMIT %(limit)s
+                """,
+                {
+                    "user_id": user_id,
+                    "user_type": user_type,
+                    "after_at": after[0] if after else None,
+                    "after_id": after[1] if after else None,
+                    "limit": limit + 1
+                }
+            )
+            rows, has_more = split_page(cur.fetchall(), limit)
+            next_cursor = encode_cursor(rows[-1]["last_message_at"], rows[-1]["last_message_id"]) if has_more else None
+        
+            threads = [thread_item(row) for row in rows]
+        
+            return {"items": threads, "next_cursor": next_cursor}
         
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
 
-async def get_conversation(user_id: int, user_type: str, other_id: int, other_type: str):
-    conn = None
-    cur = None
-    
+# Get one page of the conversation between two users, marking the other user's messages as read
+@db_task
+def get_conversation(user_id: int, user_type: str, other_id: int, other_type: str, before: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
+    after = decode_cursor(before, (datetime.datetime, int))
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
+        with db_connection() as conn, conn.cursor() as cur:
+            params = {
+                "user_id": user_id,
+                "user_type": user_type,
+                "other_id": other_id,
+                "other_type": other_type,
+                "before_created_at": after[0] if after else None,
+                "before_id": after[1] if after else None,
+                "limit": limit + 1
+            }
+
+            # Both participants' profiles and the user's unread count in one query
+            cur.execute(
+                """
+                SELECT p.role,
+                       COALESCE(s.name, c.name) AS name,
+                       COALESCE(s.profile_picture, c.profile_picture) AS profile_picture,
+                       COALESCE(cv.unread_count, 0) AS unread_count
+                FROM (VALUES ('me', %(user_id)s, %(user_type)s), ('other', %(other_id)s, %(other_type)s)) AS p(role, id, type)
+                LEFT JOIN students s ON p.type = 'student' AND s.id = p.id
+                LEFT JOIN clubs c ON p.type = 'club' AND c.id = p.id
+                LEFT JOIN conversations cv ON p.role = 'me'
+                     AND cv.owner_id = %(user_id)s AND cv.owner_type = %(user_type)s
+                     AND cv.contact_id = %(other_id)s AND cv.contact_type = %(other_type)s
+                """,
+                params
+            )
+            participants = {row["role"]: row for row in cur.fetchall()}
+            current_user, other_user = participants["me"], participants["other"]
+
+            # Newest page first from the (conversation_key, created_at DESC, id DESC) index, reading partitions newest first;
+            # `before` continues with older messages and prunes the partitions after it
+            query = """
+            SELECT m.id, m.content, m.sender_id, m.sender_type, m.recipient_id, m.recipient_type, 
+                   m.created_at, m.read
+            FROM messages m
+            WHERE m.conversation_key = make_conversation_key(%(user_id)s, %(user_type)s, %(other_id)s, %(other_type)s)
+              AND (%(before_created_at)s::timestamp IS NULL
+                   OR (m.created_at <= %(before_created_at)s::timestamp AND (m.created_at, m.id) < (%(before_created_at)s::timestamp, %(before_id)s)))
+            ORDER BY m.created_at DESC, m.id DESC
+            LIMIT %(limit)s
+            """
         
-       
-        query = """
-        SELECT m.id, m.content, m.sender_id, m.sender_type, m.recipient_id, m.recipient_type, 
-               m.created_at, m.read
-        FROM messages m
-        WHERE (m.sender_id = %s AND m.sender_type = %s AND m.recipient_id = %s AND m.recipient_type = %s)
-           OR (m.sender_id = %s AND m.sender_type = %s AND m.recipient_id = %s AND m.recipient_type = %s)
-        ORDER BY m.created_at ASC
-        """
-        
-        cur.execute(query, (user_id, user_type, other_id, other_type, 
-                          other_id, other_type, user_id, user_type))
-        messages_data = cur.fetchall()
+            cur.execute(query, params)
+            messages_data, has_more = split_page(cur.fetchall(), limit)
+            next_cursor = encode_cursor(messages_data[-1]["created_at"], messages_data[-1]["id"]) if has_more else None
+            # Oldest first within the page, as the conversation view expects
+            messages_data.reverse()
         
-       
-        for msg in messages_data:
-            if not msg["read"] and msg["recipient_id"] == user_id and msg["recipient_type"] == user_type:
+            # Mark every unread message from the other user at once, skipping the write when nothing is unread
+            if current_user["unread_count"]:
                 cur.execute(
                     """
                     UPDATE messages
                     SET read = TRUE
-                    WHERE id = %s
+                    WHERE conversation_key = make_conversation_key(%(user_id)s, %(user_type)s, %(other_id)s, %(other_type)s)
+                      AND sender_id = %(other_id)s AND sender_type = %(other_type)s
+                      AND recipient_id = %(user_id)s AND recipient_type = %(user_type)s
+                      AND read = FALSE
+                    RETURNING id
                     """,
-                    (msg["id"],)
+                    params
                 )
+                marked = [row["id"] for row in cur.fetchall()]
+                conversation_rows = record_conversation_read(cur, user_id, user_type, other_id, other_type, marked)
+                conn.commit()
+                publish_read(conversation_rows, user_id, user_type, marked)
+        
+            messages = []
+            for msg in messages_data:
+                sent_by_me = msg["sender_id"] == user_id and msg["sender_type"] == user_type
+                messages.append({
+                    "id": msg["id"],
+                    "content": msg["content"],
+                    "sent_by_me": sent_by_me,
+                    "sender_name": (current_user if sent_by_me else other_user)["name"] or "Unknown",
+                    "created_at": msg["created_at"],
+                    "read": msg["read"]
+                })
+        
+            return {
+                "other_user": {
+                    "id": other_id,
+                    "type": other_type,
+                    "name": other_user["name"] or "Unknown",
+                    "profile_picture": other_user["profile_picture"]
+                },
+                "messages": messages,
+                "next_cursor": next_cursor
+            }
         
-        conn.commit()
-        
-        
-        if other_type == "student":
-            cur.execute("SELECT name, profile_picture FROM students WHERE id = %s", (other_id,))
-        else:
-            cur.execute("SELECT name, profile_picture FROM clubs WHERE id = %s", (other_id,))
-        
-        other_user = cur.fetchone()
-        
-      
-        if user_type == "student":
-            cur.execute("SELECT name, profile_picture FROM students WHERE id = %s", (user_id,))
-        else:
-            cur.execute("SELECT name, profile_picture FROM clubs WHERE id = %s", (user_id,))
-        
-        current_user = cur.fetchone()
-        
-        
-        messages = []
-        for msg in messages_data:
-            messages.append({
-                "id": msg["id"],
-                "content": msg["content"],
-                "sent_by_me": msg["sender_id"] == user_id and msg["sender_type"] == user_type,
-                "sender_name": current_user["name"] if msg["sender_id"] == user_id and msg["sender_type"] == user_type else other_user["name"],
-                "created_at": msg["created_at"],
-                "read": msg["read"]
-            })
-        
-        return {
-            "other_user": {
-                "id": other_id,
-                "type": other_type,
-                "name": other_user["name"] if other_user else "Unknown",
-                "profile_picture": other_user["profile_picture"] if other_user else None
-            },
-            "messages": messages
-        }
-        
+    except HTTPException as e:
+        raise e
     except Exception as e:
-        if conn:
-            conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# Compare conversations.unread_count with the unread messages it summarizes and repair drifted rows.
+# Only existing conversations rows are checked; a conversation with no row at all is not recreated
+# (re-run database/migrations/005_conversations.sql for that).
+def reconcile_unread_counts(dry_run: bool = False) -> List[Dict[str, Any]]:
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            # The unread side of messages comes from the partial index on read = FALSE
+            cur.execute(
+                """
+                WITH actual AS (
+                    SELECT recipient_id AS owner_id, recipient_type AS owner_type,
+                           sender_id AS contact_id, sender_type AS contact_type, COUNT(*) AS n
+                    FROM messages
+                    WHERE read = FALSE
+                      AND NOT (sender_id = recipient_id AND sender_type = recipient_type)
+                    GROUP BY recipient_id, recipient_type, sender_id, sender_type
+                )
+                SELECT cv.owner_id, cv.owner_type, cv.contact_id, cv.contact_type,
+                       cv.unread_count, COALESCE(a.n, 0) AS actual
+                FROM conversations cv
+                LEFT JOIN actual a USING (owner_id, owner_type, contact_id, contact_type)
+                WHERE cv.unread_count <> COALESCE(a.n, 0)
+                """
+            )
+            drifted = [dict(row) for row in cur.fetchall()]
+        conn.commit()
+
+        if dry_run:
+            return drifted
+
+        repaired = []
+        for row in drifted:
+            with conn.cursor() as cur:
+                # Lock the counter so concurrent sends wait, then recount
+                cur.execute(
+                    """
+                    SELECT unread_count FROM conversations
+                    WHERE owner_id = %(owner_id)s AND owner_type = %(owner_type)s
+                      AND contact_id = %(contact_id)s AND contact_type = %(contact_type)s
+                    FOR UPDATE
+                    """,
+                    row
+                )
+                locked = cur.fetchone()
+                if locked is None:
+                    conn.rollback()
+                    continue
+                cur.execute(
+                    """
+                    SELECT COUNT(*) AS actual FROM messages
+                    WHERE recipient_id = %(owner_id)s AND recipient_type = %(owner_type)s
+                      AND sender_id = %(contact_id)s AND sender_type = %(contact_type)s
+                      AND read = FALSE
+                    """,
+                    row
+                )
+                actual = cur.fetchone()["actual"]
+                if actual != locked["unread_count"]:
+                    cur.execute(
+                        """
+                        UPDATE conversations SET unread_count = %(actual)s
+                        WHERE owner_id = %(owner_id)s AND owner_type = %(owner_type)s
+                          AND contact_id = %(contact_id)s AND contact_type = %(contact_type)s
+                        """,
+                        dict(row, actual=actual)
+                    )
+                    repaired.append(dict(row, unread_count=locked["unread_count"], actual=actual))
+            conn.commit()
+        return repaired
     finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close() 
\ No newline at end of file
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detect and repair drift in conversations.unread_count")
+    parser.add_argument("--dry-run", action="store_true", help="report drifted conversations without changing them")
+    args = parser.parse_args()
+    for row in reconcile_unread_counts(args.dry_run):
+        print(
+            f"{row['owner_type']} {row['owner_id']} <- {row['contact_type']} {row['contact_id']}: "
+            f"stored {row['unread_count']}, actual {row['actual']}"
+        )
@@ -0,0 +1,187 @@
+"""
+Request metrics and worker pool statistics in the Prometheus text format.
+
+MetricsMiddleware times every HTTP request by route template and counts
+responses by status; /metrics renders those together with the database pool,
+password hashing, image rendering and event stream statistics. Values are kept
+per process, so scrape each worker separately.
+"""
+import bisect
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from database.db import pool_stats
+from database.query_stats import current_query_stats
+from services.auth_service import hash_pool_stats
+from services.events_service import inbox_events
+from services.image_service import image_pool_stats
+
+# Upper bounds in seconds of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds in bytes of the response size histogram buckets
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Upper bounds of the per-request SQL statement count histogram buckets
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Content type Prometheus expects from a text-format scrape
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed values."""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # (le label, cumulative count) pairs, ending with +Inf
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total = 0
+        pairs = []
+        for bound, count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            total += count
+            pairs.append((bound if isinstance(bound, str) else format(bound, "g"), total))
+        return pairs
+
+
+# Per-route request statistics; only touched from the event loop, so no locking is needed
+_latency: Dict[Tuple[str, str], Histogram] = {}
+_sizes: Dict[Tuple[str, str], Histogram] = {}
+_queries: Dict[Tuple[str, str], Histogram] = {}
+_responses: Dict[Tuple[str, str, int], int] = defaultdict(int)
+_in_flight: Dict[str, int] = defaultdict(int)
+
+
+# Record one finished request; `queries` is None when SQL statements were not tracked
+def observe_request(method: str, route: str, status: int, seconds: float, size: int, queries: Optional[int] = None):
+    key = (method, route)
+    if key not in _latency:
+        _latency[key] = Histogram(LATENCY_BUCKETS)
+        _sizes[key] = Histogram(SIZE_BUCKETS)
+        _queries[key] = Histogram(QUERY_COUNT_BUCKETS)
+    _latency[key].observe(seconds)
+    _sizes[key].observe(size)
+    if queries is not None:
+        _queries[key].observe(queries)
+    _responses[(method, route, status)] += 1
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing each HTTP request and measuring its response body.
+    Requests are labelled by the matched route's path template (e.g. /api/clubs/{club_id}), so
+    label values stay bounded; requests no route matched share the "unmatched" label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            elif message["type"] == "http.response.zerocopy":
+                size += message["count"]
+            await send(message)
+
+        _in_flight[method] += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _in_flight[method] -= 1
+            seconds = time.perf_counter() - started
+            # The router stores the matched route in the scope it was given
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            # Set by QueryStatsMiddleware around this one
+            query_stats = current_query_stats()
+            observe_request(method, template, status, seconds, size, query_stats.count if query_stats else None)
+            fields = {
+                "method": method,
+                "route": template,
+                "path": scope["path"],
+                "status": status,
+                "duration_ms": round(seconds * 1000, 3),
+                "response_bytes": size,
+            }
+            if query_stats:
+                fields["db_queries"] = query_stats.count
+                fields["db_ms"] = round(query_stats.total_seconds * 1000, 3)
+            logger.log(logging.ERROR if status >= 500 else logging.DEBUG, "%s %s %s", method, scope["path"], status, extra=fields)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels: Any) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _histogram_lines(name: str, help_text: str, histograms: Dict[Tuple[str, str], Histogram]) -> Iterable[str]:
+    yield f"# HELP {name} {help_text}"
+    yield f"# TYPE {name} histogram"
+    for (method, route), histogram in sorted(histograms.items()):
+        for bound, count in histogram.cumulative():
+            yield f"{name}_bucket{_labels(method=method, route=route, le=bound)} {count}"
+        yield f"{name}_sum{_labels(method=method, route=route)} {histogram.sum}"
+        yield f"{name}_count{_labels(method=method, route=route)} {histogram.count}"
+
+
+# One metric per numeric entry of a stats dict; *_total entries are counters, the rest gauges
+def _stats_lines(prefix: str, help_text: str, stats: Dict[str, Any]) -> Iterable[str]:
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name = f"{prefix}_{key}"
+        yield f"# HELP {name} {help_text} ({key.replace('_', ' ')})"
+        yield f"# TYPE {name} {'counter' if key.endswith('_total') else 'gauge'}"
+        yield f"{name} {value}"
+
+
+# Every metric of this process in the Prometheus text exposition format
+def render_metrics() -> str:
+    lines = []
+    lines.extend(_histogram_lines("http_request_duration_seconds", "HTTP request latency by route", _latency))
+    lines.extend(_histogram_lines("http_response_size_bytes", "HTTP response body size by route", _sizes))
+    lines.extend(_histogram_lines("http_request_db_queries", "SQL statements per HTTP request by route", _queries))
+
+    lines.append("# HELP http_responses_total HTTP responses by route and status code")
+    lines.append("# TYPE http_responses_total counter")
+    for (method, route, status), count in sorted(_responses.items()):
+        lines.append(f"http_responses_total{_labels(method=method, route=route, status=status)} {count}")
+
+    lines.append("# HELP http_requests_in_flight HTTP requests being handled")
+    lines.append("# TYPE http_requests_in_flight gauge")
+    for method, count in sorted(_in_flight.items()):
+        lines.append(f"http_requests_in_flight{_labels(method=method)} {count}")
+
+    lines.extend(_stats_lines("db_pool", "Database connection pool", pool_stats()))
+    lines.extend(_stats_lines("hash_pool", "Password hashing process pool", hash_pool_stats()))
+    lines.extend(_stats_lines("image_pool", "Profile picture rendering process pool", image_pool_stats()))
+    lines.extend(_stats_lines("event_streams", "Inbox event streams", inbox_events.stats()))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,51 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from fastapi import HTTPException
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+def _encode_value(value: Any):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+# Build an opaque cursor token from the sort key of the last row on a page
+def encode_cursor(*key: Any) -> str:
+    raw = json.dumps([_encode_value(value) for value in key], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+# Decode a cursor token into its sort key values, checking each against the expected type.
+# datetime values travel as ISO strings and are parsed back; anything else is a 400, not a 500.
+def decode_cursor(token: Optional[str], types: Tuple[type, ...]) -> Optional[List[Any]]:
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        key = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(key, list) or len(key) != len(types):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return [_decode_value(value, expected) for value, expected in zip(key, types)]
+
+
+def _decode_value(value: Any, expected: type) -> Any:
+    if expected is datetime:
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    # bool is an int subclass but never a valid key
+    if not isinstance(value, expected) or isinstance(value, bool):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value
+
+
+# Split an over-fetched result (limit + 1 rows) into the page and whether more rows follow
+def split_page(rows: list, limit: int):
+    return rows[:limit], len(rows) > limit
@@ -0,0 +1,294 @@
+"""
+Item-item club recommendations built from saved_clubs.
+
+Rebuild the neighbor table with:
+
+    python -m services.recommendation_service
+"""
+import argparse
+import io
+import os
+import time
+from typing import Any, Dict, List
+import numpy as np
+import psycopg2.extensions
+from fastapi import HTTPException
+from scipy import sparse
+from database.db import db_connection, db_task, get_db_connection
+from services.media_service import picture_url
+
+# Neighbors kept per club, by the rebuild and by incremental updates alike
+RECOMMENDATION_TOP_N = int(os.getenv('RECOMMENDATION_TOP_N', '20'))
+
+
+# Stream (student_id, club_id) pairs from saved_clubs in chunks
+def _load_saves(conn, chunk_size: int):
+    students, clubs = [], []
+    with conn.cursor(name="saved_clubs_scan", cursor_factory=psycopg2.extensions.cursor) as cur:
+        cur.itersize = chunk_size
+        cur.execute("SELECT student_id, club_id FROM saved_clubs")
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunk = np.array(rows, dtype=np.int64)
+            students.append(chunk[:, 0])
+            clubs.append(chunk[:, 1])
+    if not students:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(students), np.concatenate(clubs)
+
+
+# Yield (club_id, neighbor_id, co_count, score) rows for one block of clubs
+def _top_neighbors(club_rows, saves, popularity, club_ids, start, stop, top_n):
+    co = (club_rows[start:stop] @ saves).tocsr()
+    for offset in range(stop - start):
+        i = start + offset
+        lo, hi = co.indptr[offset], co.indptr[offset + 1]
+        neighbors = co.indices[lo:hi]
+        counts = co.data[lo:hi]
+        keep = neighbors != i
+        neighbors, counts = neighbors[keep], counts[keep]
+        if neighbors.size == 0:
+            continue
+        scores = counts / np.sqrt(popularity[i] * popularity[neighbors])
+        if neighbors.size > top_n:
+            best = np.argpartition(-scores, top_n - 1)[:top_n]
+            neighbors, counts, scores = neighbors[best], counts[best], scores[best]
+        for j, count, score in zip(neighbors, counts, scores):
+            yield club_ids[i], club_ids[j], int(count), float(score)
+
+
+# Recompute the top neighbors of every club and replace club_recommendations.
+# Co-occurrence is computed one block of clubs at a time, so memory is bounded
+# by the block size rather than by the square of the number of clubs. Rows are
+# written to a staging table that replaces the live one in a short rename, so
+# saves and unsaves keep updating the live table meanwhile; changes they make
+# after the rebuild has read saved_clubs are picked up by the next rebuild.
+def rebuild_recommendations(top_n: int = RECOMMENDATION_TOP_N, block_size: int = 1024, chunk_size: int = 100000):
+    started = time.monotonic()
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            # One rebuild at a time; the lock is released when the connection closes
+            cur.execute("SELECT pg_advisory_lock(hashtext('rebuild_recommendations'))")
+            # Leftovers of an interrupted rebuild
+            cur.execute("DROP TABLE IF EXISTS club_recommendations_next, club_recommendations_old")
+            cur.execute("CREATE TABLE club_recommendations_next (LIKE club_recommendations INCLUDING DEFAULTS)")
+        conn.commit()
+
+        student_ids, saved_club_ids = _load_saves(conn, chunk_size)
+        clubs = pairs = 0
+        if saved_club_ids.size:
+            # Map ids to dense matrix coordinates
+            club_ids, club_idx = np.unique(saved_club_ids, return_inverse=True)
+            _, student_idx = np.unique(student_ids, return_inverse=True)
+            del student_ids, saved_club_ids
+
+            ones = np.ones(club_idx.size, dtype=np.int32)
+            saves = sparse.csr_matrix((ones, (student_idx, club_idx)))
+            saves.data[:] = 1
+            del ones, student_idx, club_idx
+
+            popularity = np.asarray(saves.sum(axis=0)).ravel().astype(np.float64)
+            club_rows = saves.T.tocsr()
+            clubs = len(club_ids)
+
+            with conn.cursor() as cur:
+                for start in range(0, len(club_ids), block_size):
+                    stop = min(start + block_size, len(club_ids))
+                    buffer = io.StringIO()
+                    for club_id, neighbor_id, count, score in _top_neighbors(club_rows, saves, popularity, club_ids, start, stop, top_n):
+                        buffer.write(f"{club_id}\t{neighbor_id}\t{count}\t{score}\n")
+                        pairs += 1
+                    buffer.seek(0)
+                    cur.copy_expert(
+                        "COPY club_recommendations_next (club_id, neighbor_id, co_count, score) FROM STDIN",
+                        buffer
+                    )
+
+        with conn.cursor() as cur:
+            # Indexes are built once the rows are in; foreign keys skip the full check until after the swap
+            cur.execute("ALTER TABLE club_recommendations_next ADD CONSTRAINT club_recommendations_next_pkey PRIMARY KEY (club_id, neighbor_id)")
+            cur.execute("CREATE INDEX idx_club_recommendations_next_neighbor_id ON club_recommendations_next(neighbor_id)")
+            cur.execute("DELETE FROM club_recommendations_next n WHERE NOT EXISTS (SELECT 1 FROM clubs c WHERE c.id = n.club_id) OR NOT EXISTS (SELECT 1 FROM clubs c WHERE c.id = n.neighbor_id)")
+            for column in ("club_id", "neighbor_id"):
+                cur.execute(
+                    f"""
+                    ALTER TABLE club_recommendations_next
+                    ADD CONSTRAINT club_recommendations_{column}_fkey FOREIGN KEY ({column}) REFERENCES clubs(id) ON DELETE CASCADE NOT VALID
+                    """
+                )
+        conn.commit()
+
+        # Swap: saves and unsaves wait only for the renames
+        with conn.cursor() as cur:
+            cur.execute("LOCK TABLE club_recommendations IN ACCESS EXCLUSIVE MODE")
+            cur.execute("ALTER TABLE club_recommendations RENAME TO club_recommendations_old")
+            cur.execute("ALTER INDEX club_recommendations_pkey RENAME TO club_recommendations_old_pkey")
+            cur.execute("ALTER INDEX idx_club_recommendations_neighbor_id RENAME TO idx_club_recommendations_old_neighbor_id")
+            cur.execute("ALTER TABLE club_recommendations_next RENAME TO club_recommendations")
+            cur.execute("ALTER INDEX club_recommendations_next_pkey RENAME TO club_recommendations_pkey")
+            cur.execute("ALTER INDEX idx_club_recommendations_next_neighbor_id RENAME TO idx_club_recommendations_neighbor_id")
+        conn.commit()
+
+        with conn.cursor() as cur:
+            cur.execute("DROP TABLE club_recommendations_old")
+            cur.execute("ALTER TABLE club_recommendations VALIDATE CONSTRAINT club_recommendations_club_id_fkey")
+            cur.execute("ALTER TABLE club_recommendations VALIDATE CONSTRAINT club_recommendations_neighbor_id_fkey")
+        conn.commit()
+        return {"clubs": clubs, "pairs": pairs, "seconds": time.monotonic() - started}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+# Clubs the student has saved besides the changed one
+_OTHER_SAVES = """
+    others AS (
+        SELECT club_id FROM saved_clubs
+        WHERE student_id = %(student_id)s AND club_id <> %(club_id)s
+    )
+"""
+
+
+# Adjust co-occurrence for a student's save (delta=1) or unsave (delta=-1) inside the caller's transaction.
+# Touched rows are locked in key order before any is changed, so concurrent saves and unsaves of
+# overlapping clubs queue behind each other instead of deadlocking, and every touched club's
+# neighbor list is cut back to `top_n` like the rebuild's.
+def apply_saved_club_change(cur, student_id: int, club_id: int, delta: int, top_n: int = RECOMMENDATION_TOP_N):
+    params = {"student_id": student_id, "club_id": club_id, "delta": delta, "top_n": top_n}
+    # Every row changed below is in the neighbor list of the changed club or one of the student's
+    # other saved clubs, or points at the changed club
+    cur.execute(
+        f"""
+        WITH {_OTHER_SAVES}
+        SELECT 1 FROM club_recommendations
+        WHERE club_id = %(club_id)s OR neighbor_id = %(club_id)s OR club_id IN (SELECT club_id FROM others)
+        ORDER BY club_id, neighbor_id
+        FOR UPDATE
+        """,
+        params
+    )
+    # Pair the changed club with every other club the student has saved, in both directions. Pairs not
+    # in the table (never co-saved, or cut off by the top-N limit) start from their true co-save count.
+    cur.execute(
+        f"""
+        WITH {_OTHER_SAVES},
+        pairs AS (
+            SELECT %(club_id)s AS club_id, club_id AS neighbor_id FROM others
+            UNION ALL
+            SELECT club_id, %(club_id)s FROM others
+        )
+        INSERT INTO club_recommendations (club_id, neighbor_id, co_count, score)
+        SELECT p.club_id, p.neighbor_id,
+               CASE WHEN EXISTS (
+                        SELECT 1 FROM club_recommendations r
+                        WHERE r.club_id = p.club_id AND r.neighbor_id = p.neighbor_id
+                    ) THEN 0
+                    ELSE (
+                        SELECT COUNT(*) FROM saved_clubs a
+                        JOIN saved_clubs b ON b.student_id = a.student_id
+                        WHERE a.club_id = p.club_id AND b.club_id = p.neighbor_id
+                    )
+               END,
+               0
+        FROM pairs p
+        ORDER BY p.club_id, p.neighbor_id
+        ON CONFLICT (club_id, neighbor_id)
+        DO UPDATE SET co_count = club_recommendations.co_count + %(delta)s
+        """,
+        params
+    )
+    cur.execute(
+        "DELETE FROM club_recommendations WHERE (club_id = %(club_id)s OR neighbor_id = %(club_id)s) AND co_count <= 0",
+        params
+    )
+    # Rescore the changed club's pairs with current popularity
+    cur.execute(
+        """
+        UPDATE club_recommendations r
+        SET score = r.co_count / sqrt(GREATEST(a.member_count, 1)::float8 * GREATEST(b.member_count, 1))
+        FROM clubs a, clubs b
+        WHERE a.id = r.club_id AND b.id = r.neighbor_id
+          AND (r.club_id = %(club_id)s OR r.neighbor_id = %(club_id)s)
+        """,
+        params
+    )
+    # Keep the top neighbors of each club whose list may have grown
+    cur.execute(
+        f"""
+        WITH {_OTHER_SAVES},
+        ranked AS (
+            SELECT club_id, neighbor_id,
+                   row_number() OVER (PARTITION BY club_id ORDER BY score DESC, neighbor_id) AS rank
+            FROM club_recommendations
+            WHERE club_id = %(club_id)s OR club_id IN (SELECT club_id FROM others)
+        )
+        DELETE FROM club_recommendations r
+        USING ranked
+        WHERE r.club_id = ranked.club_id AND r.neighbor_id = ranked.neighbor_id AND ranked.rank > %(top_n)s
+        """,
+        params
+    )
+
+
+# Recommend clubs by merging the neighbor lists of a student's saved clubs
+@db_task
+def get_recommended_clubs(student_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+    try:
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT id FROM students WHERE id = %s", (student_id,))
+            if not cur.fetchone():
+                raise HTTPException(status_code=404, detail="Student not found")
+
+            cur.execute(
+                """
+                WITH saved AS (
+                    SELECT club_id FROM saved_clubs WHERE student_id = %(student_id)s
+                ),
+                candidates AS (
+                    SELECT r.neighbor_id, SUM(r.score) AS score
+                    FROM club_recommendations r
+                    JOIN saved s ON s.club_id = r.club_id
+                    WHERE r.neighbor_id NOT IN (SELECT club_id FROM saved)
+                    GROUP BY r.neighbor_id
+                    ORDER BY score DESC, r.neighbor_id
+                    LIMIT %(limit)s
+                )
+                SELECT c.id, c.name, c.description, c.interests, c.profile_picture, cand.score
+                FROM candidates cand
+                JOIN clubs c ON c.id = cand.neighbor_id
+                ORDER BY cand.score DESC, c.id
+                """,
+                {"student_id": student_id, "limit": limit}
+            )
+            rows = cur.fetchall()
+
+        return [
+            {
+                "id": row["id"],
+                "name": row["name"],
+                "description": row["description"],
+                "interests": row["interests"],
+                "profile_picture": picture_url(row["profile_picture"]),
+                "score": round(float(row["score"]), 4)
+            }
+            for row in rows
+        ]
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild club_recommendations from saved_clubs")
+    parser.add_argument("--top-n", type=int, default=RECOMMENDATION_TOP_N, help="neighbors kept per club")
+    parser.add_argument("--block-size", type=int, default=1024, help="clubs per co-occurrence block")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="saved_clubs rows fetched per round trip")
+    args = parser.parse_args()
+    print(rebuild_recommendations(args.top_n, args.block_size, args.chunk_size))
@@ -1,197 +1,194 @@
 from fastapi import HTTPException
-from database.db import get_db_connection
+from database.db import db_connection, db_task, get_db_connection
+from services.recommendation_service import apply_saved_club_change
+from services.cache_service import club_catalog
+from services.media_service import picture_url
 from typing import List, Dict, Any
-import os
+import argparse
 
-async def save_club(student_id: int, club_id: int):
-    conn = None
-    cur = None
-    
+# Saved clubs list entry for a clubs row joined with its email
+def saved_club_item(row) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "name": row["name"],
+        "description": row["description"],
+        "interests": row["interests"],
+        "profile_picture": picture_url(row["profile_picture"]),
+        "members": row["members"],
+        "email": row["email"]
+    }
+
+@db_task
+def save_club(student_id: int, club_id: int):
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # Verify student exists
-        cur.execute("SELECT id FROM students WHERE id = %s", (student_id,))
-        student = cur.fetchone()
-        if not student:
-            raise HTTPException(status_code=404, detail="Student not found")
-        
-        # Verify club exists
-        cur.execute("SELECT id FROM clubs WHERE id = %s", (club_id,))
-        club = cur.fetchone()
-        if not club:
-            raise HTTPException(status_code=404, detail="Club not found")
-        
-        # Check if club is already saved
-        cur.execute(
-            "SELECT id FROM saved_clubs WHERE student_id = %s AND club_id = %s",
-            (student_id, club_id)
-        )
-        existing = cur.fetchone()
-        if existing:
-            return {"message": "Club already saved", "saved": True}
-        
-        # Save the club
-        cur.execute(
-            """
-            INSERT INTO saved_clubs (student_id, club_id)
-            VALUES (%s, %s)
-            RETURNING id
-            """,
-            (student_id, club_id)
-        )
-        
-        saved_id = cur.fetchone()["id"]
-        conn.commit()
-        
-        return {"message": "Club saved successfully", "saved": True, "id": saved_id}
+        with db_connection() as conn, conn.cursor() as cur:
+            # Verify student exists
+            cur.execute("SELECT id FROM students WHERE id = %s", (student_id,))
+            student = cur.fetchone()
+            if not student:
+                raise HTTPException(status_code=404, detail="Student not found")
+            
+            # Verify club exists
+            cur.execute("SELECT id FROM clubs WHERE id = %s", (club_id,))
+            club = cur.fetchone()
+            if not club:
+                raise HTTPException(status_code=404, detail="Club not found")
+            
+            # Check if club is already saved
+            cur.execute(
+                "SELECT id FROM saved_clubs WHERE student_id = %s AND club_id = %s",
+                (student_id, club_id)
+            )
+            existing = cur.fetchone()
+            if existing:
+                return {"message": "Club already saved", "saved": True}
+            
+            # Save the club
+            cur.execute(
+                """
+                INSERT INTO saved_clubs (student_id, club_id)
+                VALUES (%s, %s)
+                RETURNING id
+                """,
+                (student_id, club_id)
+            )
+            
+            saved_id = cur.fetchone()["id"]
+            apply_saved_club_change(cur, student_id, club_id, 1)
+            conn.commit()
+            club_catalog.bump()
+            
+            return {"message": "Club saved successfully", "saved": True, "id": saved_id}
         
     except HTTPException as e:
-        if conn:
-            conn.rollback()
         raise e
     except Exception as e:
-        if conn:
-            conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
 
-async def unsave_club(student_id: int, club_id: int):
-    conn = None
-    cur = None
-    
+@db_task
+def unsave_club(student_id: int, club_id: int):
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # Remove the saved club record
-        cur.execute(
-            """
-            DELETE FROM saved_clubs
-            WHERE student_id = %s AND club_id = %s
-            RETURNING id
-            """,
-            (student_id, club_id)
-        )
-        
-        result = cur.fetchone()
-        conn.commit()
-        
-        if not result:
-            return {"message": "Club was not saved", "removed": False}
-        
-        return {"message": "Club removed from saved clubs", "removed": True}
+        with db_connection() as conn, conn.cursor() as cur:
+            # Remove the saved club record
+            cur.execute(
+                """
+                DELETE FROM saved_clubs
+                WHERE student_id = %s AND club_id = %s
+                RETURNING id
+                """,
+                (student_id, club_id)
+            )
+            
+            result = cur.fetchone()
+            if result:
+                apply_saved_club_change(cur, student_id, club_id, -1)
+            conn.commit()
+            if result:
+                club_catalog.bump()
+            
+            if not result:
+                return {"message": "Club was not saved", "removed": False}
+            
+            return {"message": "Club removed from saved clubs", "removed": True}
         
     except Exception as e:
-        if conn:
-            conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
 
-async def get_saved_clubs(student_id: int) -> List[Dict[str, Any]]:
-    conn = None
-    cur = None
-    
+@db_task
+def get_saved_clubs(student_id: int) -> List[Dict[str, Any]]:
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # Verify student exists
-        cur.execute("SELECT id FROM students WHERE id = %s", (student_id,))
-        student = cur.fetchone()
-        if not student:
-            raise HTTPException(status_code=404, detail="Student not found")
-        
-        # Get all saved clubs with additional information
-        cur.execute(
-            """
-            SELECT c.id, c.name, c.description, c.interests, c.profile_picture,
-                   (SELECT COUNT(*) FROM saved_clubs WHERE club_id = c.id) as members,
-                   a.email
-            FROM saved_clubs sc
-            JOIN clubs c ON sc.club_id = c.id
-            JOIN auth_credentials a ON c.auth_id = a.id
-            WHERE sc.student_id = %s
-            ORDER BY sc.saved_at DESC
-            """,
-            (student_id,)
-        )
-        
-        clubs = cur.fetchall()
-        
-        # Format club data with proper profile picture URLs
-        formatted_clubs = []
-        for club in clubs:
-           
-            profile_picture_url = None
-            if club["profile_picture"]:
-             
-                profile_picture = club["profile_picture"]
-                
-               
-                if 'uploads/' in profile_picture and not profile_picture.startswith('/uploads/'):
-                    profile_picture_url = f"/{profile_picture}"
-                elif not profile_picture.startswith(('http://', 'https://', '/')):
-                    profile_picture_url = f"/uploads/club_profile_pictures/{profile_picture}"
-                else:
-                    profile_picture_url = profile_picture
-                
-                
-                print(f"Original club profile picture: {club['profile_picture']}")
-                print(f"Formatted profile picture URL: {profile_picture_url}")
+        with db_connection() as conn, conn.cursor() as cur:
+            # Verify student exists
+            cur.execute("SELECT id FROM students WHERE id = %s", (student_id,))
+            student = cur.fetchone()
+            if not student:
+                raise HTTPException(status_code=404, detail="Student not found")
+            
+            # Get all saved clubs with additional information
+            cur.execute(
+                """
+                SELECT c.id, c.name, c.description, c.interests, c.profile_picture,
+                       c.member_count as members,
+                       a.email
+                FROM saved_clubs sc
+                JOIN clubs c ON sc.club_id = c.id
+                JOIN auth_credentials a ON c.auth_id = a.id
+                WHERE sc.student_id = %s
+                ORDER BY sc.saved_at DESC
+                """,
+                (student_id,)
+            )
             
-            formatted_clubs.append({
-                "id": club["id"],
-                "name": club["name"],
-                "description": club["description"],
-                "interests": club["interests"],
-                "profile_picture": profile_picture_url,
-                "members": club["members"],
-                "email": club["email"]
-            })
+            clubs = cur.fetchall()
         
-        return formatted_clubs
+        return [saved_club_item(club) for club in clubs]
         
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
 
-async def is_club_saved(student_id: int, club_id: int) -> bool:
-    conn = None
-    cur = None
-    
+@db_task
+def is_club_saved(student_id: int, club_id: int) -> bool:
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # Check if the club is saved by the student
-        cur.execute(
-            "SELECT id FROM saved_clubs WHERE student_id = %s AND club_id = %s",
-            (student_id, club_id)
-        )
-        
-        result = cur.fetchone()
-        return result is not None
+        with db_connection() as conn, conn.cursor() as cur:
+            # Check if the club is saved by the student
+            cur.execute(
+                "SELECT id FROM saved_clubs WHERE student_id = %s AND club_id = %s",
+                (student_id, club_id)
+            )
+            
+            result = cur.fetchone()
+            return result is not None
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+# Find clubs whose stored member_count disagrees with saved_clubs and repair them.
+# Each club is fixed in its own short transaction holding the club row lock, so
+# saves committed meanwhile (whose trigger needs the same lock) are never lost.
+def reconcile_member_counts(dry_run: bool = False) -> List[Dict[str, Any]]:
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT c.id, c.member_count, COUNT(sc.id) AS actual
+                FROM clubs c
+                LEFT JOIN saved_clubs sc ON sc.club_id = c.id
+                GROUP BY c.id
+                HAVING c.member_count <> COUNT(sc.id)
+                """
+            )
+            drifted = [dict(row) for row in cur.fetchall()]
+        conn.commit()
+
+        if dry_run:
+            return drifted
+
+        repaired = []
+        for club in drifted:
+            with conn.cursor() as cur:
+                cur.execute("SELECT member_count FROM clubs WHERE id = %s FOR UPDATE", (club["id"],))
+                locked = cur.fetchone()
+                if locked is None:
+                    conn.rollback()
+                    continue
+                cur.execute("SELECT COUNT(*) AS actual FROM saved_clubs WHERE club_id = %s", (club["id"],))
+                actual = cur.fetchone()["actual"]
+                if actual != locked["member_count"]:
+                    cur.execute("UPDATE clubs SET member_count = %s WHERE id = %s", (actual, club["id"]))
+                    repaired.append({"id": club["id"], "member_count": locked["member_count"], "actual": actual})
+            conn.commit()
+        return repaired
     finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close() 
\ No newline at end of file
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detect and repair drift in clubs.member_count")
+    parser.add_argument("--dry-run", action="store_true", help="report drifted clubs without changing them")
+    args = parser.parse_args()
+    for club in reconcile_member_counts(args.dry_run):
+        print(f"club {club['id']}: stored {club['member_count']}, actual {club['actual']}")
+
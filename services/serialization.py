@@ -0,0 +1,36 @@
+import decimal
+from typing import Any
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+# Integer dict keys and numpy scalars/arrays serialize like plain values
+JSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+# Fallback for the few values orjson does not serialize natively
+def _default(value: Any):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+# Serialize to compact UTF-8 JSON bytes; datetimes are written in ISO 8601 like FastAPI's encoder does
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=JSON_OPTIONS)
+
+
+class FastJSONResponse(ORJSONResponse):
+    """
+    JSON response rendered with orjson; the app's default response class.
+    Returning one directly from a route also skips FastAPI's jsonable_encoder pass over the
+    content, which is most of the cost of large lists, so list endpoints build plain
+    dicts of JSON types with a row converter and return this.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
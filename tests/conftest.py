@@ -0,0 +1,115 @@
+"""
+Shared fixtures. Most tests need no database server: `stub_db` swaps the connection
+pool for one whose cursors answer from a Python function but still time every
+statement through QueryTimingMixin, like the real InstrumentedCursor.
+`postgres_db` gives the few tests that depend on Postgres itself a scratch database.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db
+from database.query_stats import QueryTimingMixin
+
+
+class StubCursor:
+    """DB-API cursor returning the rows `connection.rows(query, params)` gives for each statement."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._result = []
+
+    def execute(self, query, vars=None):
+        self.connection.executed.append(query)
+        self._result = list(self.connection.rows(query, vars))
+
+    def executemany(self, query, vars_list):
+        for vars in vars_list:
+            self.execute(query, vars)
+
+    def fetchone(self):
+        return self._result.pop(0) if self._result else None
+
+    def fetchall(self):
+        rows, self._result = self._result, []
+        return rows
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class InstrumentedStubCursor(QueryTimingMixin, StubCursor):
+    pass
+
+
+class StubConnection:
+    def __init__(self):
+        self.rows = lambda query, params: []
+        self.executed = []
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedStubCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class StubPool:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def getconn(self):
+        return self.connection
+
+    def putconn(self, conn, close=False):
+        pass
+
+
+# Route db_connection() to a stub connection; set `.rows` on the returned connection to answer queries
+@pytest.fixture
+def stub_db(monkeypatch):
+    connection = StubConnection()
+    monkeypatch.setattr(db, "_pool", StubPool(connection))
+    return connection
+
+
+# A scratch database loaded with database/combined_schema.sql, for tests that need real Postgres behaviour.
+# Opt in with TEST_POSTGRES=1; DB_USER, DB_PASSWORD and DB_HOST must name a user allowed to create databases.
+@pytest.fixture
+def postgres_db(monkeypatch):
+    if os.getenv("TEST_POSTGRES") != "1":
+        pytest.skip("set TEST_POSTGRES=1 to run tests against a Postgres server")
+    import psycopg2
+
+    name = f"clubmatcher_test_{os.getpid()}"
+    settings = {"user": os.getenv("DB_USER"), "password": os.getenv("DB_PASSWORD"), "host": os.getenv("DB_HOST")}
+    admin = psycopg2.connect(dbname="postgres", **settings)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f'DROP DATABASE IF EXISTS "{name}"')
+        cur.execute(f'CREATE DATABASE "{name}"')
+    try:
+        conn = psycopg2.connect(dbname=name, **settings)
+        with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database", "combined_schema.sql")) as schema:
+            with conn.cursor() as cur:
+                cur.execute(schema.read())
+        conn.commit()
+        conn.close()
+        monkeypatch.setenv("DB_NAME", name)
+        yield name
+    finally:
+        with admin.cursor() as cur:
+            cur.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+        admin.close()
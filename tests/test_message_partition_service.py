@@ -0,0 +1,50 @@
+import datetime
+
+from database.db import get_db_connection
+from services.message_partition_service import _months_ago, archive_partitions
+
+
+def query(statement, params=None):
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(statement, params)
+            rows = cur.fetchall() if cur.description else None
+        conn.commit()
+        return rows
+    finally:
+        conn.close()
+
+
+def test_archive_partitions_with_default_partition(postgres_db):
+    old_month = _months_ago(3)
+    query("SELECT ensure_message_partitions(0, %s)", (old_month,))
+    future = datetime.datetime.now() + datetime.timedelta(days=3 * 365)
+    query(
+        """
+        INSERT INTO messages (content, sender_id, sender_type, recipient_id, recipient_type, created_at, read)
+        VALUES ('old', 1, 'club', 1, 'student', %s, FALSE),
+               ('recent', 1, 'club', 1, 'student', CURRENT_TIMESTAMP, FALSE),
+               ('future', 1, 'club', 1, 'student', %s, FALSE)
+        """,
+        (datetime.datetime.combine(old_month, datetime.time(12)), future)
+    )
+    query(
+        """
+        INSERT INTO conversations (owner_id, owner_type, contact_id, contact_type, last_message_id,
+                                   last_message_snippet, last_message_at, last_sent_by_owner, unread_count)
+        VALUES (1, 'student', 1, 'club', 3, 'future', %s, FALSE, 3)
+        """,
+        (future,)
+    )
+
+    archived = archive_partitions(retention_months=2)
+
+    name = f"messages_p{old_month:%Y_%m}"
+    assert [row["partition"] for row in archived] == [name]
+    assert archived[0]["rows"] == 1
+    assert query(f"SELECT content FROM archive.{name}") == [{"content": "old"}]
+    assert sorted(row["content"] for row in query("SELECT content FROM messages")) == ["future", "recent"]
+    # The default partition stays attached and keeps catching messages past the last month
+    assert query("SELECT tableoid::regclass::text AS part FROM messages WHERE content = 'future'") == [{"part": "messages_default"}]
+    assert query("SELECT unread_count FROM conversations") == [{"unread_count": 2}]
@@ -0,0 +1,106 @@
+import asyncio
+import datetime
+
+from database.query_stats import max_queries
+from models.schemas import BroadcastCreate
+from services import messaging_service
+from services.messaging_service import get_messages
+
+
+# Rows shaped like get_messages' page query, newest first, from alternating senders
+def message_rows(count):
+    now = datetime.datetime(2025, 1, 1, 12, 0)
+    return [
+        {
+            "id": count - i,
+            "content": f"message {count - i}",
+            "sender_id": 2 if i % 2 else 1,
+            "sender_type": "club" if i % 2 else "student",
+            "recipient_id": 1 if i % 2 else 2,
+            "recipient_type": "student" if i % 2 else "club",
+            "created_at": now - datetime.timedelta(minutes=i),
+            "read": False,
+            "sender_name": "Chess Club" if i % 2 else "Ada",
+            "sender_profile_picture": None,
+        }
+        for i in range(count)
+    ]
+
+
+# Statements get_messages runs when the user has `count` messages
+def statements_for(stub_db, count, **kwargs):
+    stub_db.rows = lambda query, params: message_rows(min(count, params["limit"]))
+    with max_queries(1) as stats:
+        page = asyncio.run(get_messages(1, "student", **kwargs))
+    assert len(page["items"]) == min(count, kwargs.get("limit", 50))
+    return stats.count
+
+
+def test_get_messages_query_count_does_not_grow_with_messages(stub_db):
+    # Senders come from the page query itself rather than one lookup per message
+    assert statements_for(stub_db, 1) == statements_for(stub_db, 50) == 1
+
+
+def test_get_messages_runs_one_statement_for_full_and_unread_pages(stub_db):
+    assert statements_for(stub_db, 101, limit=100) == 1
+    assert statements_for(stub_db, 101, unread_only=True, limit=100) == 1
+
+
+class RecordingHub:
+    """Stands in for inbox_events: everyone is subscribed and every event is kept."""
+
+    def __init__(self, queue_size):
+        self.queue_size = queue_size
+        self.events = []
+
+    def is_subscribed(self, user_type, user_id):
+        return True
+
+    def publish(self, user_type, user_id, event, data):
+        self.events.append((user_type, user_id, event, data))
+
+
+# Rows broadcast_message's statements return for a club with `recipients` savers
+def broadcast_rows(recipients):
+    def rows(query, params):
+        if query.startswith("SELECT id, name, profile_picture FROM clubs"):
+            return [{"id": 7, "name": "Chess Club", "profile_picture": None}]
+        sent = datetime.datetime(2025, 1, 1, 12, 0)
+        return [
+            {
+                "owner_id": owner_id, "owner_type": owner_type, "contact_id": contact_id, "contact_type": contact_type,
+                "last_message_id": 100 + student_id, "last_message_snippet": "hello", "last_message_at": sent,
+                "last_sent_by_owner": owner_type == "club", "last_message_read": False,
+                "unread_count": 0 if owner_type == "club" else 1,
+                "contact_name": f"Student {student_id}" if owner_type == "club" else None,
+                "contact_profile_picture": None,
+            }
+            for student_id in range(1, recipients + 1)
+            for owner_id, owner_type, contact_id, contact_type in ((7, "club", student_id, "student"), (student_id, "student", 7, "club"))
+        ]
+    return rows
+
+
+def broadcast_events(stub_db, monkeypatch, recipients, queue_size=100):
+    hub = RecordingHub(queue_size)
+    monkeypatch.setattr(messaging_service, "inbox_events", hub)
+    stub_db.rows = broadcast_rows(recipients)
+    result = asyncio.run(messaging_service.broadcast_message(7, BroadcastCreate(content="hello")))
+    assert result["recipients"] == recipients
+    return hub.events
+
+
+def test_broadcast_sends_the_club_its_thread_updates_instead_of_a_resync(stub_db, monkeypatch):
+    events = broadcast_events(stub_db, monkeypatch, 3)
+    club_events = [(event, data) for user_type, _, event, data in events if user_type == "club"]
+    assert [event for event, _ in club_events] == ["thread", "message"] * 3
+    assert {data["contact_name"] for event, data in club_events if event == "thread"} == {"Student 1", "Student 2", "Student 3"}
+    student_threads = [data for user_type, _, event, data in events if user_type == "student" and event == "thread"]
+    assert len(student_threads) == 3
+    assert all(thread["contact_name"] == "Chess Club" for thread in student_threads)
+
+
+def test_broadcast_resyncs_the_club_once_when_its_events_would_overflow(stub_db, monkeypatch):
+    events = broadcast_events(stub_db, monkeypatch, 60, queue_size=100)
+    assert [event for user_type, _, event, _ in events if user_type == "club"] == ["resync"]
+    assert len([event for user_type, _, event, _ in events if user_type == "student"]) == 120
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+
+import pytest
+
+from database import query_stats
+from database.db import db_connection, db_task
+from database.query_stats import QueryStatsMiddleware, max_queries
+
+
+def run_statements(*statements):
+    with db_connection() as conn, conn.cursor() as cur:
+        for statement in statements:
+            cur.execute(statement)
+
+
+# Minimal ASGI app running `statements` through the pool before responding
+def app_running(*statements):
+    async def app(scope, receive, send):
+        run_statements(*statements)
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": b"ok"})
+    return app
+
+
+# Send one GET through the middleware; returns the response headers
+def request(app):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/things", "headers": []}
+    asyncio.run(QueryStatsMiddleware(app)(scope, receive, send))
+    return dict(messages[0]["headers"])
+
+
+def test_max_queries_counts_statements_within_limit(stub_db):
+    with max_queries(2) as stats:
+        run_statements("SELECT 1", "SELECT 2")
+    assert stats.count == 2
+    assert stats.statements == {"SELECT 1": 1, "SELECT 2": 1}
+
+
+def test_max_queries_raises_with_statement_breakdown(stub_db):
+    with pytest.raises(AssertionError) as error:
+        with max_queries(2):
+            run_statements("SELECT * FROM clubs WHERE id = %s", "SELECT * FROM clubs WHERE id = %s", "SELECT 1")
+    message = str(error.value)
+    assert message.startswith("3 queries ran, at most 2 allowed")
+    assert "2x SELECT * FROM clubs WHERE id = %s" in message
+    assert "1x SELECT 1" in message
+
+
+def test_max_queries_counts_statements_of_awaited_db_tasks(stub_db):
+    task = db_task(run_statements)
+    with max_queries(5) as stats:
+        asyncio.run(task("SELECT 1", "SELECT 2", "SELECT 3"))
+    assert stats.count == 3
+
+
+def test_middleware_adds_debug_headers(stub_db, monkeypatch):
+    monkeypatch.setattr(query_stats, "DB_DEBUG_HEADERS", True)
+    headers = request(app_running("SELECT 1", "SELECT 2", "SELECT 3"))
+    assert headers[b"x-db-queries"] == b"3"
+    assert float(headers[b"x-db-time-ms"]) >= float(headers[b"x-db-slowest-ms"]) >= 0
+    assert headers[b"server-timing"].startswith(b"db;dur=")
+    assert b'desc="3 queries"' in headers[b"server-timing"]
+
+
+def test_middleware_leaves_headers_alone_by_default(stub_db, monkeypatch):
+    monkeypatch.setattr(query_stats, "DB_DEBUG_HEADERS", False)
+    headers = request(app_running("SELECT 1"))
+    assert not any(name.startswith(b"x-db-") or name == b"server-timing" for name in headers)
+
+
+def test_middleware_logs_repeated_statements(stub_db, caplog):
+    repeated = ["SELECT name FROM clubs WHERE id = %s"] * query_stats.DB_REPEATED_QUERY_THRESHOLD
+    with caplog.at_level(logging.WARNING, logger="database.query_stats"):
+        request(app_running("SELECT 1", *repeated))
+    warnings = [record for record in caplog.records if record.getMessage().startswith("Statement ran")]
+    assert len(warnings) == 1
+    assert warnings[0].repeats == query_stats.DB_REPEATED_QUERY_THRESHOLD
+    assert warnings[0].statement == repeated[0]
+    assert warnings[0].path == "/things"
+
+
+def test_middleware_does_not_log_below_threshold(stub_db, caplog):
+    repeated = ["SELECT name FROM clubs WHERE id = %s"] * (query_stats.DB_REPEATED_QUERY_THRESHOLD - 1)
+    with caplog.at_level(logging.WARNING, logger="database.query_stats"):
+        request(app_running(*repeated))
+    assert not [record for record in caplog.records if record.getMessage().startswith("Statement ran")]